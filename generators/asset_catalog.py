@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Shared, cached catalog of a generator's characters, environments and prompts.
+
+Both the webapp's dropdown endpoints and the custom selector used to re-read
+and re-split assets/devices/*.txt and every assets/prompts/*.txt on each call.
+The catalog loads each source once into name-indexed dicts and only goes back
+to disk when a source file's mtime or size changes. Those stats are themselves
+rate limited to one pass per ASSET_CATALOG_CHECK_SEC, so a busy dashboard does
+no per-request disk I/O at all.
+
+Characters come from assets/devices/catalog.db when catalog_import.py has
+compiled one from characters.xlsx, and from characters.txt otherwise.
+
+Usage:
+    catalog = asset_catalog.get_catalog("/path/to/generators/custom/assets")
+    catalog.character("Goku")      # -> dict or None, O(1)
+    catalog.prompt_lines("cooking")
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    ASSET_CATALOG_CHECK_SEC = float(os.getenv("ASSET_CATALOG_CHECK_SEC", "2"))
+except Exception:
+    ASSET_CATALOG_CHECK_SEC = 2.0
+
+# (path, mtime_ns, size) of every file a section was built from
+Signature = Tuple[Tuple[str, int, int], ...]
+
+
+def _file_signature(paths: List[str]) -> Signature:
+    entries = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((path, st.st_mtime_ns, st.st_size))
+    return tuple(entries)
+
+
+def _read_lines(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f]
+
+
+def parse_characters(path: str) -> List[Dict[str, str]]:
+    """name,lora,activator,quote_directory per line; lines with fewer fields are skipped"""
+    characters = []
+    for line in _read_lines(path):
+        parts = line.split(",")
+        if len(parts) >= 4:
+            characters.append({
+                "name": parts[0].strip(),
+                "lora": parts[1].strip(),
+                "activator": parts[2].strip(),
+                "quote_directory": parts[3].strip(),
+            })
+    return characters
+
+
+def load_compiled_characters(path: str) -> List[Dict[str, str]]:
+    """Characters from a catalog.db written by catalog_import, in workbook order"""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(
+            "SELECT name, lora, activator, quote_directory FROM characters ORDER BY position"
+        ).fetchall()
+    finally:
+        conn.close()
+    return [{"name": name, "lora": lora, "activator": activator, "quote_directory": quote_directory}
+            for name, lora, activator, quote_directory in rows]
+
+
+def parse_environments(path: str) -> List[Dict[str, str]]:
+    """name[,lora] per line"""
+    environments = []
+    for line in _read_lines(path):
+        if not line:
+            continue
+        parts = line.split(",")
+        environments.append({
+            "name": parts[0].strip(),
+            "lora": parts[1].strip() if len(parts) > 1 else "",
+        })
+    return environments
+
+
+class _Section:
+    """One cached view (e.g. characters) rebuilt whenever its source files change"""
+
+    def __init__(self, sources: Callable[[], List[str]], build: Callable[[List[str]], Any]):
+        self.sources = sources
+        self.build = build
+        self.signature: Optional[Signature] = None
+        self.value: Any = None
+
+
+class AssetCatalog:
+    def __init__(self, assets_dir: str, check_interval: float = ASSET_CATALOG_CHECK_SEC):
+        self.assets_dir = assets_dir
+        self.devices_dir = os.path.join(assets_dir, "devices")
+        self.prompts_dir = os.path.join(assets_dir, "prompts")
+        self.check_interval = check_interval
+        self.version = 0  # bumped whenever any section reloads
+        self._lock = threading.Lock()
+        self._last_check: Dict[str, float] = {}
+        self._sections = {
+            "characters": _Section(lambda: [os.path.join(self.devices_dir, "catalog.db"),
+                                            os.path.join(self.devices_dir, "characters.txt")],
+                                   self._build_characters),
+            "environments": _Section(lambda: [os.path.join(self.devices_dir, "environments.txt")],
+                                     self._build_environments),
+            "prompts": _Section(self._prompt_files, self._build_prompts),
+        }
+
+    # --- Loading ---
+
+    def _prompt_files(self) -> List[str]:
+        try:
+            names = sorted(n for n in os.listdir(self.prompts_dir) if n.endswith(".txt"))
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.prompts_dir, n) for n in names]
+
+    @staticmethod
+    def _index(rows: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        by_name: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            # First definition wins, matching the old linear scan
+            by_name.setdefault(row["name"], row)
+        return rows, by_name
+
+    def _build_characters(self, paths: List[str]):
+        # A catalog compiled from characters.xlsx (catalog_import.py) wins over characters.txt
+        if paths and paths[0].endswith(".db"):
+            workbook = os.path.join(self.devices_dir, "characters.xlsx")
+            if os.path.exists(workbook) and os.path.getmtime(workbook) > os.path.getmtime(paths[0]):
+                logger.warning(f"{workbook} is newer than its compiled catalog; rerun catalog_import.py")
+            return self._index(load_compiled_characters(paths[0]))
+        return self._index(parse_characters(paths[0]) if paths else [])
+
+    def _build_environments(self, paths: List[str]):
+        return self._index(parse_environments(paths[0]) if paths else [])
+
+    def _build_prompts(self, paths: List[str]):
+        prompts = []
+        for path in paths:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    content = f.read()
+            except OSError as e:
+                logger.error(f"Error reading prompt file {path}: {e}")
+                continue
+            stem = os.path.splitext(os.path.basename(path))[0]
+            prompts.append({
+                "name": stem,
+                "title": stem.replace("_", " ").title(),
+                "filename": os.path.basename(path),
+                "content": content.strip(),
+                "lines": [line.strip() for line in content.splitlines()],
+            })
+        return self._index(prompts)
+
+    def _get(self, name: str):
+        section = self._sections[name]
+        now = time.monotonic()
+        with self._lock:
+            if section.signature is not None and now - self._last_check.get(name, 0) < self.check_interval:
+                return section.value
+            self._last_check[name] = now
+            paths = section.sources()
+            signature = _file_signature(paths)
+            if signature != section.signature:
+                present = [path for path, _, _ in signature]
+                try:
+                    section.value = section.build(present)
+                except Exception as e:
+                    logger.error(f"Failed to load {name} from {self.assets_dir}: {e}")
+                    if section.value is None:
+                        section.value = ([], {})
+                    return section.value
+                section.signature = signature
+                self.version += 1
+                logger.info(f"Loaded {len(section.value[0])} {name} from {self.assets_dir}")
+            return section.value
+
+    # --- Lookups ---
+
+    def characters(self) -> List[Dict[str, str]]:
+        return self._get("characters")[0]
+
+    def character(self, name: str) -> Optional[Dict[str, str]]:
+        return self._get("characters")[1].get(name)
+
+    def environments(self) -> List[Dict[str, str]]:
+        return self._get("environments")[0]
+
+    def environment(self, name: str) -> Optional[Dict[str, str]]:
+        return self._get("environments")[1].get(name)
+
+    def prompts(self) -> List[Dict[str, Any]]:
+        return self._get("prompts")[0]
+
+    def prompt(self, name: str) -> Optional[Dict[str, Any]]:
+        """Prompt by file stem"""
+        return self._get("prompts")[1].get(name)
+
+    def prompt_lines(self, name: str) -> Optional[List[str]]:
+        prompt = self.prompt(name)
+        return prompt["lines"] if prompt else None
+
+
+_catalogs: Dict[str, AssetCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(assets_dir: str) -> AssetCatalog:
+    """Process-wide catalog for an assets directory"""
+    key = os.path.abspath(assets_dir)
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = _catalogs[key] = AssetCatalog(key)
+        return catalog
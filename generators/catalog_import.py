@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Compile characters.xlsx workbooks into the SQLite catalog read by asset_catalog.
+
+Each generator keeps its character sheet in assets/devices/characters.xlsx
+(columns Character, Lora, Activator, Series; Series names the quote directory).
+This reads the workbook with the standard library only, validates every row,
+and writes assets/devices/catalog.db next to it. asset_catalog prefers that
+file over the hand-exported characters.txt, so names containing commas
+survive and startup is a single indexed SQLite read.
+
+Rows whose quote directory doesn't exist under assets/quotes are reported, as
+are LoRAs not found in --lora-dir or on the WebUI (--sd-url, via /sdapi/v1/loras).
+
+Usage:
+    python generators/catalog_import.py [workbook.xlsx ...] [--lora-dir DIR] [--sd-url URL] [--strict]
+
+With no workbooks, imports generators/*/assets/devices/characters.xlsx.
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+import urllib.request
+import zipfile
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+GENERATORS_DIR = os.path.dirname(os.path.abspath(__file__))
+CATALOG_FILENAME = "catalog.db"
+CATALOG_SCHEMA_VERSION = 1
+
+_NS = {
+    "main": "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+    "rel": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+    "pkgrel": "http://schemas.openxmlformats.org/package/2006/relationships",
+}
+
+# Header spellings accepted for each catalog column
+COLUMN_ALIASES = {
+    "name": ("character", "name", "character name"),
+    "lora": ("lora", "loras"),
+    "activator": ("activator", "trigger", "activation"),
+    "quote_directory": ("series", "quote directory", "quote_directory", "quotes"),
+}
+
+LORA_RE = re.compile(r"<lora:([^:>]+)(?::[-+]?[0-9.]+)?>")
+
+
+# --- Reading xlsx ---
+
+def _column_index(cell_ref: str) -> int:
+    """'C7' -> 2"""
+    index = 0
+    for ch in cell_ref:
+        if not ch.isalpha():
+            break
+        index = index * 26 + (ord(ch.upper()) - ord("A") + 1)
+    return index - 1
+
+
+def _shared_strings(zf: zipfile.ZipFile) -> List[str]:
+    try:
+        root = ET.fromstring(zf.read("xl/sharedStrings.xml"))
+    except KeyError:
+        return []
+    # A shared string may be split into rich-text runs; join every <t> under each <si>
+    return ["".join(t.text or "" for t in si.iter(f"{{{_NS['main']}}}t"))
+            for si in root.findall("main:si", _NS)]
+
+
+def _sheet_paths(zf: zipfile.ZipFile) -> Dict[str, str]:
+    """Sheet name -> zip member path, in workbook order"""
+    workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+    rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    targets = {rel.get("Id"): rel.get("Target") for rel in rels.findall("pkgrel:Relationship", _NS)}
+    sheets = {}
+    for sheet in workbook.findall("main:sheets/main:sheet", _NS):
+        target = targets[sheet.get(f"{{{_NS['rel']}}}id")]
+        sheets[sheet.get("name")] = target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+    return sheets
+
+
+def read_xlsx(path: str, sheet: Optional[str] = None) -> List[List[str]]:
+    """Cell values of one worksheet (the first by default) as rows of strings"""
+    with zipfile.ZipFile(path) as zf:
+        strings = _shared_strings(zf)
+        sheets = _sheet_paths(zf)
+        if not sheets:
+            return []
+        member = sheets[sheet] if sheet else next(iter(sheets.values()))
+        root = ET.fromstring(zf.read(member))
+
+    rows = []
+    for row in root.iter(f"{{{_NS['main']}}}row"):
+        values: Dict[int, str] = {}
+        for position, cell in enumerate(row.findall("main:c", _NS)):
+            kind = cell.get("t")
+            ref = cell.get("r")
+            col = _column_index(ref) if ref else position
+            if kind == "inlineStr":
+                value = "".join(t.text or "" for t in cell.iter(f"{{{_NS['main']}}}t"))
+            else:
+                v = cell.find("main:v", _NS)
+                if v is None or v.text is None:
+                    continue
+                value = strings[int(v.text)] if kind == "s" else v.text
+            values[col] = value
+        if values:
+            rows.append([values.get(i, "") for i in range(max(values) + 1)])
+    return rows
+
+
+# --- Validation ---
+
+@dataclass
+class ImportReport:
+    workbook: str
+    characters: List[Dict[str, str]] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)      # rows that were skipped
+    warnings: List[str] = field(default_factory=list)    # rows kept but referencing missing assets
+
+
+def parse_characters(rows: List[List[str]], report: ImportReport) -> None:
+    if not rows:
+        report.errors.append("workbook is empty")
+        return
+    header = [cell.strip().lower() for cell in rows[0]]
+    columns = {}
+    for key, aliases in COLUMN_ALIASES.items():
+        for i, name in enumerate(header):
+            if name in aliases:
+                columns[key] = i
+                break
+    if "name" not in columns:
+        report.errors.append(f"no Character column in header {rows[0]}")
+        return
+
+    seen: Set[str] = set()
+    for row_number, row in enumerate(rows[1:], start=2):
+        cells = {key: (row[i].strip() if i < len(row) else "") for key, i in columns.items()}
+        name = cells.get("name", "")
+        if not any(cells.values()):
+            continue
+        if not name:
+            report.errors.append(f"row {row_number}: missing character name")
+            continue
+        if name in seen:
+            report.errors.append(f"row {row_number}: duplicate character {name!r}")
+            continue
+        lora = cells.get("lora", "")
+        if lora and not LORA_RE.search(lora):
+            report.errors.append(f"row {row_number}: {name!r} has malformed LoRA {lora!r} (expected <lora:name:weight>)")
+            continue
+        seen.add(name)
+        report.characters.append({
+            "name": name,
+            "lora": lora,
+            "activator": cells.get("activator", ""),
+            "quote_directory": cells.get("quote_directory", "") or name,
+            "row": row_number,
+        })
+
+
+def available_loras(lora_dir: Optional[str], sd_url: Optional[str]) -> Optional[Set[str]]:
+    """LoRA names known to the WebUI or present in lora_dir; None if neither was given"""
+    if lora_dir:
+        names = set()
+        for _, _, files in os.walk(lora_dir):
+            names.update(os.path.splitext(f)[0] for f in files if f.endswith((".safetensors", ".pt", ".ckpt")))
+        return names
+    if sd_url:
+        base = sd_url.split("/sdapi/", 1)[0].rstrip("/")
+        with urllib.request.urlopen(f"{base}/sdapi/v1/loras", timeout=10) as response:
+            return {entry.get("name") for entry in json.load(response)}
+    return None
+
+
+def check_references(report: ImportReport, assets_dir: str, loras: Optional[Set[str]]) -> None:
+    quotes_dir = os.path.join(assets_dir, "quotes")
+    for character in report.characters:
+        where = f"row {character['row']}: {character['name']!r}"
+        if not os.path.isdir(os.path.join(quotes_dir, character["quote_directory"])):
+            report.warnings.append(f"{where} quote directory {character['quote_directory']!r} not found in {quotes_dir}")
+        if loras is not None:
+            for lora_name in LORA_RE.findall(character["lora"]):
+                if lora_name not in loras:
+                    report.warnings.append(f"{where} LoRA {lora_name!r} not available")
+
+
+# --- Compiling ---
+
+def write_catalog(report: ImportReport, catalog_path: str) -> None:
+    """Replace catalog_path atomically with the validated characters"""
+    tmp_path = f"{catalog_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.unlink(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(
+            """
+            CREATE TABLE characters (
+              name TEXT PRIMARY KEY,
+              lora TEXT NOT NULL,
+              activator TEXT NOT NULL,
+              quote_directory TEXT NOT NULL,
+              position INTEGER NOT NULL                  -- order in the workbook
+            ) WITHOUT ROWID;
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID;
+            """
+        )
+        conn.executemany(
+            "INSERT INTO characters (name, lora, activator, quote_directory, position) VALUES (?, ?, ?, ?, ?)",
+            [(c["name"], c["lora"], c["activator"], c["quote_directory"], i) for i, c in enumerate(report.characters)],
+        )
+        conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+            ("source", os.path.abspath(report.workbook)),
+            ("imported_at", time.strftime("%Y-%m-%dT%H:%M:%S")),
+            ("warnings", json.dumps(report.warnings)),
+        ])
+        conn.execute(f"PRAGMA user_version = {CATALOG_SCHEMA_VERSION}")
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, catalog_path)
+
+
+def import_workbook(path: str, loras: Optional[Set[str]] = None) -> ImportReport:
+    """Read, validate and compile one workbook into catalog.db beside it"""
+    report = ImportReport(workbook=path)
+    parse_characters(read_xlsx(path), report)
+    devices_dir = os.path.dirname(os.path.abspath(path))
+    check_references(report, os.path.dirname(devices_dir), loras)
+    if report.characters:
+        write_catalog(report, os.path.join(devices_dir, CATALOG_FILENAME))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("workbooks", nargs="*")
+    parser.add_argument("--lora-dir", help="directory holding the WebUI's LoRA files")
+    parser.add_argument("--sd-url", default=None, help="WebUI base or API URL to list LoRAs from")
+    parser.add_argument("--strict", action="store_true", help="exit non-zero on missing LoRAs or quote directories too")
+    args = parser.parse_args()
+
+    workbooks = args.workbooks or sorted(glob.glob(os.path.join(GENERATORS_DIR, "*", "assets", "devices", "*.xlsx")))
+    if not workbooks:
+        print("No workbooks found")
+        return 1
+    try:
+        loras = available_loras(args.lora_dir, args.sd_url)
+    except Exception as e:
+        print(f"Could not list LoRAs ({e}); skipping LoRA checks")
+        loras = None
+
+    failed = False
+    for path in workbooks:
+        start = time.perf_counter()
+        report = import_workbook(path, loras)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{path}: {len(report.characters)} character(s) compiled in {elapsed:.1f} ms, "
+              f"{len(report.errors)} error(s), {len(report.warnings)} warning(s)")
+        for message in report.errors:
+            print(f"  ERROR   {message}")
+        for message in report.warnings:
+            print(f"  MISSING {message}")
+        if loras is None:
+            print("  (LoRAs not checked; pass --lora-dir or --sd-url)")
+        failed = failed or bool(report.errors) or (args.strict and bool(report.warnings))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
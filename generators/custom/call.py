@@ -1,91 +1,89 @@
 #!/usr/bin/env python3
 """
-Custom generator call script that accepts specific parameters from webapp
+Custom generator call script that accepts specific parameters from webapp.
+
+Thin CLI wrapper around pipeline.run_pipeline, which runs every stage in this process.
+
+Usage:
+    python call.py [character environment prompt] [--workspace DIR] [--resume]
+
+With --workspace every file the run writes goes under DIR (see workspace.py),
+so several generations can run side by side. --resume continues a failed run
+in the same workspace from its run manifest (see manifest.py) instead of
+starting over.
 """
-import subprocess
+import argparse
 import logging
 import time
 import os
 import sys
 import json
-import shutil
 
-# Set up logging
-logging.basicConfig(filename='gen.log', level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+import pipeline
+import stage_cache
+from workspace import Workspace
 
 # Additional logger for gentime.log
 gentime_logger = logging.getLogger('gentime_logger')
 gentime_logger.setLevel(logging.INFO)
-gentime_handler = logging.FileHandler('gentime.log')
-gentime_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s'))
-gentime_logger.addHandler(gentime_handler)
 
-def clear_directory(directory):
-    """Clear the contents of a directory"""
-    if not os.path.exists(directory):
-        return
-        
-    for item in os.listdir(directory):
-        file_path = os.path.join(directory, item)
-        try:
-            if os.path.isfile(file_path) or os.path.islink(file_path):
-                os.unlink(file_path)
-            elif os.path.isdir(file_path):
-                shutil.rmtree(file_path)
-        except Exception as e:
-            logging.error(f'Failed to delete {file_path}. Reason: {e}')
+def setup_logging(workspace):
+    """Log to gen.log and gentime.log inside the workspace"""
+    logging.basicConfig(filename=workspace.log_file, level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+    gentime_handler = logging.FileHandler(workspace.gentime_log_file)
+    gentime_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s'))
+    gentime_logger.addHandler(gentime_handler)
 
-def run_script(script_name):
-    """Run a script and log its output"""
-    result = subprocess.run(['python', script_name], capture_output=True, text=True)
-    if result.returncode == 0:
-        logging.info(f"{script_name} finished successfully.")
-        logging.info("Output: %s", result.stdout)
-    else:
-        logging.error(f"{script_name} failed.")
-        logging.error("Error: %s", result.stderr)
-        raise Exception(f"Script {script_name} failed: {result.stderr}")
-    time.sleep(5)  # 5-second pause between each script
-
-def create_params_file(character, environment, prompt):
+def create_params_file(workspace, character, environment, prompt):
     """Create parameters file for selector.py"""
     params = {
         'character': character,
         'environment': environment,
         'prompt': prompt
     }
-    with open('custom_params.json', 'w') as f:
+    with open(workspace.params_file, 'w') as f:
         json.dump(params, f)
     logging.info(f"Created parameters file with: {params}")
 
-def run_custom_generation(character=None, environment=None, prompt=None):
+def run_custom_generation(character=None, environment=None, prompt=None, workspace=None, resume=False):
     """Run the custom generation sequence with specified parameters"""
     start_time = time.time()
+    workspace = (workspace or Workspace.default()).create()
     
     try:
-        # Clear output directories before running
-        directories_to_clear = [
-            'assets/lowscale', 
-            'assets/generations', 
-            'assets/upscale',
-            'assets/upscale_generations'
-        ]
-        for directory in directories_to_clear:
-            clear_directory(directory)
-        
         # If parameters are provided, create the params file
         if character and environment and prompt:
-            create_params_file(character, environment, prompt)
+            create_params_file(workspace, character, environment, prompt)
             logging.info(f"Running custom generation with: Character={character}, Environment={environment}, Prompt={prompt}")
         else:
             logging.info("Running with existing parameters or random selection")
         
-        # Run the generation sequence
-        run_script('selector.py')
-        run_script('init_image_gen.py')
-        run_script('generator.py')
-        run_script('upscale.py')
-        run_script('mash.py')
+        # Run the generation sequence in-process; it clears the output directories unless it can resume from them
+        result = pipeline.run_pipeline(character, environment, prompt, workspace, resume=resume)
+        logging.info(f"Final video: {result.final_video}")
+        if result.resumed_from:
+            done = result.resumed_from
+            gentime_logger.info(f"resumed attempt {done['attempts']}: {done['init']} init image(s), "
+                                f"{done['generate']} clip(s), {done['upscale']} upscaled clip(s) and "
+                                f"{done['frames']} upscaled frame(s) reused")
+        for stage, seconds in result.stage_seconds.items():
+            gentime_logger.info(f"{stage}: {seconds:.2f} seconds")
+        init_seconds = result.stage_seconds.get('init_image_gen')
+        if init_seconds:
+            gentime_logger.info(f"init images: {len(result.init_images) / init_seconds:.2f} images/sec "
+                                f"(batch size {pipeline.init_image_gen.INIT_BATCH_SIZE})")
+        if result.upscale_latency.get("count"):
+            latency = result.upscale_latency
+            gentime_logger.info(f"upscale frame latency: p50 {latency['p50']}s, p90 {latency['p90']}s, "
+                                f"p99 {latency['p99']}s, max {latency['max']}s over {latency['count']} request(s); "
+                                f"buckets {json.dumps(latency['buckets'])}")
+        frames = result.upscale_frames
+        if frames.get("frames") and frames.get("reconstructed"):
+            gentime_logger.info(f"upscale keyframes: {frames['requests']} img2img request(s) for {frames['frames']} "
+                                f"frame(s), {frames['reconstructed']} rebuilt between keyframes")
+        for stage, counts in stage_cache.get_cache().stats().items():
+            gentime_logger.info(f"cache {stage}: {counts['hits']} hit(s), {counts['misses']} miss(es), "
+                                f"{counts['evictions']} eviction(s)")
         
         end_time = time.time()
         total_time = end_time - start_time
@@ -100,17 +98,25 @@ def run_custom_generation(character=None, environment=None, prompt=None):
 
 def main():
     """Main execution"""
+    parser = argparse.ArgumentParser(description="Run the custom generator")
+    parser.add_argument('selection', nargs='*', help="character environment prompt")
+    parser.add_argument('--workspace', help="directory for this run's files (defaults to the generator directory)")
+    parser.add_argument('--resume', action='store_true',
+                        help="reuse what a failed run in this workspace already finished instead of starting over")
+    args = parser.parse_args()
+
+    workspace = Workspace(os.path.abspath(args.workspace)).create() if args.workspace else Workspace.default()
+    setup_logging(workspace)
+
     # Check for command line arguments
-    if len(sys.argv) >= 4:
-        character = sys.argv[1]
-        environment = sys.argv[2] 
-        prompt = sys.argv[3]
+    if len(args.selection) >= 3:
+        character, environment, prompt = args.selection[:3]
         logging.info(f"Running with command line args: {character}, {environment}, {prompt}")
-        success = run_custom_generation(character, environment, prompt)
+        success = run_custom_generation(character, environment, prompt, workspace, resume=args.resume)
     else:
         # Run without specific parameters (will use existing params file or fail gracefully)
         logging.info("Running without specific parameters")
-        success = run_custom_generation()
+        success = run_custom_generation(workspace=workspace, resume=args.resume)
     
     if success:
         print("Custom generation completed successfully.")
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Named ffmpeg/x264 encoding profiles for the custom generator.
+
+The profile is picked with GEN_ENCODE_PROFILE (set by the webapp from the job's
+encode_profile) and applies to both the upscaled clips and the final mash.
+
+Benchmark every profile against a clip:
+    python encoding.py benchmark assets/upscale_generations/generation_0000.mp4
+"""
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from moviepy.config import get_setting
+
+
+@dataclass(frozen=True)
+class EncodingProfile:
+    name: str
+    preset: str
+    crf: int
+    threads: int = 0  # 0 lets x264 size its thread pool to the machine
+    codec: str = "libx264"
+    pix_fmt: str = "yuv420p"
+
+    def ffmpeg_args(self) -> List[str]:
+        """Output-side ffmpeg arguments for this profile"""
+        return ["-c:v", self.codec, "-preset", self.preset, "-crf", str(self.crf),
+                "-threads", str(self.threads), "-pix_fmt", self.pix_fmt]
+
+    def moviepy_kwargs(self) -> Dict:
+        """Keyword arguments for VideoClip.write_videofile"""
+        return {
+            "codec": self.codec,
+            "preset": self.preset,
+            "threads": self.threads,
+            "ffmpeg_params": ["-crf", str(self.crf), "-pix_fmt", self.pix_fmt],
+        }
+
+
+PROFILES: Dict[str, EncodingProfile] = {
+    "fast-preview": EncodingProfile("fast-preview", preset="ultrafast", crf=28),
+    "publish": EncodingProfile("publish", preset="medium", crf=20),
+    "archive": EncodingProfile("archive", preset="slow", crf=16),
+}
+DEFAULT_PROFILE = "publish"
+
+
+def get_profile(name: Optional[str] = None) -> EncodingProfile:
+    """Resolve a profile by name, falling back to GEN_ENCODE_PROFILE and then the default"""
+    name = name or os.getenv("GEN_ENCODE_PROFILE") or DEFAULT_PROFILE
+    if name not in PROFILES:
+        logging.warning(f"Unknown encoding profile '{name}', using '{DEFAULT_PROFILE}'")
+        name = DEFAULT_PROFILE
+    return PROFILES[name]
+
+
+def log_encode_rate(profile: EncodingProfile, frames: int, seconds: float, output_path: str) -> float:
+    fps = frames / seconds if seconds > 0 else 0.0
+    logging.info(f"Encoded {frames} frames to {output_path} with '{profile.name}' in {seconds:.2f}s ({fps:.1f} fps)")
+    return fps
+
+
+class FfmpegWriter:
+    """cv2.VideoWriter-style sink that pipes raw BGR frames into ffmpeg with a named profile"""
+
+    def __init__(self, output_path: str, fps: float, size, profile: Optional[EncodingProfile] = None):
+        self.output_path = output_path
+        self.profile = profile or get_profile()
+        self.frames = 0
+        width, height = size
+        cmd = [get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error",
+               "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", f"{fps}", "-i", "-",
+               *self.profile.ffmpeg_args(), "-movflags", "+faststart", output_path]
+        self._start = time.time()
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, frame) -> None:
+        self._proc.stdin.write(frame.tobytes())
+        self.frames += 1
+
+    def release(self) -> None:
+        self._proc.stdin.close()
+        stderr = self._proc.stderr.read().decode(errors="replace")
+        self._proc.stderr.close()
+        if self._proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed writing {self.output_path}: {stderr}")
+        self.encode_fps = log_encode_rate(self.profile, self.frames, time.time() - self._start, self.output_path)
+
+    def abort(self) -> None:
+        """Stop ffmpeg without finishing the file; never raises, so the caller's own error propagates"""
+        for close in (self._proc.kill, self._proc.stdin.close, self._proc.stderr.close, self._proc.wait):
+            try:
+                close()
+            except Exception:
+                pass
+        if os.path.exists(self.output_path):
+            os.unlink(self.output_path)
+
+
+def benchmark(video_path: str, profile_names: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+    """Encode video_path with each profile and report encode fps and output size"""
+    import cv2
+
+    vidcap = cv2.VideoCapture(video_path)
+    fps = vidcap.get(cv2.CAP_PROP_FPS) or 20
+    frames = []
+    success, image = vidcap.read()
+    while success:
+        frames.append(image)
+        success, image = vidcap.read()
+    vidcap.release()
+    if not frames:
+        raise ValueError(f"No frames decoded from {video_path}")
+    height, width = frames[0].shape[:2]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for name in profile_names or list(PROFILES):
+            output_path = os.path.join(work_dir, f"{name}.mp4")
+            writer = FfmpegWriter(output_path, fps, (width, height), PROFILES[name])
+            start = time.time()
+            for frame in frames:
+                writer.write(frame)
+            writer.release()
+            results[name] = {
+                "seconds": time.time() - start,
+                "encode_fps": writer.encode_fps,
+                "size_bytes": os.path.getsize(output_path),
+            }
+    return results
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+    if len(sys.argv) < 3 or sys.argv[1] != "benchmark":
+        print("Usage: python encoding.py benchmark <video.mp4> [profile ...]")
+        sys.exit(1)
+    results = benchmark(sys.argv[2], sys.argv[3:] or None)
+    print(f"{'profile':<14}{'encode fps':>12}{'seconds':>10}{'size (KB)':>12}")
+    for name, r in results.items():
+        print(f"{name:<14}{r['encode_fps']:>12.1f}{r['seconds']:>10.2f}{r['size_bytes'] / 1024:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,60 @@
-import requests
 import base64
 import json
 import logging
 import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterable, Iterator, List, Optional, Tuple
 
-logging.basicConfig(filename="gen.log", level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+# Shared SD API client lives one level up in generators/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sd_client
+
+import manifest
+import progress
+import stage_cache
 
 # Define the API URL
 api_url = os.getenv("AUTO1111_API", "http://host.docker.internal:7860/sdapi/v1/img2img")
 
+# AnimateDiff requests kept in flight; defaults to one per SD backend (SD_BACKENDS)
+try:
+    CLIP_WORKERS = max(1, int(os.getenv("GEN_CLIP_WORKERS", str(max(1, len(sd_client.SD_BACKENDS))))))
+except Exception:
+    CLIP_WORKERS = 1
+
+CONTROLNET_DIR = os.path.join("assets", "init")
+GENERATION_DIR = os.path.join("assets", "generations")
+
 # Function to encode image to base64
 def encode_image_to_base64(image_path):
     with open(image_path, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode('utf-8')
 
-# Function to read prompts from selected_story.txt
+# Function to read prompts from selected_story.txt, ignoring blank lines
 def read_prompts(file_path):
     with open(file_path, "r") as file:
-        return [line.strip() for line in file.readlines()]
-
-controlnet_dir = "assets\\init"
-generation_dir = "assets\\generations"
-os.makedirs(generation_dir, exist_ok=True)
-
-controlnet_images = sorted(os.listdir(controlnet_dir))
-prompts = read_prompts("prompt.txt")
+        return [line.strip() for line in file.readlines() if line.strip()]
 
 # Overrides from env
-try:
-    OV_VIDEO_LENGTH = int(os.getenv("GEN_VIDEO_LENGTH", "150"))
-    OV_FPS = int(os.getenv("GEN_FPS", "20"))
-    OV_WIDTH = int(os.getenv("GEN_WIDTH", "360"))
-    OV_HEIGHT = int(os.getenv("GEN_HEIGHT", "640"))
-except Exception:
-    OV_VIDEO_LENGTH = 150
-    OV_FPS = 20
-    OV_WIDTH = 360
-    OV_HEIGHT = 640
+def load_overrides():
+    try:
+        video_length = int(os.getenv("GEN_VIDEO_LENGTH", "150"))
+        fps = int(os.getenv("GEN_FPS", "20"))
+        width = int(os.getenv("GEN_WIDTH", "360"))
+        height = int(os.getenv("GEN_HEIGHT", "640"))
+    except Exception:
+        video_length = 150
+        fps = 20
+        width = 360
+        height = 640
+    return video_length, fps, width, height
+
+def generate_clip(image_path, prompt, index, output_dir=GENERATION_DIR) -> Optional[str]:
+    """Render one AnimateDiff clip from an init image and prompt, returning the saved MP4 path"""
+    OV_VIDEO_LENGTH, OV_FPS, OV_WIDTH, OV_HEIGHT = load_overrides()
 
-for index, (image_name, prompt) in enumerate(zip(controlnet_images, prompts)):
-    encoded_image = encode_image_to_base64(os.path.join(controlnet_dir, image_name))
+    encoded_image = encode_image_to_base64(image_path)
     prompt_text = prompt.strip()
 
     animate_diff_args = {
@@ -80,18 +95,75 @@ for index, (image_name, prompt) in enumerate(zip(controlnet_images, prompts)):
 
     logging.info(f"Generating with prompt: {prompt_text} ({OV_WIDTH}x{OV_HEIGHT} @ {OV_FPS}fps len {OV_VIDEO_LENGTH})")
 
-    response = requests.post(api_url, headers={"Content-Type": "application/json"}, json=json_payload)
-
-    if response.status_code == 200:
-        r = response.json()
-        if 'images' in r and r['images']:
-            base64_data = r['images'][0]
-            mp4_data = base64.b64decode(base64_data)
-            output_path = os.path.join(generation_dir, f"generation_{index:04d}.mp4")
-            with open(output_path, 'wb') as file:
-                file.write(mp4_data)
-            logging.info(f"MP4 file saved as {output_path}.")
-        else:
-            logging.error(f"No image data found in the response for prompt: {prompt_text}")
-    else:
-        logging.error(f"API call failed for prompt: {prompt_text}. Status Code: {response.status_code}, Response: {response.text}")
+    # Stream-decode the MP4 straight to disk instead of holding the JSON body, the
+    # base64 string and the decoded bytes in memory at once
+    output_path = os.path.join(output_dir, f"generation_{index:04d}.mp4")
+    if manifest.get_manifest().fetch("generate", output_path):
+        return output_path
+    cache = stage_cache.get_cache()
+    cache_key = cache.request_key("generate", json_payload)
+    if cache.fetch("generate", cache_key, output_path):
+        manifest.get_manifest().record("generate", output_path)
+        return output_path
+    try:
+        saved = sd_client.post_to_file(api_url, json_payload, output_path)
+    except sd_client.SDAPIError as e:
+        logging.error(f"API call failed for prompt: {prompt_text}. Status Code: {e.status_code}, Response: {e.text}")
+        return None
+
+    if saved:
+        logging.info(f"MP4 file saved as {output_path}.")
+        cache.store("generate", cache_key, output_path)
+        manifest.get_manifest().record("generate", output_path)
+        return output_path
+    logging.error(f"No image data found in the response for prompt: {prompt_text}")
+    return None
+
+def iter_clips(items: Iterable[Tuple[int, str, str]], output_dir: str = GENERATION_DIR,
+               workers: int = CLIP_WORKERS) -> Iterator[Tuple[int, Optional[str]]]:
+    """Render a clip for each (index, init_image_path, prompt) with up to `workers` requests in flight.
+
+    Yields (index, clip path or None) as clips finish. Items are pulled lazily,
+    so a streaming producer is only read as fast as clips are dispatched.
+    """
+    if workers <= 1:
+        for index, image_path, prompt in items:
+            yield index, generate_clip(image_path, prompt, index, output_dir)
+        return
+
+    def _render(index, image_path, prompt):
+        return index, generate_clip(image_path, prompt, index, output_dir)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for item in items:
+            if len(pending) >= workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(executor.submit(_render, *item))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+def generate_clips(init_images: List[Tuple[str, str]], output_dir: str = GENERATION_DIR) -> List[str]:
+    """Render a clip for each (init_image_path, prompt) pair and return the saved MP4 paths"""
+    os.makedirs(output_dir, exist_ok=True)
+
+    items = [(index, image_path, prompt) for index, (image_path, prompt) in enumerate(init_images)]
+    results = {}
+    for done, (index, output_path) in enumerate(iter_clips(items, output_dir), start=1):
+        results[index] = output_path
+        progress.item_done("generator", done, len(init_images), ok=bool(output_path))
+    return [results[index] for index in sorted(results) if results[index]]
+
+def main():
+    logging.basicConfig(filename="gen.log", level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+    controlnet_images = [os.path.join(CONTROLNET_DIR, name) for name in sorted(os.listdir(CONTROLNET_DIR))]
+    prompts = read_prompts("prompt.txt")
+    generate_clips(list(zip(controlnet_images, prompts)))
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,21 @@
-import requests
+import argparse
 import json
 import logging
 import base64
 import os
+import sys
+import time
+from typing import Iterator, List, Optional, Tuple
+
+import requests
 
-# Set up logging
-logging.basicConfig(filename="gen.log", level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+# Shared SD API client lives one level up in generators/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sd_client
+
+import manifest
+import progress
+import stage_cache
 
 # Function to read prompts from selected_story.txt, ignoring blank lines
 def read_prompts(file_path):
@@ -15,16 +25,26 @@ def read_prompts(file_path):
 # Define the API URL
 api_url = "http://host.docker.internal:7860/sdapi/v1/txt2img"
 
-# Process and save the image
-def process_and_save_image(base64_image, file_index, output_dir):
-    image_bytes = base64.b64decode(base64_image)
-    file_path = os.path.join(output_dir, f"init_image_{file_index:04d}.png")
-    with open(file_path, "wb") as image_file:
-        image_file.write(image_bytes)
-    logging.info(f"Saved image at {file_path}")
+INIT_DIR = os.path.join("assets", "init")
+
+def init_image_path(file_index, output_dir):
+    return os.path.join(output_dir, f"init_image_{file_index:04d}.png")
 
-def make_api_call_and_save(prompt, index, output_dir):
-    json_payload = {
+# Prompts rendered per txt2img request (GEN_INIT_BATCH); 1 keeps one request per prompt
+try:
+    INIT_BATCH_SIZE = max(1, int(os.getenv("GEN_INIT_BATCH", "1")))
+except Exception:
+    INIT_BATCH_SIZE = 1
+
+# WebUI script that renders one image per prompt line within a single request.
+# Its args are [iterate seed, same seed for batch, prompt position, prompt lines]
+BATCH_SCRIPT = "prompts from file or textbox"
+
+# Settings that must match for prompts to share a request
+BATCH_KEY_FIELDS = ("negative_prompt", "seed", "sampler_name", "steps", "cfg_scale", "width", "height")
+
+def build_payload(prompt):
+    return {
         "prompt": prompt,
         "negative_prompt": "bad quality, deformed, boring, pixelated, blurry, unclear, artifact, nude, nsfw",
         "seed": -1,
@@ -36,22 +56,174 @@ def make_api_call_and_save(prompt, index, output_dir):
         "height": 640
     }
 
-    response = requests.post(api_url, headers={"Content-Type": "application/json"}, json=json_payload)
-    if response.status_code == 200:
-        response_json = response.json()
-        base64_image = response_json['images'][0]
-        process_and_save_image(base64_image, index, output_dir)
+def make_api_call_and_save(prompt, index, output_dir) -> Optional[str]:
+    json_payload = build_payload(prompt)
+
+    file_path = init_image_path(index, output_dir)
+    if manifest.get_manifest().fetch("init", file_path):
+        return file_path
+    cache = stage_cache.get_cache()
+    cache_key = cache.request_key("init", json_payload)
+    if cache.fetch("init", cache_key, file_path):
+        manifest.get_manifest().record("init", file_path)
+        return file_path
+    try:
+        saved = sd_client.post_to_file(api_url, json_payload, file_path)
+    except sd_client.SDAPIError as e:
+        logging.error(f"API call for prompt '{prompt}' failed with status code {e.status_code}")
+        return None
+    if not saved:
+        logging.error(f"No image data found in the response for prompt '{prompt}'")
+        return None
+    logging.info(f"Saved image at {file_path}")
+    cache.store("init", cache_key, file_path)
+    manifest.get_manifest().record("init", file_path)
+    return file_path
+
+def batchable(payload) -> bool:
+    # The batch script parses any line containing "--" as command-line options
+    return "--" not in payload["prompt"] and "\n" not in payload["prompt"]
+
+def group_compatible(payloads: List[Tuple[int, dict]], batch_size: int) -> List[List[Tuple[int, dict]]]:
+    """Split (index, payload) pairs into groups of up to batch_size that share every BATCH_KEY_FIELDS value"""
+    open_groups = {}
+    groups = []
+    for index, payload in payloads:
+        if not batchable(payload):
+            groups.append([(index, payload)])
+            continue
+        key = tuple(payload[field] for field in BATCH_KEY_FIELDS)
+        group = open_groups.get(key)
+        if group is None or len(group) >= batch_size:
+            group = open_groups[key] = []
+            groups.append(group)
+        group.append((index, payload))
+    return groups
+
+def batch_payload(payloads: List[dict]) -> dict:
+    """One txt2img request rendering an image for each payload, in order"""
+    prompts = [payload["prompt"] for payload in payloads]
+    combined = dict(payloads[0])
+    if len(set(prompts)) == 1:
+        combined["n_iter"] = len(prompts)
     else:
-        logging.error(f"API call for prompt '{prompt}' failed with status code {response.status_code}")
+        # The script appends the request's own prompt to every line, so leave it empty
+        combined["prompt"] = ""
+        combined["script_name"] = BATCH_SCRIPT
+        combined["script_args"] = [False, False, "start", "\n".join(prompts)]
+    return combined
+
+def write_image(encoded: str, file_path: str) -> None:
+    partial_path = f"{file_path}.part"
+    with open(partial_path, "wb") as f:
+        f.write(base64.b64decode(encoded.split(",", 1)[-1]))
+    os.replace(partial_path, file_path)
+
+def make_batch_call_and_save(group: List[Tuple[int, dict]], output_dir) -> Optional[List[str]]:
+    """Render a group of compatible prompts in one request; None means the caller should fall back to per-prompt calls"""
+    payload = batch_payload([p for _, p in group])
+    try:
+        images = sd_client.post_json(api_url, payload).get("images") or []
+    except sd_client.SDAPIError as e:
+        logging.warning(f"Batch of {len(group)} prompt(s) failed with status code {e.status_code}")
+        return None
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logging.warning(f"Batch of {len(group)} prompt(s) failed: {e}")
+        return None
+    # A multi-image result may lead with a grid of the whole batch
+    if len(images) == len(group) + 1:
+        images = images[1:]
+    if len(images) != len(group):
+        logging.warning(f"Batch of {len(group)} prompt(s) returned {len(images)} image(s)")
+        return None
+
+    cache = stage_cache.get_cache()
+    paths = []
+    for (index, single), encoded in zip(group, images):
+        file_path = init_image_path(index, output_dir)
+        write_image(encoded, file_path)
+        cache.store("init", cache.request_key("init", single), file_path)
+        manifest.get_manifest().record("init", file_path)
+        paths.append(file_path)
+    logging.info(f"Saved {len(paths)} image(s) from one batched request")
+    return paths
+
+def iter_init_images(prompts: List[str], output_dir: str = INIT_DIR,
+                     batch_size: int = INIT_BATCH_SIZE) -> Iterator[Tuple[int, Optional[str]]]:
+    """Yield (prompt index, image path or None) as each prompt's image is saved, cache hits first when batching"""
+    os.makedirs(output_dir, exist_ok=True)
+    if batch_size <= 1:
+        for index, prompt in enumerate(prompts):
+            yield index, make_api_call_and_save(prompt, index, output_dir)
+        return
 
-# Read prompts
-selected_story_file = "prompt.txt"
-prompts = read_prompts(selected_story_file)
+    # Images a resumed run already has, then cached ones, come first; only the misses are sent to the API
+    cache = stage_cache.get_cache()
+    run_manifest = manifest.get_manifest()
+    pending = []
+    for index, prompt in enumerate(prompts):
+        payload = build_payload(prompt)
+        file_path = init_image_path(index, output_dir)
+        if run_manifest.fetch("init", file_path):
+            yield index, file_path
+        elif cache.fetch("init", cache.request_key("init", payload), file_path):
+            run_manifest.record("init", file_path)
+            yield index, file_path
+        else:
+            pending.append((index, payload))
+    for group in group_compatible(pending, batch_size):
+        paths = make_batch_call_and_save(group, output_dir) if len(group) > 1 else None
+        if paths is None:
+            for index, payload in group:
+                yield index, make_api_call_and_save(payload["prompt"], index, output_dir)
+        else:
+            yield from zip((index for index, _ in group), paths)
 
-# Output directory
-output_dir = "assets\\init"
-os.makedirs(output_dir, exist_ok=True)
+def generate_init_images(prompts: List[str], output_dir: str = INIT_DIR,
+                         batch_size: int = INIT_BATCH_SIZE) -> List[Tuple[str, str]]:
+    """Generate one init image per prompt; returns (image_path, prompt) pairs for the prompts that succeeded"""
+    start = time.time()
+    results = {}
+    for done, (index, file_path) in enumerate(iter_init_images(prompts, output_dir, batch_size), start=1):
+        results[index] = file_path
+        progress.item_done("init_image_gen", done, len(prompts), ok=bool(file_path))
+
+    init_images = [(results[index], prompt) for index, prompt in enumerate(prompts) if results.get(index)]
+    elapsed = time.time() - start
+    rate = len(init_images) / elapsed if elapsed > 0 else 0.0
+    logging.info(f"Generated {len(init_images)}/{len(prompts)} init image(s) in {elapsed:.2f}s "
+                 f"({rate:.2f} images/sec, batch size {batch_size})")
+    return init_images
+
+def benchmark(prompts: List[str], batch_size: int, output_dir: str) -> None:
+    """Time the per-prompt loop against batched requests on the same prompts, bypassing the stage cache"""
+    stage_cache.get_cache().enabled = False
+    rates = {}
+    for size in (1, batch_size):
+        start = time.time()
+        images = generate_init_images(prompts, os.path.join(output_dir, f"batch_{size}"), batch_size=size)
+        elapsed = time.time() - start
+        rates[size] = len(images) / elapsed if elapsed > 0 else 0.0
+        print(f"batch size {size}: {len(images)}/{len(prompts)} image(s) in {elapsed:.2f}s = {rates[size]:.2f} images/sec")
+    if rates[1] > 0:
+        print(f"speedup: {rates[batch_size] / rates[1]:.2f}x")
+
+def main():
+    logging.basicConfig(filename="gen.log", level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+    parser = argparse.ArgumentParser(description="Generate init images for each line of prompt.txt")
+    parser.add_argument("--batch-size", type=int, default=INIT_BATCH_SIZE, help="prompts per txt2img request")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="compare images/sec of one request per prompt against --batch-size")
+    args = parser.parse_args()
+
+    # Read prompts
+    selected_story_file = "prompt.txt"
+    prompts = read_prompts(selected_story_file)
+    if args.benchmark:
+        benchmark(prompts, max(2, args.batch_size), os.path.join(INIT_DIR, "benchmark"))
+    else:
+        generate_init_images(prompts, batch_size=max(1, args.batch_size))
 
-# Make API calls for each prompt
-for index, prompt in enumerate(prompts):
-    make_api_call_and_save(prompt, index, output_dir)
+if __name__ == "__main__":
+    main()
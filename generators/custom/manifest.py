@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Run manifest for resumable custom generation runs.
+
+The pipeline keeps workspace/manifest.json up to date as stages finish work:
+the selection the run was started with, a fingerprint of the settings that
+shape its outputs, every init image, clip, upscaled clip and final video that
+has been written, and for a clip that is part way through upscaling the
+number of frames checkpointed under assets/upscale_frames/<clip>/.
+
+call.py --resume reloads the manifest instead of clearing the workspace.
+Stages then ask it before calling the API, the same way they ask the stage
+cache, so a run that died at upscale frame 140 of 150 re-requests ten frames
+rather than starting over. An entry only counts while its file still exists,
+and a manifest whose fingerprint no longer matches the current settings is
+discarded.
+
+Without an active manifest (the stage scripts run by hand) every call here is
+a no-op.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import progress
+
+MANIFEST_VERSION = 1
+# Stages whose finished outputs are recorded, in pipeline order
+STAGES = ("init", "generate", "upscale", "mash")
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    partial_path = f"{path}.part"
+    with open(partial_path, "wb") as f:
+        f.write(data)
+    os.replace(partial_path, path)
+
+
+class RunManifest:
+    """Completed outputs of one run, persisted after every change"""
+
+    def __init__(self, path: Optional[str] = None, data: Optional[Dict[str, Any]] = None,
+                 frames_root: Optional[str] = None):
+        self.path = path
+        self.frames_root = frames_root
+        self.data = data or {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    @classmethod
+    def load(cls, path: str, frames_root: Optional[str] = None) -> Optional["RunManifest"]:
+        """The manifest at path, or None if there is none or it can't be read"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable run manifest {path}: {e}")
+            return None
+        if data.get("version") != MANIFEST_VERSION:
+            logging.warning(f"Ignoring run manifest {path} with version {data.get('version')}")
+            return None
+        return cls(path, data, frames_root)
+
+    @classmethod
+    def create(cls, path: str, selection: Dict[str, Any], fingerprint: str,
+               frames_root: Optional[str] = None) -> "RunManifest":
+        manifest = cls(path, {
+            "version": MANIFEST_VERSION,
+            "fingerprint": fingerprint,
+            "selection": selection,
+            "status": "running",
+            "attempts": 1,
+            "created_at": time.time(),
+            "outputs": {stage: {} for stage in STAGES},
+            "frames": {},
+        }, frames_root)
+        manifest.save()
+        return manifest
+
+    @property
+    def fingerprint(self) -> Optional[str]:
+        return self.data.get("fingerprint")
+
+    @property
+    def selection(self) -> Optional[Dict[str, Any]]:
+        return self.data.get("selection")
+
+    # --- Stage outputs ---
+
+    def fetch(self, stage: str, output_path: str) -> bool:
+        """True if a previous attempt already finished output_path for stage"""
+        if not self.enabled:
+            return False
+        name = os.path.basename(output_path)
+        with self._lock:
+            recorded = name in self.data["outputs"].get(stage, {})
+        if recorded and os.path.exists(output_path):
+            logging.info(f"Resuming: {stage} output {name} already done")
+            return True
+        return False
+
+    def record(self, stage: str, output_path: str) -> None:
+        """Mark output_path as finished; call only once the file is complete on disk"""
+        if not self.enabled:
+            return
+        name = os.path.basename(output_path)
+        with self._lock:
+            self.data["outputs"].setdefault(stage, {})[name] = time.time()
+            self.data["frames"].pop(name, None)
+        self.save()
+
+    # --- Per-frame upscale checkpoints ---
+
+    def frames_dir(self, clip_path: str) -> Optional[str]:
+        """Directory holding the upscaled frames checkpointed so far for clip_path (created on demand)"""
+        if not self.enabled or not self.frames_root:
+            return None
+        directory = os.path.join(self.frames_root, os.path.splitext(os.path.basename(clip_path))[0])
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    def has_frames(self, clip_path: str) -> bool:
+        """True if an earlier attempt checkpointed upscaled frames of clip_path"""
+        if not self.enabled or not self.frames_root:
+            return False
+        directory = os.path.join(self.frames_root, os.path.splitext(os.path.basename(clip_path))[0])
+        return os.path.isdir(directory) and any(name.endswith(".png") for name in os.listdir(directory))
+
+    def frame_done(self, clip_path: str, frames: int) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.data["frames"][os.path.basename(clip_path)] = frames
+        self.save()
+
+    # --- Run state ---
+
+    def resumed(self) -> None:
+        """Start another attempt on top of this manifest"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.data["attempts"] = self.data.get("attempts", 1) + 1
+            self.data["status"] = "running"
+            self.data.pop("error", None)
+        self.save()
+
+    def finish(self, status: str, error: Optional[str] = None) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.data["status"] = status
+            if error:
+                self.data["error"] = error
+        self.save()
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            summary = {stage: len(self.data.get("outputs", {}).get(stage, {})) for stage in STAGES}
+            summary["frames"] = sum(self.data.get("frames", {}).values())
+            summary["attempts"] = self.data.get("attempts", 1)
+            summary["status"] = self.data.get("status")
+        return summary
+
+    def save(self) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.data["updated_at"] = time.time()
+            body = json.dumps(self.data, indent=1, sort_keys=True).encode("utf-8")
+            _atomic_write(self.path, body)
+        progress.emit("checkpoint", **self.summary())
+
+
+_manifest = RunManifest()
+
+
+def get_manifest() -> RunManifest:
+    """Manifest of the run in progress in this process (a no-op one outside the pipeline)"""
+    return _manifest
+
+
+def activate(manifest: RunManifest) -> RunManifest:
+    global _manifest
+    _manifest = manifest
+    return manifest
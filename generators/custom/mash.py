@@ -4,10 +4,17 @@ import logging
 import textwrap
 import random
 import shutil
+import subprocess
+import tempfile
+import time
 import numpy as np
+from typing import List, Optional
+from moviepy.config import get_setting
 from moviepy.editor import VideoFileClip, concatenate_videoclips, CompositeVideoClip, ImageClip
 from PIL import Image, ImageDraw, ImageFont
 
+import encoding
+
 # Constants for easy adjustments
 TXT_FONTSIZE = 80
 TXT_COLOR = 'white'
@@ -21,8 +28,9 @@ FADEIN_DURATION = 1.0  # Duration of the fade-in effect in seconds
 TXT_FONT = 'Georgia-Bold'  # Preferred font name; will fall back if not available
 STROKE_WIDTH = 1
 
-# Set up logging
-logging.basicConfig(filename="gen.log", level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+# "single-pass" pre-composites the quote once and stream-copies the repeated half;
+# "compose" is the original CompositeVideoClip render of the doubled clip
+RENDER_MODE = os.getenv("GEN_MASH_MODE", "single-pass")
 
 def read_quote(quote_file):
     """Read the quote from the specified file."""
@@ -34,13 +42,13 @@ def read_quote(quote_file):
 
     return quote
 
-def overlay_text_on_clip(clip, text):
-    """Overlay text on a given video clip with fade-in effect, without ImageMagick."""
+def render_text_image(text, frame_width):
+    """Render the wrapped, outlined quote into an RGBA numpy array, without ImageMagick."""
     # Wrap text into multiple lines (character-based; simple and robust)
     wrapped_lines = textwrap.wrap(text, width=TXT_WRAP_WIDTH)
     wrapped_text = "\n".join(wrapped_lines)
 
-    max_text_width_px = max(10, clip.size[0] - MARGIN)
+    max_text_width_px = max(10, frame_width - MARGIN)
 
     # Try to load preferred font; fall back gracefully
     def load_font(preferred_name: str, size: int) -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
@@ -121,13 +129,22 @@ def overlay_text_on_clip(clip, text):
             draw.multiline_text((dx, dy), wrapped_text, font=font, fill=TXT_OUTLINE_COLOR, align="left")
         draw.multiline_text((0, 0), wrapped_text, font=font, fill=TXT_COLOR, align="left")
 
-    # Convert to numpy array for MoviePy and build an ImageClip
-    text_array = np.array(text_img)
-    txt_clip = ImageClip(text_array)
+    # Convert to numpy array for MoviePy
+    return np.array(text_img)
+
+def text_position(frame_size, text_size):
+    """Top-left corner of the quote: horizontally centred, POSITION_FROM_BOTTOM above the bottom edge"""
+    x_position = (frame_size[0] - text_size[0]) // 2
+    y_position = frame_size[1] - text_size[1] - POSITION_FROM_BOTTOM
+    return x_position, y_position
+
+def overlay_text_on_clip(clip, text):
+    """Overlay text on a given video clip with fade-in effect, without ImageMagick."""
+    txt_clip = ImageClip(render_text_image(text, clip.size[0]))
 
     # Positioning similar to previous logic
     x_position = 'center'
-    y_position = clip.size[1] - txt_clip.size[1] - POSITION_FROM_BOTTOM
+    y_position = text_position(clip.size, txt_clip.size)[1]
     txt_position = (x_position, y_position)
 
     txt_clip = txt_clip.set_position(txt_position).set_duration(clip.duration)
@@ -139,51 +156,149 @@ def overlay_text_on_clip(clip, text):
     final_clip = CompositeVideoClip([clip, txt_clip])
     return final_clip.set_duration(clip.duration)
 
-def concatenate_videos(video_folder, output_folder, quote_file):
-    video_files = [os.path.join(video_folder, f) for f in os.listdir(video_folder) if f.endswith(".mp4")]
-    video_files.sort()  # Sort to ensure they are in order
+class TextOverlay:
+    """Quote overlay composited once into cached premultiplied colour/alpha arrays.
+
+    Only the rectangle under the text is blended per frame, and the fade-in
+    scaling is computed only while the fade is active.
+    """
+
+    def __init__(self, text_rgba, frame_size):
+        frame_w, frame_h = frame_size
+        text_h, text_w = text_rgba.shape[:2]
+        x, y = text_position(frame_size, (text_w, text_h))
+        # Intersect the text rectangle with the frame (the quote may sit partly off-screen)
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(frame_w, x + text_w), min(frame_h, y + text_h)
+        self.region = (slice(y0, y1), slice(x0, x1)) if x1 > x0 and y1 > y0 else None
+        if self.region is None:
+            return
+        patch = text_rgba[y0 - y:y1 - y, x0 - x:x1 - x].astype(np.float32)
+        self.alpha = patch[..., 3:4] / 255.0
+        self.premultiplied = patch[..., :3] * self.alpha
+        self.inverse_alpha = 1.0 - self.alpha
+
+    def apply(self, frame, opacity=1.0):
+        if self.region is None or opacity <= 0:
+            return frame
+        background = frame[self.region].astype(np.float32)
+        if opacity >= 1.0:
+            blended = self.premultiplied + background * self.inverse_alpha
+        else:
+            blended = (self.premultiplied * opacity) + background * (1.0 - self.alpha * opacity)
+        out = frame.copy()
+        out[self.region] = np.clip(blended + 0.5, 0, 255).astype(np.uint8)
+        return out
+
+def _write_segment(clip, path, profile):
+    start = time.time()
+    clip.write_videofile(path, audio=False, logger=None, **profile.moviepy_kwargs())
+    encoding.log_encode_rate(profile, int(round(clip.duration * clip.fps)), time.time() - start, path)
+
+def _concat_copy(segment_paths, output_video_path, work_dir):
+    """Join already-encoded segments with ffmpeg's concat demuxer, without re-encoding"""
+    list_path = os.path.join(work_dir, "segments.txt")
+    with open(list_path, "w", encoding="utf-8") as list_file:
+        for segment_path in segment_paths:
+            list_file.write(f"file '{os.path.abspath(segment_path)}'\n")
+    cmd = [get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+           "-i", list_path, "-c", "copy", "-movflags", "+faststart", output_video_path]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg concat failed: {result.stderr}")
+
+def render_single_pass(clips, output_video_path, quote, profile):
+    """Render the doubled, captioned video while encoding each distinct frame only once.
+
+    The output is [fade-in head][body][steady head][body]: the body (everything
+    after the fade) is encoded once and stream-copied twice, so only
+    duration + FADEIN_DURATION seconds of video are rendered instead of
+    2 x duration.
+    """
+    base = concatenate_videoclips(clips, method="compose")
+    overlay = TextOverlay(render_text_image(quote, base.size[0]), base.size)
+    fade = round(FADEIN_DURATION * base.fps) / base.fps
+
+    faded = base.fl(lambda gf, t: overlay.apply(gf(t), min(1.0, t / FADEIN_DURATION)))
+    steady = base.fl(lambda gf, t: overlay.apply(gf(t)))
+
+    work_dir = tempfile.mkdtemp(prefix="mash_", dir=os.path.dirname(os.path.abspath(output_video_path)))
+    try:
+        head_fade = os.path.join(work_dir, "head_fade.mp4")
+        head_steady = os.path.join(work_dir, "head_steady.mp4")
+        body = os.path.join(work_dir, "body.mp4")
+        _write_segment(faded.subclip(0, fade), head_fade, profile)
+        _write_segment(steady.subclip(0, fade), head_steady, profile)
+        _write_segment(steady.subclip(fade, base.duration), body, profile)
+        _concat_copy([head_fade, body, head_steady, body], output_video_path, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def render_compose(clips, output_video_path, quote, profile):
+    """Original render: composite the quote over the full doubled clip frame by frame"""
+    # Duplicate each clip to double the final video length
+    final_clip = concatenate_videoclips(clips + clips.copy(), method="compose")
+
+    # Overlay text on the final clip
+    final_clip = overlay_text_on_clip(final_clip, quote)
+    start = time.time()
+    final_clip.write_videofile(output_video_path, **profile.moviepy_kwargs())
+    encoding.log_encode_rate(profile, int(round(final_clip.duration * final_clip.fps)), time.time() - start, output_video_path)
 
+def render_final_video(video_files: List[str], output_folder: str, quote: str) -> Optional[str]:
+    """Concatenate the upscaled clips, overlay the quote and return the final video path"""
     if not video_files:
         logging.warning("No video files found in the folder.")
-        return
+        return None
 
     all_clips = [VideoFileClip(video_file) for video_file in video_files]
 
-    # Duplicate each clip to double the final video length
-    all_clips = all_clips + all_clips.copy()
-
-    # Concatenate all clips
-    final_clip = concatenate_videoclips(all_clips, method="compose")
-
-    # Read the selected quote
-    selected_quote = read_quote(quote_file)
-
-    # Overlay text on the final clip
-    final_clip = overlay_text_on_clip(final_clip, selected_quote)
-
     # Generate video file name with current date and time
     current_datetime = datetime.datetime.now()
     output_video_name = current_datetime.strftime("final_output_%m%d%Y%H%M") + ".mp4"
     output_video_path = os.path.join(output_folder, output_video_name)
 
-    final_clip.write_videofile(output_video_path, codec="libx264")
+    total_duration = sum(clip.duration for clip in all_clips)
+    single_pass = (RENDER_MODE == "single-pass"
+                   and all(clip.audio is None for clip in all_clips)
+                   and total_duration > FADEIN_DURATION)
+    profile = encoding.get_profile()
+    try:
+        if single_pass:
+            render_single_pass(all_clips, output_video_path, quote, profile)
+        else:
+            render_compose(all_clips, output_video_path, quote, profile)
+    finally:
+        # Close all clips to free memory
+        for clip in all_clips:
+            clip.close()
 
     logging.info(f"Final video created: {output_video_path}")
+    return output_video_path
+
+def concatenate_videos(video_folder, output_folder, quote_file):
+    video_files = [os.path.join(video_folder, f) for f in os.listdir(video_folder) if f.endswith(".mp4")]
+    video_files.sort()  # Sort to ensure they are in order
+
+    # Read the selected quote
+    selected_quote = read_quote(quote_file)
 
-    # Close all clips to free memory
-    for clip in all_clips:
-        clip.close()
+    return render_final_video(video_files, output_folder, selected_quote)
 
 # Specify the directories (robust to current working directory)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 generations_folder = os.path.join(BASE_DIR, 'assets', 'upscale_generations')
 output_folder = os.path.join(BASE_DIR, 'output')
-
-# Main execution
 selected_quote_file = os.path.join(BASE_DIR, 'selected_quote.txt')  # Path to the selected quote file
 
-# Ensure output folder exists
-os.makedirs(output_folder, exist_ok=True)
+def main():
+    logging.basicConfig(filename="gen.log", level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+    # Ensure output folder exists
+    os.makedirs(output_folder, exist_ok=True)
+
+    # Concatenate the videos
+    concatenate_videos(generations_folder, output_folder, selected_quote_file)
 
-# Concatenate the videos
-concatenate_videos(generations_folder, output_folder, selected_quote_file)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+In-process pipeline for the custom generator.
+
+Imports each stage as a module and runs selector -> init images -> AnimateDiff
+-> upscale -> mash in a single interpreter, handing typed results from one
+stage to the next instead of re-reading them from disk. Every path a stage
+writes comes from the run's Workspace.
+
+Every finished item is recorded in the workspace's run manifest (see
+manifest.py); run_pipeline(resume=True) picks a failed run up from there.
+
+GEN_PIPELINE_MODE=streaming overlaps the three SD-bound stages: each stage
+runs in its own thread and hands finished items to the next through a bounded
+queue, so clip N's AnimateDiff request starts as soon as init image N is saved
+and clip N is upscaled as soon as its MP4 lands. A multi-prompt job then takes
+roughly as long as its slowest stage instead of the sum of all three.
+"""
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import selector
+import init_image_gen
+import generator
+import upscale
+import mash
+import encoding
+import manifest
+import progress
+import stage_cache
+from workspace import Workspace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sd_client
+
+# "staged" runs each stage to completion before the next; "streaming" overlaps them.
+# GEN_PIPELINE_QUEUE bounds how many finished items may wait between two stages.
+PIPELINE_MODE = os.getenv("GEN_PIPELINE_MODE", "staged").lower()
+try:
+    PIPELINE_QUEUE_SIZE = max(1, int(os.getenv("GEN_PIPELINE_QUEUE", "2")))
+except Exception:
+    PIPELINE_QUEUE_SIZE = 2
+
+# Marks the end of a stage's output on its queue
+_END = object()
+
+
+@dataclass
+class PipelineResult:
+    """Outputs of every stage of a custom generation run"""
+    selection: selector.CustomSelection
+    init_images: List[Tuple[str, str]] = field(default_factory=list)
+    clips: List[str] = field(default_factory=list)
+    upscaled_clips: List[str] = field(default_factory=list)
+    final_video: Optional[str] = None
+    stage_seconds: Dict[str, float] = field(default_factory=dict)
+    upscale_latency: Dict[str, Any] = field(default_factory=dict)
+    upscale_frames: Dict[str, int] = field(default_factory=dict)  # frames, keyframes, requests, reconstructed...
+    resumed_from: Optional[Dict[str, Any]] = None  # manifest summary when picking up an earlier attempt
+
+
+class StageError(Exception):
+    """Raised when a pipeline stage produces no usable output"""
+
+
+def _timed(result: PipelineResult, stage: str, func, *args, **kwargs):
+    progress.stage_started(stage, total=len(args[0]) if args and isinstance(args[0], list) else None)
+    start = time.time()
+    value = func(*args, **kwargs)
+    result.stage_seconds[stage] = time.time() - start
+    progress.stage_finished(stage, result.stage_seconds[stage])
+    return value
+
+
+def select(workspace: Workspace, character=None, environment=None, prompt=None) -> selector.CustomSelection:
+    """Resolve the selection from explicit arguments or the workspace parameters file"""
+    if not (character and environment and prompt):
+        params = selector.load_params(workspace.params_file)
+        if not params:
+            raise StageError("No parameters provided and no custom_params.json found")
+        character, environment, prompt = params
+
+    selection = selector.build_custom_selection(character, environment, prompt)
+    # Keep the on-disk artifacts so individual stages can still be re-run by hand
+    selector.write_selection(selection, output_file=workspace.prompt_file, quote_file=workspace.quote_file)
+    return selection
+
+
+def fingerprint(selection: selector.CustomSelection) -> str:
+    """Digest of everything that shapes a run's outputs; a resumed run must still match it"""
+    return stage_cache.get_cache().key("run", asdict(selection), generator.load_overrides(),
+                                       init_image_gen.build_payload(""), upscale.json_payload_template,
+                                       upscale.KEYFRAMES.to_dict() if upscale.KEYFRAMES else None,
+                                       encoding.get_profile().ffmpeg_args())
+
+
+def open_manifest(workspace: Workspace, character=None, environment=None, prompt=None,
+                  resume: bool = False) -> Tuple[selector.CustomSelection, manifest.RunManifest, bool]:
+    """Selection and manifest for this run: the earlier attempt's when resuming it is possible, else fresh ones.
+
+    Returns (selection, manifest, resumed).
+    """
+    previous = manifest.RunManifest.load(workspace.manifest_file, workspace.upscale_frames_dir) if resume else None
+    if previous is not None and previous.selection:
+        selection = selector.CustomSelection(**previous.selection)
+        requested = (character, environment, prompt)
+        if all(requested) and requested != (selection.character, selection.environment, selection.prompt_name):
+            logging.warning(f"Not resuming: run was for {selection.character}/{selection.environment}/"
+                            f"{selection.prompt_name}, not {'/'.join(requested)}")
+            previous = None
+        elif previous.fingerprint != fingerprint(selection):
+            logging.warning("Not resuming: generation settings changed since the earlier attempt")
+            previous = None
+        else:
+            selector.write_selection(selection, output_file=workspace.prompt_file, quote_file=workspace.quote_file)
+            previous.resumed()
+            return selection, previous, True
+    elif resume:
+        logging.info(f"Nothing to resume in {workspace.root}; starting a fresh run")
+
+    # Outputs of an attempt we can't build on would only be mistaken for this run's
+    workspace.clear()
+    selection = select(workspace, character, environment, prompt)
+    return selection, manifest.RunManifest.create(workspace.manifest_file, asdict(selection), fingerprint(selection),
+                                                  workspace.upscale_frames_dir), False
+
+
+def run_pipeline(character=None, environment=None, prompt=None,
+                 workspace: Optional[Workspace] = None, resume: bool = False) -> PipelineResult:
+    """Run all custom generator stages in this process and return their results.
+
+    With resume, outputs recorded in the workspace's manifest by an earlier
+    attempt are reused and only the missing ones are generated.
+    """
+    workspace = (workspace or Workspace.default()).create()
+    progress.report_sd_progress(sd_client.get_client())
+    start = time.time()
+    selection, run_manifest, resumed = open_manifest(workspace, character, environment, prompt, resume)
+    result = PipelineResult(selection=selection, stage_seconds={'selector': time.time() - start})
+    if resumed:
+        result.resumed_from = run_manifest.summary()
+        logging.info(f"Resuming attempt {result.resumed_from['attempts']}: {result.resumed_from}")
+    logging.info(f"Selected {len(selection.prompts)} prompt(s) for {selection.character} in {selection.environment}")
+
+    manifest.activate(run_manifest)
+    try:
+        if PIPELINE_MODE == 'streaming':
+            _run_streaming(result, workspace)
+        else:
+            _run_staged(result, workspace)
+
+        result.final_video = _timed(result, 'mash', mash.render_final_video,
+                                    result.upscaled_clips, workspace.output_dir, selection.quote)
+        if result.final_video:
+            run_manifest.record('mash', result.final_video)
+        run_manifest.finish('completed')
+    except BaseException as e:
+        run_manifest.finish('failed', str(e) or type(e).__name__)
+        raise
+    finally:
+        manifest.activate(manifest.RunManifest())
+    return result
+
+
+def _run_staged(result: PipelineResult, workspace: Workspace) -> None:
+    result.init_images = _timed(result, 'init_image_gen', init_image_gen.generate_init_images,
+                                result.selection.prompts, workspace.init_dir)
+    if not result.init_images:
+        raise StageError("init_image_gen produced no images")
+
+    result.clips = _timed(result, 'generator', generator.generate_clips,
+                          result.init_images, workspace.generations_dir)
+    if not result.clips:
+        raise StageError("generator produced no clips")
+
+    result.upscaled_clips = _timed(result, 'upscale', upscale.upscale_videos, result.clips,
+                                   workspace.lowscale_dir, workspace.upscale_dir,
+                                   workspace.upscale_generations_dir)
+    result.upscale_latency = upscale.frame_latency.summary()
+    result.upscale_frames = dict(upscale.frame_counts)
+    if not result.upscaled_clips:
+        raise StageError("upscale produced no clips")
+
+
+class _Stage(threading.Thread):
+    """One streaming stage: turns each (index, item) from inbox into (index, output) on outbox.
+
+    work(inbox_items) is an iterator of (index, output or None); failed items
+    are counted but not forwarded. Stage seconds are measured from the
+    pipeline start to this stage's last item, so the final stage's time is
+    the end-to-end latency.
+    """
+
+    def __init__(self, name: str, work, total: int, inbox: Optional[queue.Queue], outbox: queue.Queue,
+                 abort: threading.Event, started_at: float, report_items: bool = True):
+        super().__init__(name=f"pipeline-{name}", daemon=True)
+        self.stage = name
+        self.work = work
+        self.total = total
+        self.inbox = inbox
+        self.outbox = outbox
+        self.abort = abort
+        self.started_at = started_at
+        self.report_items = report_items
+        self.outputs: Dict[int, Any] = {}
+        self.seconds = 0.0
+        self.error: Optional[BaseException] = None
+
+    def items(self):
+        """Items from the upstream stage until it finishes or the pipeline aborts"""
+        while not self.abort.is_set():
+            try:
+                item = self.inbox.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if item is _END:
+                return
+            yield item
+
+    def _put(self, item) -> None:
+        # Never block forever on a consumer that has died
+        while not self.abort.is_set():
+            try:
+                self.outbox.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _end(self) -> None:
+        """Deliver _END even after an abort: whoever reads outbox waits for it to stop"""
+        while True:
+            try:
+                self.outbox.put(_END, timeout=0.5)
+                return
+            except queue.Full:
+                if self.abort.is_set():
+                    # The reader may be gone; outputs are discarded on abort anyway, so make room
+                    try:
+                        self.outbox.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def run(self) -> None:
+        progress.stage_started(self.stage, total=self.total)
+        try:
+            done = 0
+            for index, output in self.work(self.items() if self.inbox is not None else None):
+                done += 1
+                if self.report_items:
+                    progress.item_done(self.stage, done, self.total, ok=bool(output))
+                if output:
+                    self.outputs[index] = output
+                    self._put((index, output))
+                if self.abort.is_set():
+                    break
+        except BaseException as e:
+            logging.exception(f"Streaming stage {self.stage} failed")
+            self.error = e
+            self.abort.set()
+        finally:
+            self.seconds = time.time() - self.started_at
+            progress.stage_finished(self.stage, self.seconds)
+            self._end()
+
+
+def _run_streaming(result: PipelineResult, workspace: Workspace) -> None:
+    prompts = result.selection.prompts
+    # Stage directories already exist: run_pipeline created the workspace
+    upscale.frame_latency.reset()
+    upscale.frame_counts.clear()
+
+    def make_init_images(_):
+        yield from init_image_gen.iter_init_images(prompts, workspace.init_dir)
+
+    def make_clips(images):
+        yield from generator.iter_clips(((index, image_path, prompts[index]) for index, image_path in images),
+                                        workspace.generations_dir)
+
+    def upscale_clips(clips):
+        for index, clip_path in clips:
+            output_path = upscale.upscale_video(clip_path, workspace.lowscale_dir, workspace.upscale_dir,
+                                                workspace.upscale_generations_dir)
+            yield index, output_path if os.path.exists(output_path) else None
+
+    abort = threading.Event()
+    started_at = time.time()
+    images, clips, upscaled = (queue.Queue(maxsize=PIPELINE_QUEUE_SIZE) for _ in range(3))
+    stages = [
+        _Stage('init_image_gen', make_init_images, len(prompts), None, images, abort, started_at),
+        _Stage('generator', make_clips, len(prompts), images, clips, abort, started_at),
+        # upscale reports per frame itself; its outbox is drained below so it never blocks
+        _Stage('upscale', upscale_clips, len(prompts), clips, upscaled, abort, started_at, report_items=False),
+    ]
+    logging.info(f"Streaming {len(prompts)} prompt(s) through {len(stages)} stages (queue size {PIPELINE_QUEUE_SIZE})")
+    for stage in stages:
+        stage.start()
+    while True:
+        try:
+            if upscaled.get(timeout=0.5) is _END:
+                break
+        except queue.Empty:
+            # Stage threads always end with _END; this only guards against one dying without it
+            if not any(stage.is_alive() for stage in stages):
+                break
+    for stage in stages:
+        stage.join()
+        result.stage_seconds[stage.stage] = stage.seconds
+
+    init_stage, clip_stage, upscale_stage = stages
+    result.init_images = [(init_stage.outputs[i], prompts[i]) for i in sorted(init_stage.outputs)]
+    result.clips = [clip_stage.outputs[i] for i in sorted(clip_stage.outputs)]
+    result.upscaled_clips = [upscale_stage.outputs[i] for i in sorted(upscale_stage.outputs)]
+    result.upscale_latency = upscale.frame_latency.summary()
+    result.upscale_frames = dict(upscale.frame_counts)
+
+    for stage in stages:
+        if stage.error is not None:
+            raise StageError(f"{stage.stage} failed: {stage.error}") from stage.error
+    if not result.init_images:
+        raise StageError("init_image_gen produced no images")
+    if not result.clips:
+        raise StageError("generator produced no clips")
+    if not result.upscaled_clips:
+        raise StageError("upscale produced no clips")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Machine-readable progress events for the custom generator.
+
+When GEN_PROGRESS=1 (the webapp sets it), stages report what they are doing
+as single stdout lines of the form
+
+    PROGRESS {"event": "stage", "stage": "upscale", "state": "started", ...}
+
+which the webapp parses while call.py is still running and forwards to the
+dashboard. Besides stage and item events, "sd" events relay the WebUI's own
+step/ETA sampled by sd_client during each request, and "latency" events carry
+the upscale loop's per-frame request latency histogram. Without GEN_PROGRESS
+every call here is a no-op, so running the stages by hand prints nothing extra.
+"""
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List
+
+PREFIX = "PROGRESS "
+ENABLED = os.getenv("GEN_PROGRESS", "0").lower() in ("1", "true", "yes")
+
+_lock = threading.Lock()
+_current_stage = None
+
+
+def emit(event: str, **fields) -> None:
+    if not ENABLED:
+        return
+    line = PREFIX + json.dumps({"event": event, "ts": time.time(), **fields}, separators=(",", ":"), default=str)
+    # Upscale workers report from several threads; keep lines whole
+    with _lock:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+
+def stage_started(stage: str, total=None) -> None:
+    global _current_stage
+    _current_stage = stage
+    emit("stage", stage=stage, state="started", total=total)
+
+
+def stage_finished(stage: str, seconds: float) -> None:
+    emit("stage", stage=stage, state="finished", seconds=round(seconds, 3))
+
+
+def item_done(stage: str, done: int, total=None, **fields) -> None:
+    """One unit of work finished in stage: an init image, a clip, or an upscaled frame"""
+    emit("item", stage=stage, done=done, total=total, **fields)
+
+
+def sd_sample(sample: Dict[str, Any]) -> None:
+    """sd_client progress listener: forward a /sdapi/v1/progress sample as an 'sd' event"""
+    emit("sd", stage=_current_stage, **sample)
+
+
+def report_sd_progress(client) -> None:
+    """Have client sample WebUI progress during requests, if progress events are on"""
+    if ENABLED:
+        client.progress_listener = sd_sample
+
+
+class LatencyHistogram:
+    """Per-request latencies in fixed cumulative buckets, plus exact percentiles over the raw samples"""
+
+    BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples: List[float] = []
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {"count": 0}
+        # Cumulative, as le_ means in Prometheus: le_5 counts every request that took at most 5s
+        buckets = {f"le_{bound:g}": bisect.bisect_right(samples, bound) for bound in self.BUCKETS}
+        buckets["le_inf"] = len(samples)
+
+        def pct(p):
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))], 3)
+
+        return {
+            "count": len(samples),
+            "mean": round(sum(samples) / len(samples), 3),
+            "p50": pct(0.50),
+            "p90": pct(0.90),
+            "p99": pct(0.99),
+            "max": round(samples[-1], 3),
+            "buckets": buckets,
+        }
+
+
+def parse(line: str):
+    """Inverse of emit for readers of call.py output; returns the event dict or None"""
+    if not line.startswith(PREFIX):
+        return None
+    try:
+        return json.loads(line[len(PREFIX):])
+    except ValueError:
+        return None
@@ -6,42 +6,39 @@ import os
 import sys
 import json
 import logging
+from dataclasses import dataclass
+from typing import List, Optional
 
-# Set up logging
-logging.basicConfig(filename="gen.log", level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+from workspace import ASSETS_DIR
+
+# Shared asset catalog lives one level up in generators/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import asset_catalog
+
+
+@dataclass
+class CustomSelection:
+    """Prompts and quote resolved from the user's character/environment/prompt choice"""
+    character: str
+    environment: str
+    prompt_name: str
+    prompts: List[str]
+    quote: str
 
 def read_file_lines(file_path):
     """Read lines from a file"""
     with open(file_path, 'r', encoding='utf-8') as file:
         return [line.strip() for line in file.readlines()]
 
-def get_character_by_name(character_name, characters_file="assets/devices/characters.txt"):
+def get_character_by_name(character_name, assets_dir=ASSETS_DIR):
     """Get character details by name"""
-    characters = read_file_lines(characters_file)
-    for character_line in characters:
-        character_parts = character_line.split(',')
-        if len(character_parts) >= 4 and character_parts[0].strip() == character_name:
-            return {
-                'name': character_parts[0].strip(),
-                'lora': character_parts[1].strip(),
-                'activator': character_parts[2].strip(),
-                'quote_directory': character_parts[3].strip()
-            }
-    return None
-
-def get_environment_by_name(environment_name, environments_file="assets/devices/environments.txt"):
+    return asset_catalog.get_catalog(assets_dir).character(character_name)
+
+def get_environment_by_name(environment_name, assets_dir=ASSETS_DIR):
     """Get environment details by name"""
-    environments = read_file_lines(environments_file)
-    for env_line in environments:
-        env_parts = env_line.split(',')
-        if len(env_parts) >= 1 and env_parts[0].strip() == environment_name:
-            return {
-                'name': env_parts[0].strip(),
-                'lora': env_parts[1].strip() if len(env_parts) > 1 else ''
-            }
-    return None
-
-def get_quote_from_character(character_quote_directory, quotes_dir="assets/quotes"):
+    return asset_catalog.get_catalog(assets_dir).environment(environment_name)
+
+def get_quote_from_character(character_quote_directory, quotes_dir=os.path.join(ASSETS_DIR, "quotes")):
     """Get a specific quote from a character's quote directory"""
     quote_dir = os.path.join(quotes_dir, character_quote_directory)
     if not os.path.exists(quote_dir):
@@ -57,57 +54,85 @@ def get_quote_from_character(character_quote_directory, quotes_dir="assets/quote
     logging.info(f"Selected quote from directory '{character_quote_directory}': {quote_lines[0]}")
     return "\n".join(quote_lines[:2])
 
-def get_prompt_content(prompt_name, prompt_dir="assets/prompts"):
+def get_prompt_content(prompt_name, assets_dir=ASSETS_DIR):
     """Get prompt content by name"""
-    prompt_file_path = os.path.join(prompt_dir, f"{prompt_name}.txt")
-    if not os.path.exists(prompt_file_path):
-        raise FileNotFoundError(f"Prompt file not found: {prompt_file_path}")
-    
-    return read_file_lines(prompt_file_path)
+    lines = asset_catalog.get_catalog(assets_dir).prompt_lines(prompt_name)
+    if lines is None:
+        raise FileNotFoundError(f"Prompt file not found: {os.path.join(assets_dir, 'prompts', prompt_name + '.txt')}")
+    return lines
+
+def load_params(params_file="custom_params.json"):
+    """Load character/environment/prompt names from the webapp parameters file"""
+    if not os.path.exists(params_file):
+        return None
+    with open(params_file, 'r') as f:
+        params = json.load(f)
+    return params.get('character'), params.get('environment'), params.get('prompt')
+
+def build_custom_selection(character_name, environment_name, prompt_name) -> CustomSelection:
+    """Resolve user selections into the final prompt lines and formatted quote"""
+    # Get character details
+    character = get_character_by_name(character_name)
+    if not character:
+        raise ValueError(f"Character not found: {character_name}")
+
+    # Get environment details
+    environment = get_environment_by_name(environment_name)
+    if not environment:
+        raise ValueError(f"Environment not found: {environment_name}")
 
-def create_custom_prompt(character_name, environment_name, prompt_name, output_file="prompt.txt"):
+    # Get prompt content
+    prompt_lines = get_prompt_content(prompt_name)
+
+    # Get quote for the character
+    quote = get_quote_from_character(character['quote_directory'])
+    quote_lines = quote.split('\n')
+    formatted_quote = f'"{quote_lines[0]}"\n-{quote_lines[1]}' if len(quote_lines) > 1 else f'"{quote}"'
+
+    # Replace placeholders in prompt
+    prompts = []
+    for prompt in prompt_lines:
+        if not prompt:
+            continue
+        modified_prompt = prompt.replace("[CHARACTER]", character['name'])
+        modified_prompt = modified_prompt.replace("[ENVIRONMENT]", environment['name'])
+        modified_prompt = modified_prompt.replace("[LORA]", character['lora']) if character['lora'] else modified_prompt.replace("[LORA]", '')
+        modified_prompt = modified_prompt.replace("[ACTIVATOR]", character['activator']) if character['activator'] else modified_prompt.replace("[ACTIVATOR]", '')
+        prompts.append(modified_prompt)
+
+    return CustomSelection(
+        character=character_name,
+        environment=environment_name,
+        prompt_name=prompt_name,
+        prompts=prompts,
+        quote=formatted_quote,
+    )
+
+def write_selection(selection: CustomSelection, output_file="prompt.txt", quote_file="selected_quote.txt"):
+    """Persist a selection in the file layout the standalone stage scripts read"""
+    with open(quote_file, 'w', encoding='utf-8') as file:
+        file.write(selection.quote)
+
+    with open(output_file, 'w', encoding='utf-8') as file:
+        for prompt in selection.prompts:
+            file.write(f"{prompt}\n\n")
+
+def create_custom_prompt(character_name, environment_name, prompt_name, output_file="prompt.txt") -> Optional[CustomSelection]:
     """Create a custom prompt using user selections"""
     try:
-        # Get character details
-        character = get_character_by_name(character_name)
-        if not character:
-            raise ValueError(f"Character not found: {character_name}")
-        
-        # Get environment details
-        environment = get_environment_by_name(environment_name)
-        if not environment:
-            raise ValueError(f"Environment not found: {environment_name}")
-        
-        # Get prompt content
-        prompt_lines = get_prompt_content(prompt_name)
-        
-        # Get quote for the character
-        quote = get_quote_from_character(character['quote_directory'])
-        quote_lines = quote.split('\n')
-        formatted_quote = f'"{quote_lines[0]}"\n-{quote_lines[1]}' if len(quote_lines) > 1 else f'"{quote}"'
-        
-        # Save the formatted quote
-        with open('selected_quote.txt', 'w', encoding='utf-8') as file:
-            file.write(formatted_quote)
-        
-        # Replace placeholders in prompt
-        with open(output_file, 'w', encoding='utf-8') as file:
-            for prompt in prompt_lines:
-                modified_prompt = prompt.replace("[CHARACTER]", character['name'])
-                modified_prompt = modified_prompt.replace("[ENVIRONMENT]", environment['name'])
-                modified_prompt = modified_prompt.replace("[LORA]", character['lora']) if character['lora'] else modified_prompt.replace("[LORA]", '')
-                modified_prompt = modified_prompt.replace("[ACTIVATOR]", character['activator']) if character['activator'] else modified_prompt.replace("[ACTIVATOR]", '')
-                file.write(f"{modified_prompt}\n\n")
-        
+        selection = build_custom_selection(character_name, environment_name, prompt_name)
+        write_selection(selection, output_file=output_file)
         logging.info(f"Custom prompt created with Character: {character_name}, Environment: {environment_name}, Prompt: {prompt_name}")
-        return True
-        
+        return selection
+
     except Exception as e:
         logging.error(f"Error creating custom prompt: {e}")
-        return False
+        return None
 
 def main():
     """Main execution - reads parameters from command line or config file"""
+    logging.basicConfig(filename="gen.log", level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
     # Check if parameters are provided via command line
     if len(sys.argv) >= 4:
         character_name = sys.argv[1]
@@ -115,19 +140,15 @@ def main():
         prompt_name = sys.argv[3]
     else:
         # Check for parameters file (created by webapp)
-        params_file = "custom_params.json"
-        if os.path.exists(params_file):
-            with open(params_file, 'r') as f:
-                params = json.load(f)
-            character_name = params.get('character')
-            environment_name = params.get('environment')
-            prompt_name = params.get('prompt')
+        params = load_params()
+        if params:
+            character_name, environment_name, prompt_name = params
         else:
             logging.error("No parameters provided. Use: python selector.py <character> <environment> <prompt>")
             print("Error: No parameters provided")
             return False
     
-    success = create_custom_prompt(character_name, environment_name, prompt_name)
+    success = create_custom_prompt(character_name, environment_name, prompt_name) is not None
     if success:
         print(f"Custom prompt created successfully with {character_name}, {environment_name}, {prompt_name}")
     else:
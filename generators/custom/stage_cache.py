@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache for custom generator stage outputs.
+
+Each stage hashes the request it is about to send (the full SD payload, plus
+the source video bytes for upscaling) and looks the digest up here before
+calling the API. Outputs are stored under assets/cache in the generator
+directory, shared by every workspace, and evicted least-recently-used first
+once the cache grows past GEN_CACHE_MAX_BYTES.
+
+A request that leaves its seed to the WebUI (seed -1, or no seed at all) is
+meant to give a different result every time, so it gets no key (see
+request_key) and is never cached; only its downstream stages, whose inputs
+are then new bytes, can hit. Set GEN_CACHE=0 to bypass the cache entirely.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from typing import Any, Dict, Optional
+
+from workspace import ASSETS_DIR
+
+CACHE_DIR = os.path.join(ASSETS_DIR, "cache")
+CACHE_ENABLED = os.getenv("GEN_CACHE", "1").lower() not in ("0", "false", "no")
+try:
+    CACHE_MAX_BYTES = int(os.getenv("GEN_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+except Exception:
+    CACHE_MAX_BYTES = 5 * 1024 ** 3
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# Other processes store into the same cache, so the running size total is re-measured this often
+RESCAN_EVERY_STORES = 100
+# Eviction frees down to this fraction of GEN_CACHE_MAX_BYTES so a full cache isn't rescanned on every store
+EVICT_TO_FRACTION = 0.9
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class StageCache:
+    """Size-bounded LRU store of stage artifacts keyed by a digest of their inputs"""
+
+    def __init__(self, root: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES, enabled: bool = CACHE_ENABLED):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        # Running size of the cache; None until the first scan
+        self._total_bytes: Optional[int] = None
+        self._stores_since_scan = 0
+
+    def key(self, stage: str, *parts: Any) -> str:
+        """Digest of the stage name and its inputs; dicts are hashed as canonical JSON"""
+        digest = hashlib.sha256(stage.encode("utf-8"))
+        for part in parts:
+            if isinstance(part, bytes):
+                data = part
+            elif isinstance(part, str):
+                data = part.encode("utf-8")
+            else:
+                data = json.dumps(part, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+            # Length-prefix each part so ("ab", "c") and ("a", "bc") differ
+            digest.update(len(data).to_bytes(8, "big"))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def request_key(self, stage: str, payload: Dict[str, Any], *parts: Any) -> Optional[str]:
+        """Key for an SD request payload, or None if its seed is random and the result must not be reused"""
+        if payload.get("seed", -1) == -1:
+            return None
+        return self.key(stage, payload, *parts)
+
+    def _entry_path(self, stage: str, key: str, ext: str) -> str:
+        return os.path.join(self.root, stage, key[:2], key + ext)
+
+    def _count(self, stage: str, outcome: str) -> None:
+        with self._lock:
+            counts = self._stats.setdefault(stage, {"hits": 0, "misses": 0, "stores": 0, "evictions": 0})
+            counts[outcome] += 1
+
+    def fetch(self, stage: str, key: Optional[str], output_path: str) -> bool:
+        """Copy a cached artifact to output_path; returns False on a miss or without a key"""
+        if not self.enabled or key is None:
+            return False
+        entry = self._entry_path(stage, key, os.path.splitext(output_path)[1])
+        try:
+            shutil.copyfile(entry, output_path)
+            # Mark as recently used for eviction
+            os.utime(entry)
+        except FileNotFoundError:
+            self._count(stage, "misses")
+            return False
+        self._count(stage, "hits")
+        logging.info(f"Cache hit for {stage} -> {output_path}")
+        return True
+
+    def store(self, stage: str, key: Optional[str], output_path: str) -> None:
+        """Copy a freshly produced artifact into the cache and evict down to max_bytes"""
+        if not self.enabled or key is None or not os.path.exists(output_path):
+            return
+        entry = self._entry_path(stage, key, os.path.splitext(output_path)[1])
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        # Unique temp name so concurrent runs storing the same key don't collide
+        partial = f"{entry}.{os.getpid()}.{threading.get_ident()}.part"
+        try:
+            shutil.copyfile(output_path, partial)
+            size = os.path.getsize(partial)
+            try:
+                replaced = os.path.getsize(entry)
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(partial, entry)
+        except OSError as e:
+            logging.warning(f"Failed to cache {output_path}: {e}")
+            if os.path.exists(partial):
+                os.unlink(partial)
+            return
+        self._count(stage, "stores")
+        with self._lock:
+            self._stores_since_scan += 1
+            if self._total_bytes is not None:
+                self._total_bytes += size - replaced
+            # Only walk the tree when the cache may be over budget, or the total may have drifted
+            scan = (self._total_bytes is None or self._total_bytes > self.max_bytes
+                    or self._stores_since_scan >= RESCAN_EVERY_STORES)
+        if scan:
+            self.evict()
+
+    def evict(self) -> int:
+        """Scan the cache and delete least-recently-used entries until it fits max_bytes; returns bytes freed"""
+        entries = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith(".part"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+
+        freed = 0
+        target = self.max_bytes * EVICT_TO_FRACTION if total > self.max_bytes else self.max_bytes
+        entries.sort()
+        for _, size, path in entries:
+            if total - freed <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                continue
+            freed += size
+            stage = os.path.relpath(path, self.root).split(os.sep)[0]
+            self._count(stage, "evictions")
+        with self._lock:
+            self._total_bytes = total - freed
+            self._stores_since_scan = 0
+        if freed:
+            logging.info(f"Evicted {freed} bytes from stage cache {self.root}")
+        return freed
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {stage: dict(counts) for stage, counts in self._stats.items()}
+
+
+_cache: Optional[StageCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> StageCache:
+    """Process-wide cache shared by every stage"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = StageCache()
+    return _cache
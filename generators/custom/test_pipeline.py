@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Test script for streaming pipeline failure handling
+
+Runs run_pipeline in streaming mode with stubbed stage functions (no WebUI
+needed) and checks that a stage raising makes run_pipeline raise StageError
+instead of hanging.
+"""
+import os
+import sys
+import tempfile
+import threading
+
+# Add the current directory to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pipeline
+import manifest
+import selector
+import init_image_gen
+import generator
+import upscale
+from workspace import Workspace
+
+PROMPTS = [f"prompt {i}" for i in range(6)]
+TIMEOUT = 30
+
+
+def _open_manifest(workspace, *args, **kwargs):
+    selection = selector.CustomSelection("Goku", "Kitchen", "cooking", PROMPTS, "quote")
+    return selection, manifest.RunManifest(), False
+
+
+def _init_images(prompts, output_dir, *args, **kwargs):
+    for i in range(len(prompts)):
+        yield i, os.path.join(output_dir, f"init_{i:04d}.png")
+
+
+def _clips(items, output_dir, *args, **kwargs):
+    for i, image_path, prompt in items:
+        yield i, os.path.join(output_dir, f"generation_{i:04d}.mp4")
+
+
+def _fail(*args, **kwargs):
+    raise RuntimeError("injected stage failure")
+
+
+def _fail_after_first(func):
+    def wrapper(items, *args, **kwargs):
+        for n, item in enumerate(func(items, *args, **kwargs)):
+            if n == 1:
+                raise RuntimeError("injected stage failure")
+            yield item
+    return wrapper
+
+
+def run_with_failing_stage(name, patches):
+    """Run the streaming pipeline with patches applied; True if it raised StageError in time"""
+    print(f"\nTesting streaming pipeline with failing {name}...")
+    originals = [(module, attr, getattr(module, attr)) for module, attr, _ in patches]
+    for module, attr, value in patches:
+        setattr(module, attr, value)
+    outcome = {}
+
+    def target():
+        try:
+            with tempfile.TemporaryDirectory() as root:
+                pipeline.run_pipeline(workspace=Workspace(root))
+            outcome['error'] = None
+        except BaseException as e:
+            outcome['error'] = e
+
+    try:
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        thread.join(TIMEOUT)
+    finally:
+        for module, attr, value in originals:
+            setattr(module, attr, value)
+
+    if thread.is_alive():
+        print(f"run_pipeline still running after {TIMEOUT}s")
+        return False
+    error = outcome['error']
+    print(f"run_pipeline raised: {error!r}")
+    return isinstance(error, pipeline.StageError)
+
+
+def test_streaming_stage_failures():
+    """Each streaming stage raising makes run_pipeline raise StageError"""
+    common = [(pipeline, 'open_manifest', _open_manifest), (pipeline, 'PIPELINE_MODE', 'streaming'),
+              (pipeline, 'PIPELINE_QUEUE_SIZE', 1)]
+    cases = {
+        'init_image_gen': [(init_image_gen, 'iter_init_images', _fail_after_first(lambda p, d: _init_images(p, d))),
+                           (generator, 'iter_clips', _clips), (upscale, 'upscale_video', _fail)],
+        'generator': [(init_image_gen, 'iter_init_images', _init_images),
+                      (generator, 'iter_clips', _fail_after_first(_clips)),
+                      (upscale, 'upscale_video', lambda clip_path, *args, **kwargs: clip_path)],
+        'upscale': [(init_image_gen, 'iter_init_images', _init_images),
+                    (generator, 'iter_clips', _clips), (upscale, 'upscale_video', _fail)],
+    }
+    results = {name: run_with_failing_stage(name, common + patches) for name, patches in cases.items()}
+    assert all(results.values()), results
+
+
+def main():
+    print("Streaming Pipeline Test")
+    print("=" * 50)
+    try:
+        test_streaming_stage_failures()
+    except AssertionError as e:
+        print(f"\n❌ Failed: {e}")
+        sys.exit(1)
+    print("\n✅ All streaming failure cases raised StageError")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Test script for resuming a partly failed upscale
+
+Upscales a small synthetic clip with a stubbed img2img call (no WebUI
+needed) that fails one frame, then resumes the run and checks that only that
+frame is requested again and that the partial clip was never cached or
+marked done. Covers the full per-frame upscale and keyframe mode.
+"""
+import os
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+# Add the current directory to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import manifest
+import stage_cache
+import temporal
+import upscale
+
+FRAMES = 8
+SIZE = 64
+BLOCK = 16  # top-left block whose brightness encodes the frame index
+STEP = 30
+
+
+def make_clip(path):
+    """Near-identical grey frames, told apart only by a small block"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 8, (SIZE, SIZE))
+    for i in range(FRAMES):
+        frame = np.full((SIZE, SIZE, 3), 128, dtype=np.uint8)
+        frame[:BLOCK, :BLOCK] = i * STEP
+        writer.write(frame)
+    writer.release()
+
+
+def frame_index(frame):
+    return int(round(frame[2:BLOCK - 2, 2:BLOCK - 2].mean() / STEP))
+
+
+class FakeUpscaler:
+    """Stands in for upscale_frame: records requested frame indexes and fails the ones in failing"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.requested = []
+
+    def __call__(self, frame, api_url, json_payload_template):
+        index = frame_index(frame)
+        self.requested.append(index)
+        if index in self.failing:
+            return None
+        upscaled = cv2.resize(frame, (SIZE * 2, SIZE * 2), interpolation=cv2.INTER_CUBIC)
+        return cv2.imencode(".png", upscaled)[1].tobytes()
+
+
+def run_upscale(root, clip_path, fake):
+    """One attempt of the pipeline's upscale stage against the run manifest in root"""
+    manifest_path = os.path.join(root, "manifest.json")
+    frames_root = os.path.join(root, "upscale_frames")
+    run_manifest = manifest.RunManifest.load(manifest_path, frames_root)
+    if run_manifest is None:
+        run_manifest = manifest.RunManifest.create(manifest_path, {}, "test", frames_root)
+    else:
+        run_manifest.resumed()
+    manifest.activate(run_manifest)
+    upscale.upscale_frame = fake
+    try:
+        output_dir = os.path.join(root, "upscale_generations")
+        os.makedirs(output_dir, exist_ok=True)
+        return upscale.upscale_video(clip_path, upscale_generations_dir=output_dir), run_manifest
+    finally:
+        manifest.activate(manifest.RunManifest())
+
+
+def check_resume(keyframes, failing_frame):
+    """Fail failing_frame, resume, and check only it is re-requested; returns the requests of each attempt"""
+    originals = (upscale.upscale_frame, upscale.KEYFRAMES, upscale.RETRY_BACKOFF_SEC, stage_cache._cache)
+    with tempfile.TemporaryDirectory() as root:
+        upscale.KEYFRAMES = keyframes
+        upscale.RETRY_BACKOFF_SEC = 0
+        cache = stage_cache._cache = stage_cache.StageCache(root=os.path.join(root, "cache"), enabled=True)
+        try:
+            clip_path = os.path.join(root, "generation_0000.mp4")
+            make_clip(clip_path)
+
+            first = FakeUpscaler(failing={failing_frame})
+            output_path, run_manifest = run_upscale(root, clip_path, first)
+            assert failing_frame in first.requested
+            assert not run_manifest.fetch("upscale", output_path), "clip with a failed frame was marked done"
+            assert cache.stats().get("upscale", {}).get("stores", 0) == 0, "clip with a failed frame was cached"
+            assert run_manifest.has_frames(clip_path), "no frame checkpoints left for the resume"
+
+            second = FakeUpscaler()
+            output_path, run_manifest = run_upscale(root, clip_path, second)
+            assert second.requested == [failing_frame], f"resume requested {second.requested}"
+            assert run_manifest.fetch("upscale", output_path)
+            assert cache.stats()["upscale"]["stores"] == 1
+            assert not run_manifest.has_frames(clip_path)
+            assert upscale.video_frame_count(output_path) == FRAMES
+            return first.requested, second.requested
+        finally:
+            upscale.upscale_frame, upscale.KEYFRAMES, upscale.RETRY_BACKOFF_SEC, stage_cache._cache = originals
+
+
+def test_resume_full_upscale():
+    """Full mode: a frame that failed is the only one requested on resume"""
+    check_resume(None, failing_frame=3)
+
+
+def test_resume_keyframe_upscale():
+    """Keyframe mode: a failed keyframe is rebuilt for now, then requested alone on resume"""
+    # Frames differ by less than the threshold, so keyframes fall every max_gap frames: 0, 2, 4, 6
+    settings = temporal.KeyframeSettings(threshold=0.05, max_gap=2, flow=False)
+    first, second = check_resume(settings, failing_frame=2)
+    assert sorted(set(first)) == [0, 2, 4, 6], f"keyframes requested: {sorted(set(first))}"
+
+
+def main():
+    print("Upscale Resume Test")
+    print("=" * 50)
+    for test in (test_resume_full_upscale, test_resume_keyframe_upscale):
+        print(f"\n{test.__doc__}")
+        try:
+            test()
+        except AssertionError as e:
+            print(f"❌ Failed: {e}")
+            sys.exit(1)
+        print("✅ Passed")
+
+
+if __name__ == "__main__":
+    main()
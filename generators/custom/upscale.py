@@ -1,13 +1,29 @@
+import argparse
 import cv2
 import os
-import requests
+import shutil
+import sys
+import tempfile
 import base64
 import json
 import logging
-import cv2
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import requests
 
-# Initialize logging
-logging.basicConfig(filename="gen.log", level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+import encoding
+import manifest
+import progress
+import stage_cache
+import temporal
+
+# Shared SD API client lives one level up in generators/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sd_client
 
 # Overrides from env
 try:
@@ -20,75 +36,313 @@ except Exception:
 UPSCALE_WIDTH = BASE_WIDTH * 2
 UPSCALE_HEIGHT = BASE_HEIGHT * 2
 
+# Concurrency: number of img2img requests kept in flight (two per SD backend by default) and retries per frame
+try:
+    UPSCALE_WORKERS = max(1, int(os.getenv("GEN_UPSCALE_WORKERS", str(2 * max(1, len(sd_client.SD_BACKENDS))))))
+    UPSCALE_RETRIES = max(0, int(os.getenv("GEN_UPSCALE_RETRIES", "2")))
+except Exception:
+    UPSCALE_WORKERS = 2
+    UPSCALE_RETRIES = 2
+RETRY_BACKOFF_SEC = 2.0
+
+# Debug: also dump low/upscaled frames as PNGs under assets/lowscale and assets/upscale
+DEBUG_FRAMES = os.getenv("GEN_DEBUG_FRAMES", "0").lower() in ("1", "true", "yes")
+# Fast, lossless PNG compression for frames sent to the API
+PNG_COMPRESSION = 1
+
+# img2img latency of every frame request in the current upscale_videos call
+frame_latency = progress.LatencyHistogram()
+# Frames, keyframes, requests and rebuilt frames over the same calls (see iter_upscaled)
+frame_counts = Counter()
+
+# GEN_UPSCALE_MODE=keyframe: only diffuse frames that changed (see temporal.py)
+KEYFRAMES = temporal.get_settings()
+
+
+def encode_frame(frame) -> str:
+    """PNG-encode a decoded BGR frame straight to base64 (the only encode per frame)"""
+    ok, buffer = cv2.imencode('.png', frame, [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION])
+    if not ok:
+        raise ValueError("Failed to PNG-encode frame")
+    return base64.b64encode(buffer.tobytes()).decode('utf-8')
+
+
+def decode_frame(image_data: bytes):
+    """Decode PNG bytes returned by the API into a BGR frame"""
+    return cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), cv2.IMREAD_COLOR)
 
-def upscale_frame(frame_path, api_url, headers, json_payload_template):
-    with open(frame_path, "rb") as image_file:
-        encoded_image = base64.b64encode(image_file.read()).decode('utf-8')
 
+def upscale_frame(frame, api_url, json_payload_template) -> Optional[bytes]:
+    """Send one in-memory frame through img2img and return the upscaled PNG bytes"""
     json_payload = json_payload_template.copy()
-    json_payload["init_images"] = [encoded_image]
-
-    response = requests.post(api_url, headers=headers, json=json_payload)
-    
-    if response.status_code == 200:
-        r = response.json()
-        if 'images' in r and r['images']:
-            base64_data = r['images'][0]
-            image_data = base64.b64decode(base64_data)
-            return image_data
-    else:
-        logging.error(f"API call failed for {frame_path}. Status Code: {response.status_code}, Response: {response.text}")
+    json_payload["init_images"] = [encode_frame(frame)]
+
+    try:
+        return sd_client.post_for_image(api_url, json_payload)
+    except sd_client.SDAPIError as e:
+        logging.error(f"API call failed. Status Code: {e.status_code}, Response: {e.text}")
+        if e.status_code in sd_client.RETRY_STATUSES:
+            # sd_client has already retried (and failed over) gateway errors
+            raise
         return None
 
 
-def extract_frames(video_path, output_dir):
-    vidcap = cv2.VideoCapture(video_path)
-    success, image = vidcap.read()
-    count = 0
+def _with_retries(func: Callable, item, index: int, retries: int):
+    """Call func(item), retrying with linear backoff on empty results and local errors.
+
+    Transport errors and gateway statuses are not retried here: sd_client has
+    already re-sent the request as far as that is safe, and retrying it again
+    would multiply its attempts (or render a frame the WebUI already has).
+    """
+    for attempt in range(retries + 1):
+        try:
+            result = func(item)
+            if result is not None:
+                return result
+            logging.warning(f"Frame {index} returned no image (attempt {attempt + 1}/{retries + 1})")
+        except (requests.exceptions.RequestException, sd_client.SDAPIError) as e:
+            logging.error(f"Frame {index} failed: {e}")
+            return None
+        except Exception as e:
+            logging.warning(f"Frame {index} failed (attempt {attempt + 1}/{retries + 1}): {e}")
+        if attempt < retries:
+            time.sleep(RETRY_BACKOFF_SEC * (attempt + 1))
+    logging.error(f"Frame {index} failed after {retries + 1} attempts")
+    return None
+
+
+def dispatch_ordered(items: Iterable, func: Callable, workers: int = UPSCALE_WORKERS,
+                     retries: int = UPSCALE_RETRIES) -> Iterator[Tuple[int, Any]]:
+    """Run func over items with at most `workers` calls in flight, yielding (index, result) in input order.
+
+    Items are pulled lazily, so a slow consumer or a slow backend stops new
+    submissions (backpressure) instead of queueing every frame up front.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for index, item in enumerate(items):
+            if len(pending) >= workers:
+                done_index, future = pending.popleft()
+                yield done_index, future.result()
+            pending.append((index, executor.submit(_with_retries, func, item, index, retries)))
+        while pending:
+            done_index, future = pending.popleft()
+            yield done_index, future.result()
 
-    while success:
-        frame_path = os.path.join(output_dir, f"frame{count:04d}.png")
-        cv2.imwrite(frame_path, image)     
+
+def iter_frames(video_path):
+    """Yield decoded frames from a video without touching the disk"""
+    vidcap = cv2.VideoCapture(video_path)
+    try:
         success, image = vidcap.read()
-        count += 1
-    
+        while success:
+            yield image
+            success, image = vidcap.read()
+    finally:
+        vidcap.release()
+
+
+def video_fps(video_path) -> float:
+    vidcap = cv2.VideoCapture(video_path)
     fps = vidcap.get(cv2.CAP_PROP_FPS)
-    return count, fps  # Return the total number of frames extracted and the fps
+    vidcap.release()
+    return fps
+
 
+def video_frame_count(video_path) -> int:
+    vidcap = cv2.VideoCapture(video_path)
+    count = int(vidcap.get(cv2.CAP_PROP_FRAME_COUNT))
+    vidcap.release()
+    return count
+
+
+# Result of a non-keyframe "request": the consumer rebuilds it from the last keyframe
+_REBUILD = object()
+
+
+def frame_checkpoint_path(frames_dir, index) -> str:
+    return os.path.join(frames_dir, f"frame{index:04d}.png")
+
+
+def iter_upscaled(video_path, api_url, json_payload_template, frames_dir=None, keyframes=None,
+                  lowscale_dir=None, upscale_dir=None, stats=None):
+    """Yield (index, upscaled BGR frame or None) for every frame of video_path, in order.
 
-def create_video_from_frames(frame_folder, output_video_path, fps):
-    frame_files = sorted([os.path.join(frame_folder, file) for file in os.listdir(frame_folder) if file.endswith('.png')])
-    if not frame_files:
-        logging.error("No frames found in the folder.")
-        return
+    With frames_dir, each upscaled frame is also checkpointed there as it
+    arrives, and frames already checkpointed by an earlier attempt are read
+    back instead of being requested again. With keyframes (temporal.
+    KeyframeSettings) only keyframes go through img2img and the frames in
+    between are rebuilt from the last upscaled keyframe. stats, if given, is
+    filled with frame and request counts.
+    """
+    stats = {} if stats is None else stats
+    stats.update(frames=0, keyframes=0, requests=0, resumed=0, reconstructed=0, failed=0)
+    run_manifest = manifest.get_manifest()
+    selector = temporal.KeyframeSelector(keyframes) if keyframes else None
+    reconstructor = None
+    # (low-res frame, is keyframe, flow to the keyframe) by index until the frame's result comes back
+    in_flight = {}
+    checkpointed = sum(1 for name in os.listdir(frames_dir) if name.endswith(".png")) if frames_dir else 0
+    if checkpointed:
+        logging.info(f"Resuming {video_path} from {checkpointed} checkpointed frame(s)")
 
-    frame = cv2.imread(frame_files[0])
-    height, width, layers = frame.shape
-    size = (width, height)
+    def _frames():
+        for i, frame in enumerate(iter_frames(video_path)):
+            if DEBUG_FRAMES:
+                cv2.imwrite(os.path.join(lowscale_dir or LOWSCALE_DIR, f"frame{i:04d}.png"), frame)
+            # Keyframes are picked here, in frame order, before any request is made
+            keyframe, flow = selector.check(frame) if selector else (True, None)
+            in_flight[i] = (frame, keyframe, flow)
+            yield i, frame, keyframe
 
-    out = cv2.VideoWriter(output_video_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
-    for frame_file in frame_files:
-        frame = cv2.imread(frame_file)
-        out.write(frame)
-    out.release()
+    def _upscale(item):
+        i, frame, keyframe = item
+        if not keyframe:
+            return _REBUILD
+        if frames_dir:
+            checkpoint = frame_checkpoint_path(frames_dir, i)
+            if os.path.exists(checkpoint):
+                with open(checkpoint, 'rb') as file:
+                    image_data = file.read()
+                return image_data, decode_frame(image_data), True
+        start = time.perf_counter()
+        image_data = upscale_frame(frame, api_url, json_payload_template)
+        frame_latency.observe(time.perf_counter() - start)
+        if not image_data:
+            return None
+        # Only hold on to the PNG bytes if they are going to be written out
+        return (image_data if frames_dir or DEBUG_FRAMES else None), decode_frame(image_data), False
 
+    for i, result in dispatch_ordered(_frames(), _upscale):
+        frame, keyframe, flow = in_flight.pop(i)
+        stats["frames"] += 1
+        if result is None or result is _REBUILD:
+            if result is None:
+                stats["failed"] += 1
+                if reconstructor is not None:
+                    reconstructor.keyframe_failed()
+            if keyframes is None or (result is None and reconstructor is None):
+                yield i, None
+                continue
+            if reconstructor is None:
+                # No keyframe has come back yet; assume the upscaler's 2x
+                reconstructor = temporal.FrameReconstructor((frame.shape[1] * 2, frame.shape[0] * 2))
+            # A failed keyframe is rebuilt too, from the previous keyframe's residual
+            upscaled = reconstructor.reconstruct(frame, flow)
+            stats["reconstructed"] += 1
+        else:
+            image_data, upscaled, from_checkpoint = result
+            stats["keyframes"] += 1
+            stats["resumed" if from_checkpoint else "requests"] += 1
+            if frames_dir and not from_checkpoint:
+                # Written under a temporary name so a crash never leaves a truncated frame
+                partial_path = f"{frame_checkpoint_path(frames_dir, i)}.part"
+                with open(partial_path, 'wb') as file:
+                    file.write(image_data)
+                os.replace(partial_path, frame_checkpoint_path(frames_dir, i))
+                checkpointed += 1
+                run_manifest.frame_done(video_path, checkpointed)
+            if keyframes:
+                if reconstructor is None:
+                    reconstructor = temporal.FrameReconstructor((upscaled.shape[1], upscaled.shape[0]))
+                reconstructor.keyframe(frame, upscaled)
+        if DEBUG_FRAMES:
+            cv2.imwrite(os.path.join(upscale_dir or UPSCALE_DIR, f"upscaled_frame{i:04d}.png"), upscaled)
+        yield i, upscaled
 
-def process_video(video_path, lowscale_dir, upscale_dir, api_url, headers, json_payload_template):
-    frame_count, fps = extract_frames(video_path, lowscale_dir)
-    for i in range(frame_count):
-        frame_path = os.path.join(lowscale_dir, f"frame{i:04d}.png")
-        upscaled_image = upscale_frame(frame_path, api_url, headers, json_payload_template)
-        if upscaled_image:
-            with open(os.path.join(upscale_dir, f"upscaled_frame{i:04d}.png"), 'wb') as file:
-                file.write(upscaled_image)
 
-    # Create the upscaled video
-    output_video_path = os.path.join("assets\\upscale_generations", os.path.basename(video_path))
-    create_video_from_frames(upscale_dir, output_video_path, fps)
+def process_video(video_path, lowscale_dir, upscale_dir, api_url, json_payload_template, upscale_generations_dir=None,
+                  frames_dir=None, keyframes=None, stats=None):
+    """Stream frames from video_path through the upscaler and straight into the output video writer.
+
+    stats, if given, is filled like iter_upscaled's; stats["failed"] > 0 means
+    the video is missing frames (or has them rebuilt) and must not be reused.
+    """
+    fps = video_fps(video_path)
+    total_frames = video_frame_count(video_path) or None
+    output_video_path = os.path.join(upscale_generations_dir or UPSCALE_GENERATIONS_DIR, os.path.basename(video_path))
+
+    out = None
+    size = None
+    written = 0
+    stats = {} if stats is None else stats
+    try:
+        for i, upscaled in iter_upscaled(video_path, api_url, json_payload_template, frames_dir, keyframes,
+                                         lowscale_dir, upscale_dir, stats):
+            progress.item_done("upscale", i + 1, total_frames, video=os.path.basename(video_path), ok=upscaled is not None)
+            if upscaled is None:
+                continue
+            if out is None:
+                height, width = upscaled.shape[:2]
+                size = (width, height)
+                out = encoding.FfmpegWriter(output_video_path, fps, size)
+            elif (upscaled.shape[1], upscaled.shape[0]) != size:
+                upscaled = cv2.resize(upscaled, size, interpolation=cv2.INTER_LANCZOS4)
+            out.write(upscaled)
+            written += 1
+    except BaseException:
+        if out is not None:
+            # A secondary ffmpeg failure (e.g. the broken pipe) must not replace the original error
+            out.abort()
+        raise
+    finally:
+        frame_counts.update(stats)
+    if out is not None:
+        out.release()
+
+    if out is None:
+        logging.error(f"No frames were upscaled for {video_path}.")
+    else:
+        logging.info(f"Wrote {written} upscaled frames to {output_video_path}"
+                     + (f" ({stats['resumed']} from checkpoints)" if stats["resumed"] else ""))
+    if keyframes and stats["frames"]:
+        logging.info(f"{os.path.basename(video_path)}: diffused {stats['keyframes']}/{stats['frames']} keyframe(s), "
+                     f"rebuilt {stats['reconstructed']} frame(s) in between")
+    if frames_dir and out is not None and not stats["failed"]:
+        # Every frame made it into the video; the checkpoints are no longer needed
+        shutil.rmtree(frames_dir, ignore_errors=True)
+    return output_video_path
+
+
+def benchmark(video_paths: List[str], threshold: float = temporal.KEYFRAME_THRESHOLD,
+              max_gap: int = temporal.KEYFRAME_MAX_GAP) -> None:
+    """Upscale each clip in full and keyframe modes and compare img2img requests, time and PSNR against the full upscale"""
+    variants = [
+        ("full", None),
+        ("keyframe", temporal.KeyframeSettings(threshold, max_gap, flow=False)),
+        ("keyframe+flow", temporal.KeyframeSettings(threshold, max_gap, flow=True)),
+    ]
+    for video_path in video_paths:
+        print(f"{video_path} (threshold {threshold}, max gap {max_gap})")
+        print(f"  {'mode':<14} {'requests':>8} {'seconds':>8} {'speedup':>8} {'PSNR mean':>10} {'PSNR min':>9}")
+        baseline = None
+        with tempfile.TemporaryDirectory() as reference_dir:
+            for name, settings in variants:
+                stats = {}
+                scores = []
+                bookkeeping = 0.0
+                start = time.perf_counter()
+                for i, upscaled in iter_upscaled(video_path, api_url, json_payload_template, keyframes=settings,
+                                                 stats=stats):
+                    if upscaled is None:
+                        continue
+                    # Quality bookkeeping is kept out of the timing
+                    mark = time.perf_counter()
+                    reference_path = os.path.join(reference_dir, f"frame{i:04d}.png")
+                    if settings is None:
+                        cv2.imwrite(reference_path, upscaled, [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION])
+                    elif os.path.exists(reference_path):
+                        scores.append(temporal.psnr(cv2.imread(reference_path), upscaled))
+                    bookkeeping += time.perf_counter() - mark
+                elapsed = time.perf_counter() - start - bookkeeping
+                baseline = baseline or elapsed
+                finite = [score for score in scores if score != float("inf")] or [float("inf")]
+                quality = (f"{sum(finite) / len(finite):>10.2f} {min(finite):>9.2f}" if scores
+                           else f"{'-':>10} {'-':>9}")
+                print(f"  {name:<14} {stats['requests']:>8} {elapsed:>8.2f} {baseline / elapsed:>7.2f}x {quality}")
 
 # API configuration
 api_url = os.getenv("AUTO1111_API", "http://host.docker.internal:7860/sdapi/v1/img2img")
-headers = {"Content-Type": "application/json"}
 
 # Define the JSON payload with upscaling script args
 json_payload_template = {
@@ -127,22 +381,88 @@ json_payload_template = {
 }
 
 # Directories
-generations_dir = "assets\\generations"
-lowscale_dir = "assets\\lowscale"
-upscale_dir = "assets\\upscale"
-upscale_generations_dir = "assets\\upscale_generations"
-
-os.makedirs(lowscale_dir, exist_ok=True)
-os.makedirs(upscale_dir, exist_ok=True)
-os.makedirs(upscale_generations_dir, exist_ok=True)
-
-# Process each generation video
-for video_file in sorted(os.listdir(generations_dir)):
-    video_path = os.path.join(generations_dir, video_file)
-    if video_path.endswith('.mp4'):
-        logging.info(f"Processing video: {video_path} to {UPSCALE_WIDTH}x{UPSCALE_HEIGHT}")
-        process_video(video_path, lowscale_dir, upscale_dir, api_url, headers, json_payload_template)
-        # Clear lowscale and upscale directories for next video
+GENERATIONS_DIR = os.path.join("assets", "generations")
+LOWSCALE_DIR = os.path.join("assets", "lowscale")
+UPSCALE_DIR = os.path.join("assets", "upscale")
+UPSCALE_GENERATIONS_DIR = os.path.join("assets", "upscale_generations")
+
+
+def upscale_videos(video_paths: List[str], lowscale_dir=LOWSCALE_DIR, upscale_dir=UPSCALE_DIR,
+                   upscale_generations_dir=UPSCALE_GENERATIONS_DIR) -> List[str]:
+    """Upscale each generation video frame by frame and return the upscaled video paths"""
+    os.makedirs(upscale_generations_dir, exist_ok=True)
+    if DEBUG_FRAMES:
+        os.makedirs(lowscale_dir, exist_ok=True)
+        os.makedirs(upscale_dir, exist_ok=True)
+
+    frame_latency.reset()
+    frame_counts.clear()
+    return [upscale_video(video_path, lowscale_dir, upscale_dir, upscale_generations_dir) for video_path in video_paths]
+
+
+def upscale_video(video_path: str, lowscale_dir=LOWSCALE_DIR, upscale_dir=UPSCALE_DIR,
+                  upscale_generations_dir=UPSCALE_GENERATIONS_DIR) -> str:
+    """Upscale one generation video (or copy it from the stage cache) and return the upscaled video path"""
+    cache = stage_cache.get_cache()
+    run_manifest = manifest.get_manifest()
+    output_video_path = os.path.join(upscale_generations_dir, os.path.basename(video_path))
+    if run_manifest.fetch("upscale", output_video_path):
+        return output_video_path
+    # The output depends on the source frames, the upscale request and the encoder settings
+    cache_key = cache.key("upscale", stage_cache.hash_file(video_path), json_payload_template,
+                          encoding.get_profile().ffmpeg_args(), KEYFRAMES.to_dict() if KEYFRAMES else None)
+    # Frames checkpointed by an earlier attempt mean it failed part way: finish those frames instead
+    if not run_manifest.has_frames(video_path) and cache.fetch("upscale", cache_key, output_video_path):
+        run_manifest.record("upscale", output_video_path)
+        return output_video_path
+
+    logging.info(f"Processing video: {video_path} to {UPSCALE_WIDTH}x{UPSCALE_HEIGHT}")
+    if DEBUG_FRAMES:
+        # Clear lowscale and upscale directories so they hold only this video's frames
         for folder in [lowscale_dir, upscale_dir]:
             for file in os.listdir(folder):
                 os.unlink(os.path.join(folder, file))
+    frames_dir = run_manifest.frames_dir(video_path)
+    stats = {}
+    output_video_path = process_video(video_path, lowscale_dir, upscale_dir, api_url,
+                                      json_payload_template, upscale_generations_dir, frames_dir, KEYFRAMES, stats)
+    if stats.get("failed"):
+        # The clip lacks those frames (or has them rebuilt): neither cache it nor mark it done,
+        # so a resumed run re-requests just the failed frames next to its checkpoints
+        logging.warning(f"{stats['failed']} frame(s) of {video_path} failed; not caching the upscaled clip")
+    elif os.path.exists(output_video_path):
+        cache.store("upscale", cache_key, output_video_path)
+        run_manifest.record("upscale", output_video_path)
+    latency = frame_latency.summary()
+    if latency["count"]:
+        logging.info(f"Upscale frame latency so far: p50 {latency['p50']}s, p90 {latency['p90']}s, "
+                     f"p99 {latency['p99']}s over {latency['count']} request(s)")
+        progress.emit("latency", stage="upscale", **latency)
+    return output_video_path
+
+
+def main():
+    logging.basicConfig(filename="gen.log", level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+    parser = argparse.ArgumentParser(description="Upscale every generation video in assets/generations")
+    parser.add_argument("--benchmark", nargs="*", metavar="CLIP",
+                        help="compare full and keyframe upscaling of these clips (default: every generation video) "
+                             "for img2img requests, time and PSNR")
+    parser.add_argument("--threshold", type=float, default=temporal.KEYFRAME_THRESHOLD,
+                        help="keyframe difference threshold for --benchmark")
+    parser.add_argument("--max-gap", type=int, default=temporal.KEYFRAME_MAX_GAP,
+                        help="maximum frames between keyframes for --benchmark")
+    args = parser.parse_args()
+
+    # Process each generation video
+    video_paths = [os.path.join(GENERATIONS_DIR, video_file) for video_file in sorted(os.listdir(GENERATIONS_DIR))
+                   if video_file.endswith('.mp4')]
+    if args.benchmark is not None:
+        # --benchmark with no clips compares every generation video
+        benchmark(args.benchmark or video_paths, args.threshold, max(1, args.max_gap))
+    else:
+        upscale_videos(video_paths)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Per-run workspace for the custom generator.
+
+Every file a run writes (parameters, prompt/quote, init images, clips,
+upscaled clips, the final video, its logs and its run manifest) lives under
+the workspace root, so overlapping runs never share a path. Read-only inputs
+under assets/ (devices, prompts, quotes) and the stage cache stay shared in
+the generator directory.
+
+Without an explicit workspace the generator directory itself is used, which
+keeps the layout the standalone stage scripts expect.
+"""
+import logging
+import os
+import shutil
+import uuid
+from dataclasses import dataclass
+from typing import List, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSETS_DIR = os.path.join(BASE_DIR, "assets")
+WORKSPACES_DIR = os.getenv("GEN_WORKSPACES_DIR", os.path.join(BASE_DIR, "workspaces"))
+
+
+@dataclass(frozen=True)
+class Workspace:
+    """Directory layout for one custom generation run"""
+    root: str
+
+    @property
+    def params_file(self) -> str:
+        return os.path.join(self.root, "custom_params.json")
+
+    @property
+    def prompt_file(self) -> str:
+        return os.path.join(self.root, "prompt.txt")
+
+    @property
+    def quote_file(self) -> str:
+        return os.path.join(self.root, "selected_quote.txt")
+
+    @property
+    def manifest_file(self) -> str:
+        return os.path.join(self.root, "manifest.json")
+
+    @property
+    def log_file(self) -> str:
+        return os.path.join(self.root, "gen.log")
+
+    @property
+    def gentime_log_file(self) -> str:
+        return os.path.join(self.root, "gentime.log")
+
+    @property
+    def init_dir(self) -> str:
+        return os.path.join(self.root, "assets", "init")
+
+    @property
+    def generations_dir(self) -> str:
+        return os.path.join(self.root, "assets", "generations")
+
+    @property
+    def lowscale_dir(self) -> str:
+        return os.path.join(self.root, "assets", "lowscale")
+
+    @property
+    def upscale_dir(self) -> str:
+        return os.path.join(self.root, "assets", "upscale")
+
+    @property
+    def upscale_generations_dir(self) -> str:
+        return os.path.join(self.root, "assets", "upscale_generations")
+
+    @property
+    def upscale_frames_dir(self) -> str:
+        """Upscaled frames checkpointed per clip until the clip's video is written"""
+        return os.path.join(self.root, "assets", "upscale_frames")
+
+    @property
+    def output_dir(self) -> str:
+        return os.path.join(self.root, "output")
+
+    def stage_dirs(self) -> List[str]:
+        """Directories holding per-run intermediate artifacts"""
+        return [self.init_dir, self.generations_dir, self.lowscale_dir, self.upscale_dir,
+                self.upscale_generations_dir, self.upscale_frames_dir]
+
+    def create(self) -> "Workspace":
+        for directory in self.stage_dirs() + [self.output_dir]:
+            os.makedirs(directory, exist_ok=True)
+        return self
+
+    def clear(self) -> None:
+        """Empty the intermediate stage directories (the final output is kept)"""
+        for directory in self.stage_dirs():
+            if not os.path.exists(directory):
+                continue
+            for item in os.listdir(directory):
+                path = os.path.join(directory, item)
+                try:
+                    if os.path.isfile(path) or os.path.islink(path):
+                        os.unlink(path)
+                    elif os.path.isdir(path):
+                        shutil.rmtree(path)
+                except Exception as e:
+                    logging.error(f"Failed to delete {path}. Reason: {e}")
+
+    @classmethod
+    def default(cls) -> "Workspace":
+        """The generator directory itself, as used by the standalone stage scripts"""
+        return cls(BASE_DIR)
+
+    @classmethod
+    def new(cls, name: Optional[str] = None, base_dir: str = WORKSPACES_DIR) -> "Workspace":
+        """Create a fresh workspace under base_dir"""
+        return cls(os.path.abspath(os.path.join(base_dir, name or uuid.uuid4().hex))).create()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Stand-in AUTOMATIC1111 WebUI for exercising sd_client's backend pool locally.
+
+Serves the endpoints the generators use with synthetic output:
+
+    GET  /sdapi/v1/options    health check (sd_client's backend pool)
+    GET  /internal/ping       health check (webapp)
+    GET  /sdapi/v1/progress   always idle
+    POST /sdapi/v1/txt2img    a solid-colour PNG of width x height (one per prompt
+                              line when the prompts-from-file script is used)
+    POST /sdapi/v1/img2img    the init image scaled 2x and sharpened, or a short
+                              MP4 of it when the request enables AnimateDiff
+
+Like a real WebUI it renders one request at a time; --delay is the time each
+render takes, so N fake backends behind SD_BACKENDS should give ~N times the
+throughput of one. --fail-rate answers a fraction of renders with 503 and
+/fail?for=SEC makes the backend refuse everything (health checks included)
+for SEC seconds, to watch it drain and come back.
+
+Usage:
+    python generators/fake_sd_backend.py --port 7861 [--delay 0.5] [--fail-rate 0.1]
+    SD_BACKENDS=http://127.0.0.1:7861,http://127.0.0.1:7862 python generators/custom/call.py ...
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+import numpy as np
+
+
+def _png(image) -> str:
+    ok, buffer = cv2.imencode(".png", image)
+    return base64.b64encode(buffer.tobytes()).decode("ascii")
+
+
+def _decode(encoded: str):
+    raw = base64.b64decode(encoded.split(",", 1)[-1])
+    return cv2.imdecode(np.frombuffer(raw, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def _mp4(image, frames: int, fps: int) -> str:
+    height, width = image.shape[:2]
+    fd, path = tempfile.mkstemp(suffix=".mp4")
+    os.close(fd)
+    try:
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+        for i in range(frames):
+            # Drift the brightness so consecutive frames differ
+            writer.write(cv2.add(image, np.full_like(image, i % 32)))
+        writer.release()
+        with open(path, "rb") as f:
+            return base64.b64encode(f.read()).decode("ascii")
+    finally:
+        os.unlink(path)
+
+
+class FakeBackend:
+    def __init__(self, delay: float = 0.5, fail_rate: float = 0.0, max_clip_frames: int = 16):
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self.max_clip_frames = max_clip_frames
+        self.renders = 0
+        self.down_until = 0.0
+        self._gpu = threading.Lock()  # one render at a time, like the WebUI's queue
+
+    def render(self, path: str, body: dict) -> dict:
+        with self._gpu:
+            time.sleep(self.delay)
+            self.renders += 1
+        width, height = int(body.get("width", 64)), int(body.get("height", 64))
+        if path.endswith("/txt2img"):
+            script_args = body.get("script_args") or []
+            if body.get("script_name") and len(script_args) >= 4:
+                count = len(str(script_args[3]).splitlines())
+            else:
+                count = int(body.get("n_iter", 1)) * int(body.get("batch_size", 1))
+            color = [random.randint(0, 255) for _ in range(3)]
+            image = np.full((height, width, 3), color, dtype=np.uint8)
+            return {"images": [_png(image)] * count, "parameters": {}, "info": "{}"}
+
+        init = _decode(body["init_images"][0])
+        animatediff = (body.get("alwayson_scripts") or {}).get("AnimateDiff")
+        if animatediff:
+            args = animatediff["args"][0]
+            frames = min(int(args.get("video_length", 16)), self.max_clip_frames)
+            return {"images": [_mp4(cv2.resize(init, (width, height)), frames, int(args.get("fps", 8)))]}
+        upscaled = cv2.resize(init, (init.shape[1] * 2, init.shape[0] * 2), interpolation=cv2.INTER_CUBIC)
+        # Unsharp mask stands in for the detail a real diffusion pass adds
+        upscaled = cv2.addWeighted(upscaled, 1.8, cv2.GaussianBlur(upscaled, (0, 0), 2), -0.8, 0)
+        return {"images": [_png(upscaled)], "parameters": {}, "info": "{}"}
+
+
+def make_handler(backend: FakeBackend):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, payload) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _down(self) -> bool:
+            if time.time() < backend.down_until:
+                self._send(503, {"error": "backend down"})
+                return True
+            return False
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/fail":
+                seconds = float(parse_qs(url.query).get("for", ["30"])[0])
+                backend.down_until = time.time() + seconds
+                self._send(200, {"down_for": seconds})
+            elif self._down():
+                return
+            elif url.path == "/sdapi/v1/options":
+                self._send(200, {"sd_model_checkpoint": "fake.safetensors"})
+            elif url.path == "/internal/ping":
+                self._send(200, {})
+            elif url.path == "/sdapi/v1/progress":
+                self._send(200, {"progress": 0, "eta_relative": 0, "state": {"job_count": 0}, "current_image": None})
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            path = urlparse(self.path).path
+            if self._down():
+                return
+            if path not in ("/sdapi/v1/txt2img", "/sdapi/v1/img2img"):
+                self._send(404, {"error": "not found"})
+                return
+            if random.random() < backend.fail_rate:
+                self._send(503, {"error": "injected failure"})
+                return
+            try:
+                self._send(200, backend.render(path, body))
+            except Exception as e:
+                self._send(500, {"error": str(e)})
+
+    return Handler
+
+
+def serve(port: int, backend: FakeBackend, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Start a fake backend in a daemon thread and return its server"""
+    server = ThreadingHTTPServer((host, port), make_handler(backend))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake AUTOMATIC1111 backend for local testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7861)
+    parser.add_argument("--delay", type=float, default=0.5, help="seconds per render")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of renders answered with 503")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(FakeBackend(args.delay, args.fail_rate)))
+    print(f"Fake SD backend on http://{args.host}:{args.port} ({args.delay}s per render)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
-import requests
+import sys
 import logging
 import os
 import base64
 
+# Shared SD API client lives in generators/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+import sd_client
+
 script_dir = os.path.dirname(os.path.abspath(__file__))
 
 logging.basicConfig(filename=os.path.join(script_dir, 'gen.log'), level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
@@ -74,7 +78,7 @@ json_payload = {
 
 logging.info("Sending request with common prompt for all images.")
 
-response = requests.post(api_url, headers={"Content-Type": "application/json"}, json=json_payload)
+response = sd_client.post(api_url, json_payload)
 
 if response.status_code == 200:
     r = response.json()
@@ -1,11 +1,15 @@
 import os
-import requests
+import sys
 import base64
 import json
 import logging
 from moviepy.editor import VideoFileClip
 from PIL import Image
 
+# Shared SD API client lives in generators/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+import sd_client
+
 script_dir = os.path.dirname(os.path.abspath(__file__))  # Path to the script's directory
 
 # Set up logging
@@ -26,7 +30,7 @@ def upscale_image(image_path, api_url, headers, json_payload_template):
     json_payload = json_payload_template.copy()
     json_payload["init_images"] = [encoded_image]
 
-    response = requests.post(api_url, headers=headers, json=json_payload)
+    response = sd_client.post(api_url, json_payload)
 
     if response.status_code == 200:
         r = response.json()
@@ -1,9 +1,13 @@
-import requests
+import sys
 import base64
 import json
 import logging
 import os
 
+# Shared SD API client lives in generators/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+import sd_client
+
 logging.basicConfig(filename="gen.log", level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
 
 # Define the API URL
@@ -65,7 +69,7 @@ json_payload = {
 
 logging.info("Sending request with common prompt for all images.")
 
-response = requests.post(api_url, headers={"Content-Type": "application/json"}, json=json_payload)
+response = sd_client.post(api_url, json_payload)
 
 if response.status_code == 200:
     r = response.json()
@@ -1,9 +1,13 @@
-import requests
+import sys
 import json
 import logging
 import base64
 import os
 
+# Shared SD API client lives in generators/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+import sd_client
+
 # Set up logging
 logging.basicConfig(filename="gen.log", level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
 
@@ -38,7 +42,7 @@ def make_api_call_and_save(prompt, index, output_dir):
         "height": 640
     }
 
-    response = requests.post(api_url, headers={"Content-Type": "application/json"}, json=json_payload)
+    response = sd_client.post(api_url, json_payload)
     if response.status_code == 200:
         response_json = response.json()
         base64_image = response_json['images'][0]
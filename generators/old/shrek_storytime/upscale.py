@@ -1,10 +1,14 @@
 import cv2
 import os
-import requests
+import sys
 import base64
 import json
 import logging
 
+# Shared SD API client lives in generators/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+import sd_client
+
 # Initialize logging
 logging.basicConfig(filename="gen.log", level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
 
@@ -15,7 +19,7 @@ def upscale_frame(frame_path, api_url, headers, json_payload_template):
     json_payload = json_payload_template.copy()
     json_payload["init_images"] = [encoded_image]
 
-    response = requests.post(api_url, headers=headers, json=json_payload)
+    response = sd_client.post(api_url, json_payload)
     
     if response.status_code == 200:
         r = response.json()
@@ -1,4 +1,4 @@
-import requests
+import sys
 import json
 import random
 import logging
@@ -8,6 +8,10 @@ import textwrap
 from datetime import datetime
 from PIL import Image
 
+# Shared SD API client lives in generators/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+import sd_client
+
 # Set up logging
 logging.basicConfig(filename="skl_gen.log", level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
 
@@ -116,7 +120,7 @@ json_payload = {
 }
 
 # Make the API request
-response = requests.post(api_url, headers={"Content-Type": "application/json"}, json=json_payload)
+response = sd_client.post(api_url, json_payload)
 
 # Processing the response
 if response.status_code == 200:
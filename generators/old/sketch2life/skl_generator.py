@@ -1,9 +1,14 @@
-import requests
+import os
+import sys
 import base64
 import json
 import logging
 from datetime import datetime
 
+# Shared SD API client lives in generators/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+import sd_client
+
 # Set up logging
 logging.basicConfig(filename="skl_gen.log", level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
 
@@ -73,7 +78,7 @@ headers = {
 }
 
 # Call the API
-response = requests.post(api_url, headers=headers, json=json_payload)
+response = sd_client.post(api_url, json_payload)
 
 # Check for successful response
 if response.status_code == 200:
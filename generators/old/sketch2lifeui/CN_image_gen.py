@@ -1,4 +1,4 @@
-import requests
+import sys
 import json
 import logging
 import os
@@ -6,6 +6,10 @@ import base64
 from datetime import datetime
 from PIL import Image
 
+# Shared SD API client lives in generators/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+import sd_client
+
 # Set up logging
 logging.basicConfig(filename="gen.log", level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
 
@@ -75,7 +79,7 @@ for i in range(user_integer):
         }
     }
 
-    response = requests.post(api_url, headers={"Content-Type": "application/json"}, json=json_payload)
+    response = sd_client.post(api_url, json_payload)
 
     # Processing the response
     if response.status_code == 200:
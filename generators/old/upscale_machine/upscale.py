@@ -1,11 +1,15 @@
 import os
-import requests
+import sys
 import base64
 import json
 import logging
 import cv2
 import imageio  
 
+# Shared SD API client lives in generators/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+import sd_client
+
 # Initialize logging with path relative to script directory
 script_dir = os.path.dirname(os.path.abspath(__file__))
 logging.basicConfig(filename=os.path.join(script_dir, "gen.log"), level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
@@ -15,7 +19,7 @@ def upscale_frame(frame_path, api_url, headers, json_payload_template):
         encoded_image = base64.b64encode(image_file.read()).decode('utf-8')
     json_payload = json_payload_template.copy()
     json_payload["init_images"] = [encoded_image]
-    response = requests.post(api_url, headers=headers, json=json_payload)
+    response = sd_client.post(api_url, json_payload)
     if response.status_code == 200:
         r = response.json()
         if 'images' in r and r['images']:
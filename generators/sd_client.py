@@ -0,0 +1,696 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP client for the AUTOMATIC1111 Stable Diffusion API.
+
+All generator stages post through one pooled keep-alive session instead of a
+bare requests.post per frame/prompt, so the TCP connection to the SD box is
+reused across calls and threads.
+
+With SD_BACKENDS set to several WebUI base URLs, the client balances every
+/sdapi/ request across them: each goes to the healthy backend with the fewest
+requests in flight, a backend that refuses connections or answers 502/503/504
+is drained (no new requests) and the request moves on to the next one, and a
+background thread polls /sdapi/v1/options to bring drained backends back.
+
+Generation POSTs are not idempotent: they are only re-sent (to the same or
+another backend) when the WebUI can't have started them, i.e. the connection
+was refused or timed out while connecting, or a gateway answered 502/503/504.
+A connection dropped after the body went out is raised to the caller. This is
+the only retry layer; stages don't retry transport errors on top of it.
+"""
+import base64
+import io
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+logger = logging.getLogger(__name__)
+
+# Tunables (env overrides)
+try:
+    SD_CONNECT_TIMEOUT = float(os.getenv("SD_CONNECT_TIMEOUT", "10"))
+    SD_READ_TIMEOUT = float(os.getenv("SD_READ_TIMEOUT", "3600"))
+    SD_RETRIES = int(os.getenv("SD_RETRIES", "3"))
+    SD_POOL_SIZE = int(os.getenv("SD_POOL_SIZE", "8"))
+except Exception:
+    SD_CONNECT_TIMEOUT = 10.0
+    SD_READ_TIMEOUT = 3600.0
+    SD_RETRIES = 3
+    SD_POOL_SIZE = 8
+
+# Progress sampling: how often to poll /sdapi/v1/progress while a request is in
+# flight, how long without a step before a generation counts as stalled, and how
+# often to include the live preview image (0 = never)
+try:
+    SD_PROGRESS_INTERVAL = float(os.getenv("SD_PROGRESS_INTERVAL", "1"))
+    SD_STALL_SEC = float(os.getenv("SD_STALL_SEC", "30"))
+    SD_PROGRESS_PREVIEW_SEC = float(os.getenv("SD_PROGRESS_PREVIEW_SEC", "0"))
+except Exception:
+    SD_PROGRESS_INTERVAL = 1.0
+    SD_STALL_SEC = 30.0
+    SD_PROGRESS_PREVIEW_SEC = 0.0
+
+# Backend pool: comma-separated WebUI base URLs, e.g. "http://box1:7860,http://box2:7860".
+# Empty means every request goes to the URL the caller passed.
+SD_BACKENDS = [url.strip().rstrip("/") for url in os.getenv("SD_BACKENDS", "").split(",") if url.strip()]
+try:
+    SD_HEALTH_INTERVAL = float(os.getenv("SD_HEALTH_INTERVAL", "10"))
+    SD_HEALTH_TIMEOUT = float(os.getenv("SD_HEALTH_TIMEOUT", "5"))
+except Exception:
+    SD_HEALTH_INTERVAL = 10.0
+    SD_HEALTH_TIMEOUT = 5.0
+
+# Backoff between retries: full jitter on an exponential base, capped
+SD_BACKOFF_BASE = 1.0
+SD_BACKOFF_MAX = 30.0
+
+# Statuses worth retrying: the WebUI restarting or a proxy in front of it
+RETRY_STATUSES = {502, 503, 504}
+
+
+
+def resendable(method: str, error: Exception) -> bool:
+    """Whether a request that failed with a connection error can be sent again without a duplicate render.
+
+    GETs always can. A POST only if it never reached the server: a reset
+    after the body was sent may mean the WebUI already queued the generation.
+    """
+    if method.upper() == "GET" or isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    # requests wraps urllib3's MaxRetryError, whose reason says why connecting failed
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+# Chunk size used when streaming response bodies
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+class SDAPIError(RuntimeError):
+    """Non-200 response from the SD API"""
+
+    def __init__(self, url: str, status_code: int, text: str):
+        super().__init__(f"SD API {url} returned {status_code}: {text[:500]}")
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+
+
+class FirstImageExtractor:
+    """Incrementally pull images[0] out of an SD API JSON body and base64-decode it into a sink.
+
+    The WebUI answers txt2img/img2img with {"images": ["<base64>", ...], ...}.
+    Rather than materialising the whole body, parsing it, and decoding the
+    string (three copies of a multi-MB MP4), the scanner walks the raw bytes
+    as they arrive, finds the top-level "images" key, and decodes the first
+    element in 4-byte-aligned slices straight into the sink.
+    """
+
+    _KEY = b"images"
+    _MAX_KEY_LEN = 32
+    _STRING_STOP = re.compile(rb'["\\]')
+    _STRUCTURAL = re.compile(rb'["{}\[\]]')
+
+    def __init__(self, sink: BinaryIO):
+        self.sink = sink
+        self.bytes_written = 0
+        self.done = False
+        self.found = False
+        self._state = "scan"
+        self._depth = 0
+        self._escape = False
+        self._key = bytearray()
+        self._key_overflow = False
+        self._carry = b""
+        self._first_data = True
+
+    def feed(self, chunk: bytes) -> bool:
+        """Consume a chunk; returns True once images[0] has been fully decoded (or is known to be absent)"""
+        i = 0
+        n = len(chunk)
+        while i < n and not self.done:
+            state = self._state
+            if state == "data":
+                end = chunk.find(b'"', i)
+                segment = chunk[i:] if end < 0 else chunk[i:end]
+                self._write_data(segment)
+                if end < 0:
+                    return False
+                self._flush_data()
+                self.found = True
+                self.done = True
+                return True
+            if state == "string" and not self._escape:
+                # Skip ahead to the next quote or backslash
+                match = self._STRING_STOP.search(chunk, i)
+                stop = match.start() if match else n
+                self._collect(chunk[i:stop])
+                i = stop
+                if i >= n:
+                    break
+            elif state == "scan":
+                match = self._STRUCTURAL.search(chunk, i)
+                if not match:
+                    break
+                i = match.start()
+            c = chunk[i]
+            if state == "string":
+                if self._escape:
+                    self._escape = False
+                    self._collect(chunk[i:i + 1])
+                elif c == 0x5C:  # backslash
+                    self._escape = True
+                else:  # closing quote
+                    self._state = "after_string" if self._depth == 1 else "scan"
+                i += 1
+            elif state == "after_string":
+                if c in b" \t\r\n":
+                    i += 1
+                elif c == 0x3A and not self._key_overflow and bytes(self._key) == self._KEY:  # ':'
+                    self._state = "value"
+                    i += 1
+                else:
+                    self._state = "scan"
+            elif state == "value":
+                if c in b" \t\r\n":
+                    i += 1
+                elif c == 0x5B:  # '['
+                    self._state = "element"
+                    i += 1
+                else:
+                    self.done = True
+            elif state == "element":
+                if c in b" \t\r\n":
+                    i += 1
+                elif c == 0x22:
+                    self._state = "data"
+                    i += 1
+                else:
+                    # empty list or non-string element
+                    self.done = True
+            else:  # scan
+                if c == 0x22:
+                    self._state = "string"
+                    self._key.clear()
+                    self._key_overflow = False
+                elif c in b"{[":
+                    self._depth += 1
+                elif c in b"}]":
+                    self._depth -= 1
+                    if self._depth <= 0:
+                        self.done = True
+                i += 1
+        return self.done
+
+    def _collect(self, data: bytes) -> None:
+        if self._depth != 1 or self._key_overflow or not data:
+            return
+        if len(self._key) + len(data) > self._MAX_KEY_LEN:
+            self._key_overflow = True
+            return
+        self._key.extend(data)
+
+    def _write_data(self, segment: bytes) -> None:
+        if b"\\" in segment:
+            # JSON may escape '/' as '\/'; base64 never contains a backslash
+            segment = segment.replace(b"\\", b"")
+        data = self._carry + segment
+        if self._first_data:
+            if len(data) < 64 and data.startswith(b"data:"[:len(data)]):
+                # Too short to tell whether this is a data: URL prefix yet
+                self._carry = data
+                return
+            self._first_data = False
+            if data.startswith(b"data:"):
+                comma = data.find(b",")
+                if comma < 0:
+                    self._carry = data
+                    self._first_data = True
+                    return
+                data = data[comma + 1:]
+        usable = len(data) - (len(data) % 4)
+        if usable:
+            decoded = base64.b64decode(data[:usable])
+            self.sink.write(decoded)
+            self.bytes_written += len(decoded)
+        self._carry = data[usable:]
+
+    def _flush_data(self) -> None:
+        if self._carry:
+            data = self._carry
+            if self._first_data and data.startswith(b"data:"):
+                data = data[data.find(b",") + 1:]
+            data += b"=" * (-len(data) % 4)
+            decoded = base64.b64decode(data)
+            self.sink.write(decoded)
+            self.bytes_written += len(decoded)
+            self._carry = b""
+        self._first_data = False
+
+
+def stream_first_image(response: requests.Response, sink: BinaryIO, chunk_size: int = STREAM_CHUNK_SIZE) -> bool:
+    """Decode images[0] of a streamed response into sink; returns False if the body had no image"""
+    extractor = FirstImageExtractor(sink)
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        if chunk and extractor.feed(chunk):
+            break
+    return extractor.found
+
+
+def progress_url_for(url: str) -> str:
+    """The /sdapi/v1/progress endpoint on the same WebUI as an API url"""
+    base = url.split("/sdapi/", 1)[0]
+    return f"{base}/sdapi/v1/progress"
+
+
+# Called with one dict per sample: progress (0-1), eta_sec, step, steps, job_no,
+# job_count, textinfo, stalled, idle_sec and, when requested, preview (base64 PNG)
+ProgressListener = Callable[[Dict[str, Any]], None]
+
+
+class ProgressSampler:
+    """Polls /sdapi/v1/progress on one WebUI while any request to it is in flight.
+
+    The WebUI reports a single global progress, so concurrent callers share one
+    sampler thread per host. A generation whose step counter hasn't moved for
+    stall_sec is reported as stalled until it moves again.
+    """
+
+    def __init__(self, client: "SDClient", progress_url: str, listener: ProgressListener,
+                 interval: float = SD_PROGRESS_INTERVAL, stall_sec: float = SD_STALL_SEC,
+                 preview_sec: float = SD_PROGRESS_PREVIEW_SEC):
+        self.client = client
+        self.progress_url = progress_url
+        self.listener = listener
+        self.interval = interval
+        self.stall_sec = stall_sec
+        self.preview_sec = preview_sec
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._last_marker = None
+        self._last_change = 0.0
+        self._last_preview = 0.0
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        with self._cond:
+            self._in_flight += 1
+            if self._thread is None:
+                self._last_marker = None
+                self._last_change = time.monotonic()
+                self._thread = threading.Thread(target=self._run, name="sd-progress", daemon=True)
+                self._thread.start()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if self._in_flight == 0:
+                    self._thread = None
+                    return
+            try:
+                self._sample()
+            except Exception as e:
+                # Progress is best effort; never let it disturb the request itself
+                logger.debug(f"Progress sample from {self.progress_url} failed: {e}")
+            with self._cond:
+                if self._in_flight:
+                    self._cond.wait(self.interval)
+
+    def _sample(self) -> None:
+        now = time.monotonic()
+        want_preview = self.preview_sec > 0 and now - self._last_preview >= self.preview_sec
+        url = f"{self.progress_url}?skip_current_image={'false' if want_preview else 'true'}"
+        response = self.client.session.get(url, timeout=(self.client.connect_timeout, max(self.interval, 5)))
+        if response.status_code != 200:
+            return
+        data = response.json()
+        state = data.get("state") or {}
+        # The first sample after every step change, job change or new request resets the stall clock
+        marker = (state.get("job_timestamp"), state.get("job_no"), state.get("sampling_step"), data.get("progress"))
+        if marker != self._last_marker:
+            self._last_marker = marker
+            self._last_change = now
+        idle_sec = now - self._last_change
+        sample = {
+            "progress": data.get("progress"),
+            "eta_sec": data.get("eta_relative"),
+            "step": state.get("sampling_step"),
+            "steps": state.get("sampling_steps"),
+            "job_no": state.get("job_no"),
+            "job_count": state.get("job_count"),
+            "textinfo": data.get("textinfo"),
+            "stalled": idle_sec >= self.stall_sec,
+            "idle_sec": round(idle_sec, 1),
+        }
+        if want_preview and data.get("current_image"):
+            sample["preview"] = data["current_image"]
+            self._last_preview = now
+        self.listener(sample)
+
+
+class Backend:
+    """One WebUI in a BackendPool"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.healthy = True  # optimistic until the first check or failure says otherwise
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    def url_for(self, url: str) -> str:
+        """url with its scheme/host replaced by this backend's"""
+        return f"{self.base_url}/sdapi/{url.split('/sdapi/', 1)[1]}"
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+
+class BackendPool:
+    """Least-outstanding-requests routing over several WebUIs, with health checks and draining"""
+
+    def __init__(self, base_urls, session: requests.Session, health_interval: float = SD_HEALTH_INTERVAL,
+                 health_timeout: float = SD_HEALTH_TIMEOUT):
+        self.backends = [Backend(url) for url in base_urls]
+        self.session = session
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self._lock = threading.Lock()
+        self._health_thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self.backends)
+
+    @contextmanager
+    def acquire(self, exclude=()) -> Iterator[Optional[Backend]]:
+        """Reserve the healthy backend with the fewest requests in flight; None once every backend is excluded.
+
+        If every remaining backend is drained, the least busy of them is tried
+        anyway: a request is a cheaper probe than waiting for the next check.
+        """
+        self._start_health_checks()
+        with self._lock:
+            candidates = [b for b in self.backends if b not in exclude]
+            healthy = [b for b in candidates if b.healthy]
+            backend = min(healthy or candidates, key=lambda b: (b.outstanding, b.requests), default=None)
+            if backend is not None:
+                backend.outstanding += 1
+                backend.requests += 1
+        try:
+            yield backend
+        finally:
+            if backend is not None:
+                with self._lock:
+                    backend.outstanding -= 1
+
+    def drain(self, backend: Backend, error: Exception) -> None:
+        """Stop routing new requests to backend until a health check passes; in-flight requests finish"""
+        with self._lock:
+            was_healthy = backend.healthy
+            backend.healthy = False
+            backend.failures += 1
+            backend.last_error = str(error)[:200]
+        if was_healthy:
+            logger.warning(f"Draining SD backend {backend.base_url}: {error}")
+
+    def check(self, backend: Backend) -> bool:
+        try:
+            response = self.session.get(f"{backend.base_url}/sdapi/v1/options", timeout=self.health_timeout)
+            response.close()
+            ok = response.status_code == 200
+            error = None if ok else f"/sdapi/v1/options returned {response.status_code}"
+        except requests.exceptions.RequestException as e:
+            ok, error = False, str(e)
+        with self._lock:
+            was_healthy = backend.healthy
+            backend.healthy = ok
+            if error:
+                backend.last_error = error[:200]
+        if ok and not was_healthy:
+            logger.info(f"SD backend {backend.base_url} is healthy again")
+        elif was_healthy and not ok:
+            logger.warning(f"SD backend {backend.base_url} failed its health check: {error}")
+        return ok
+
+    def check_all(self) -> None:
+        for backend in self.backends:
+            self.check(backend)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [backend.snapshot() for backend in self.backends]
+
+    def _start_health_checks(self) -> None:
+        if self._health_thread is not None:
+            return
+        with self._lock:
+            if self._health_thread is None:
+                self._health_thread = threading.Thread(target=self._health_loop, name="sd-health", daemon=True)
+                self._health_thread.start()
+
+    def _health_loop(self) -> None:
+        while True:
+            self.check_all()
+            time.sleep(self.health_interval)
+
+
+class SDClient:
+    """Pooled keep-alive client for the SD WebUI API"""
+
+    def __init__(self, pool_size: int = SD_POOL_SIZE, connect_timeout: float = SD_CONNECT_TIMEOUT,
+                 read_timeout: float = SD_READ_TIMEOUT, retries: int = SD_RETRIES, backends=None):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.session = requests.Session()
+        # pool_block keeps us at pool_size sockets per host even under concurrent callers
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+        # Set to receive /sdapi/v1/progress samples while generation requests run
+        self.progress_listener: Optional[ProgressListener] = None
+        self._samplers: Dict[str, ProgressSampler] = {}
+        self._samplers_lock = threading.Lock()
+        backends = SD_BACKENDS if backends is None else backends
+        self.pool: Optional[BackendPool] = BackendPool(backends, self.session) if backends else None
+
+    def _timeout(self, read_timeout: Optional[float]):
+        return (self.connect_timeout, read_timeout if read_timeout is not None else self.read_timeout)
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(SD_BACKOFF_MAX, SD_BACKOFF_BASE * (2 ** attempt)))
+
+    def request(self, method: str, url: str, *, json: Optional[Dict[str, Any]] = None, stream: bool = False,
+                read_timeout: Optional[float] = None, retries: Optional[int] = None) -> requests.Response:
+        """Send a request, retrying failed connections and gateway errors with jittered backoff.
+
+        Read timeouts and POSTs dropped after they were sent are not retried:
+        the generation may still be running on the server and re-posting
+        would queue a duplicate (see resendable).
+        """
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                response = self.session.request(method, url, json=json, stream=stream,
+                                                timeout=self._timeout(read_timeout))
+            except (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout) as e:
+                if attempt >= retries or not resendable(method, e):
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"SD API {method} {url} failed ({e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < retries:
+                response.close()
+                delay = self._backoff(attempt)
+                logger.warning(f"SD API {method} {url} returned {response.status_code}; retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            return response
+
+    def post(self, url: str, payload: Dict[str, Any], *, stream: bool = False,
+             read_timeout: Optional[float] = None, retries: Optional[int] = None) -> requests.Response:
+        return self.request("POST", url, json=payload, stream=stream, read_timeout=read_timeout, retries=retries)
+
+    def get(self, url: str, *, read_timeout: Optional[float] = None) -> requests.Response:
+        return self.request("GET", url, read_timeout=read_timeout)
+
+    @contextmanager
+    def sampling_progress(self, url: str) -> Iterator[None]:
+        """Sample WebUI progress for the duration of a request to url, if a listener is set"""
+        if self.progress_listener is None:
+            yield
+            return
+        progress_url = progress_url_for(url)
+        with self._samplers_lock:
+            sampler = self._samplers.get(progress_url)
+            if sampler is None:
+                sampler = self._samplers[progress_url] = ProgressSampler(self, progress_url, self.progress_listener)
+        with sampler.track():
+            yield
+
+    def _routed(self, url: str, call: Callable[[str, Optional[int]], Any]) -> Any:
+        """Run call(target_url, retries) against the pool, or against url itself without one.
+
+        With a pool, a refused connection or gateway error drains that backend
+        and the call moves straight on to the next; only once every backend has
+        failed does it back off and start another round. Calls against the pool
+        get retries=0, so the pool rounds are the only retries.
+        """
+        if self.pool is None or "/sdapi/" not in url:
+            with self.sampling_progress(url):
+                return call(url, None)
+        for attempt in range(self.retries + 1):
+            tried = set()
+            error: Optional[Exception] = None
+            while True:
+                with self.pool.acquire(exclude=tried) as backend:
+                    if backend is None:
+                        break
+                    target = backend.url_for(url)
+                    try:
+                        with self.sampling_progress(target):
+                            return call(target, 0)
+                    except (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout) as e:
+                        if not resendable("POST", e):
+                            # It reached this backend and may be rendering there; don't render it twice
+                            self.pool.drain(backend, e)
+                            raise
+                        error = e
+                    except SDAPIError as e:
+                        if e.status_code not in RETRY_STATUSES:
+                            raise
+                        error = e
+                self.pool.drain(backend, error)
+                tried.add(backend)
+            if attempt >= self.retries:
+                raise error
+            delay = self._backoff(attempt)
+            logger.warning(f"All {len(self.pool)} SD backends failed {url}; retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+    def _post_streaming(self, url: str, payload: Dict[str, Any], read_timeout: Optional[float],
+                        retries: Optional[int] = None) -> requests.Response:
+        response = self.post(url, payload, stream=True, read_timeout=read_timeout, retries=retries)
+        if response.status_code != 200:
+            try:
+                text = response.text
+            finally:
+                response.close()
+            raise SDAPIError(url, response.status_code, text)
+        return response
+
+    def post_json(self, url: str, payload: Dict[str, Any], *,
+                  read_timeout: Optional[float] = None) -> Dict[str, Any]:
+        """POST and return the parsed JSON body, raising SDAPIError on a non-200 response"""
+        def call(target: str, retries: Optional[int]) -> Dict[str, Any]:
+            response = self.post(target, payload, read_timeout=read_timeout, retries=retries)
+            if response.status_code != 200:
+                raise SDAPIError(target, response.status_code, response.text)
+            return response.json()
+
+        return self._routed(url, call)
+
+    def post_for_image(self, url: str, payload: Dict[str, Any], *,
+                       read_timeout: Optional[float] = None) -> Optional[bytes]:
+        """POST and return the decoded bytes of images[0], or None if the response carried no image"""
+        def call(target: str, retries: Optional[int]) -> Optional[bytes]:
+            response = self._post_streaming(target, payload, read_timeout, retries)
+            buffer = io.BytesIO()
+            try:
+                found = stream_first_image(response, buffer)
+            finally:
+                response.close()
+            return buffer.getvalue() if found else None
+
+        return self._routed(url, call)
+
+    def post_to_file(self, url: str, payload: Dict[str, Any], output_path: str, *,
+                     read_timeout: Optional[float] = None) -> bool:
+        """POST and stream-decode images[0] directly into output_path.
+
+        The file is written under a temporary name and renamed on success, so a
+        dropped connection never leaves a truncated artifact behind.
+        """
+        partial_path = f"{output_path}.part"
+
+        def call(target: str, retries: Optional[int]) -> bool:
+            response = self._post_streaming(target, payload, read_timeout, retries)
+            try:
+                with open(partial_path, "wb") as sink:
+                    return stream_first_image(response, sink)
+            except Exception:
+                if os.path.exists(partial_path):
+                    os.unlink(partial_path)
+                raise
+            finally:
+                response.close()
+
+        if not self._routed(url, call):
+            os.unlink(partial_path)
+            return False
+        os.replace(partial_path, output_path)
+        return True
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_client: Optional[SDClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> SDClient:
+    """Process-wide client shared by every stage"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = SDClient()
+    return _client
+
+
+def post(url: str, payload: Dict[str, Any], **kwargs) -> requests.Response:
+    return get_client().post(url, payload, **kwargs)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return get_client().get(url, **kwargs)
+
+
+def post_json(url: str, payload: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+    return get_client().post_json(url, payload, **kwargs)
+
+
+def post_for_image(url: str, payload: Dict[str, Any], **kwargs) -> Optional[bytes]:
+    return get_client().post_for_image(url, payload, **kwargs)
+
+
+def post_to_file(url: str, payload: Dict[str, Any], output_path: str, **kwargs) -> bool:
+    return get_client().post_to_file(url, payload, output_path, **kwargs)
@@ -337,6 +337,47 @@ try {
           $ctx.Response.ContentType = "application/json"
           $ctx.Response.OutputStream.Write($resp,0,$resp.Length)
         }
+      } elseif ($ctx.Request.HttpMethod -eq "POST" -and $ctx.Request.Url.AbsolutePath -eq "/schedule-batch") {
+        # Body: {"Jobs": [<same object as /schedule>, ...]}; one result per job, a failed job doesn't stop the rest
+        $payload = $body | ConvertFrom-Json
+        $jobs = if ($null -eq $payload.Jobs) { @() } else { @($payload.Jobs) }
+        Write-Host ("[SCHEDULE-BATCH] Jobs={0}" -f $jobs.Count)
+        $results = @()
+        foreach ($job in $jobs) {
+          try {
+            $envTable = if ($null -eq $job.Env) { @{} } else { $job.Env }
+            $days = @()
+            if ($job.PSObject.Properties.Name -contains 'Days' -and $null -ne $job.Days) { $days = $job.Days }
+            $scriptPath = New-JobScript -TaskName $job.TaskName -Env $envTable -Steps $job.Steps
+            Ensure-Task -TaskName $job.TaskName -TimeHHmm $job.Time -ScriptPath $scriptPath -Days $days
+            $results += @{TaskName=$job.TaskName; status="ok"; script=$scriptPath}
+          } catch {
+            Write-Warning ("[SCHEDULE-BATCH] {0}: {1}" -f $job.TaskName, $_.Exception.Message)
+            $results += @{TaskName=$job.TaskName; status="error"; error=$_.Exception.Message}
+          }
+        }
+        $json = @{status="ok"; results=@($results)} | ConvertTo-Json -Compress -Depth 4
+        $resp = [Text.Encoding]::UTF8.GetBytes($json)
+        $ctx.Response.ContentType = "application/json"
+        $ctx.Response.OutputStream.Write($resp,0,$resp.Length)
+      } elseif ($ctx.Request.HttpMethod -eq "POST" -and $ctx.Request.Url.AbsolutePath -eq "/delete-batch") {
+        # Body: {"TaskNames": ["job_1", ...]}
+        $payload = $body | ConvertFrom-Json
+        $names = if ($null -eq $payload.TaskNames) { @() } else { @($payload.TaskNames) }
+        Write-Host ("[DELETE-BATCH] TaskNames={0}" -f $names.Count)
+        $results = @()
+        foreach ($name in $names) {
+          try {
+            Remove-TaskSafely -TaskName ([string]$name)
+            $results += @{TaskName=[string]$name; status="ok"}
+          } catch {
+            $results += @{TaskName=[string]$name; status="error"; error=$_.Exception.Message}
+          }
+        }
+        $json = @{status="ok"; results=@($results)} | ConvertTo-Json -Compress -Depth 4
+        $resp = [Text.Encoding]::UTF8.GetBytes($json)
+        $ctx.Response.ContentType = "application/json"
+        $ctx.Response.OutputStream.Write($resp,0,$resp.Length)
       } elseif ($ctx.Request.HttpMethod -eq "GET" -and $ctx.Request.Url.AbsolutePath -eq "/health") {
         $json = @{status="ok"} | ConvertTo-Json -Compress
         $resp = [Text.Encoding]::UTF8.GetBytes($json)
@@ -1,27 +1,42 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for
 import os
 import sys
 import json
 import logging
 import subprocess
 import random
+import shutil
 from datetime import datetime, timedelta
 import uuid
+import hashlib
+import base64
 import threading
 import time
+from collections import deque
 from pathlib import Path
 
 # Add the parent directory to the path to import generators
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from generators import asset_catalog
+
 # Import our host scheduler client
 from host_scheduler_client import HostSchedulerClient, JobSpec, create_generator_job_steps
 import config
 
 # DB
-from db import get_connection, init_db, create_job, update_job_status, get_job_by_id, create_job_run, complete_job_run
+from db import (
+    ThreadLocalConnection, init_db, create_job, update_job_status, get_job_by_id, get_job_by_task_name, complete_job_run,
+    list_jobs_page, list_runs_page, list_run_summaries, archive_job_runs,
+    list_jobs_with_last_run, get_job_with_last_run, list_runs_for_job,
+    get_write_behind, list_stalled_job_runs, get_job_run, set_job_run_workspace, set_job_next_run,
+    list_run_workspaces, has_active_resume,
+)
+from job_queue import JobQueue
+from events import EventBus, stream as event_stream
+from health import HealthMonitor
+from scheduler import Scheduler, CronSpec, schedule_from_job, MISFIRE_POLICIES
 
-import requests
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'sentiMation-secret-key-2024'
@@ -38,304 +53,380 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Initialize host scheduler client
-host_scheduler = HostSchedulerClient(config.HOST_SERVICE_URL)
+host_scheduler = HostSchedulerClient(config.HOST_SERVICE_URL, coalesce_window=config.HOST_COALESCE_WINDOW_SEC)
 
 # Initialize DB
-db_conn = get_connection()
+# One SQLite connection per thread (WAL mode) instead of one shared across workers
+db_conn = ThreadLocalConnection()
 init_db(db_conn)
 
-# Health cache
-health_state = {
-    'host_service': False,
-    'auto1111': False,
-}
+# Job transitions and generator progress for /events subscribers
+event_bus = EventBus()
 
-def health_monitor():
-    while True:
-        # Host service
-        try:
-            health_state['host_service'] = host_scheduler.is_available()
-        except Exception:
-            health_state['host_service'] = False
-        # AUTO1111
-        try:
-            r = requests.get(f"{config.AUTO1111_BASE_URL}/sdapi/v1/options", timeout=5)
-            health_state['auto1111'] = (r.status_code == 200)
-        except Exception:
-            health_state['auto1111'] = False
-        time.sleep(config.HEALTHCHECK_INTERVAL_SEC)
-
-threading.Thread(target=health_monitor, daemon=True).start()
-
-# Global variables for scheduled tasks (kept for backwards compatibility / in-memory view)
-scheduled_tasks = {}
-task_counter = 0
-
-
-
-class GenerationTask:
-    def __init__(self, task_id, generator_type, prompt, scheduled_time, status="pending", is_recurring=False, recurring_days=None, recurring_time=None, character=None, environment=None, video_length=None, fps=None, width=None, height=None):
-        self.task_id = task_id
-        self.generator_type = generator_type
-        self.prompt = prompt
-        self.scheduled_time = scheduled_time
-        self.status = status
-        self.result_path = None
-        self.error_message = None
-        self.created_at = datetime.now()
-        self.is_recurring = is_recurring
-        self.recurring_days = recurring_days or []
-        self.recurring_time = recurring_time
-        # Custom generator specific fields
-        self.character = character
-        self.environment = environment
-        # Generation parameters
-        self.video_length = video_length
-        self.fps = fps
-        self.width = width
-        self.height = height
-        # Host service integration fields
-        self.host_script_path = None
-        self.host_log_path = None
-        self.host_exit_code = None
-
-
-
-def execute_scheduled_task(task_id):
-    """Execute a scheduled generation task by calling the appropriate generator script"""
-    global scheduled_tasks
-    
-    if task_id not in scheduled_tasks:
-        logger.error(f"Task {task_id} not found")
+
+def publish_job_event(job_id, run_id=None, status=None):
+    """Announce a job state change; status defaults to the job's stored status"""
+    job = get_job_by_id(db_conn, job_id)
+    event_bus.publish('job', {
+        'job_id': job_id,
+        'run_id': run_id,
+        'task_id': job['task_name'] if job else None,
+        'status': status or (job['status'] if job else None),
+    })
+
+# Host service and SD WebUI reachability, probed in the background; handlers read the cache only
+health = HealthMonitor(interval=config.HEALTHCHECK_INTERVAL_SEC, max_interval=config.HEALTHCHECK_MAX_INTERVAL_SEC,
+                       timeout=config.HEALTHCHECK_TIMEOUT_SEC)
+health.add('host_service', f"{config.HOST_SERVICE_URL}/health")
+# Every SD backend the generator load-balances across (any healthy one will do)
+for sd_base_url in config.SD_BACKENDS or [config.AUTO1111_BASE_URL]:
+    health.add(f"sd:{sd_base_url}", f"{sd_base_url}{config.SD_HEALTH_PATH}")
+
+# Absolute paths so nothing depends on the process working directory
+GENERATORS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'generators'))
+STATIC_GENERATED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'generated')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov')
+# Lines call.py prints for progress events (see generators/custom/progress.py)
+GENERATOR_PROGRESS_PREFIX = 'PROGRESS '
+GENERATOR_TIMEOUT_SEC = 7200
+PREVIEWS_DIR = os.path.join(STATIC_GENERATED_DIR, 'previews')
+
+
+def create_workspace_dir(generator_dir, name):
+    """Per-run directory passed to call.py --workspace"""
+    workspace_dir = os.path.join(generator_dir, 'workspaces', name)
+    os.makedirs(workspace_dir, exist_ok=True)
+    return workspace_dir
+
+
+def workspace_manifest(workspace_dir):
+    """Path of the run manifest call.py keeps in a workspace (see generators/custom/manifest.py)"""
+    return os.path.join(workspace_dir, 'manifest.json')
+
+
+def run_workspace_dir(generator_dir, run_row):
+    """Workspace for a run and whether call.py should --resume in it.
+
+    A resume run continues in the workspace of the run it resumes. A run the
+    queue retried after a lost lease finds its own earlier attempt's manifest
+    and resumes too, so a transient failure never repeats finished work.
+    """
+    if run_row['resume_of']:
+        source = get_job_run(db_conn, run_row['resume_of'])
+        if source is not None and source['workspace_path'] and os.path.exists(workspace_manifest(source['workspace_path'])):
+            return source['workspace_path'], True
+        logger.warning(f"Run {run_row['id']}: nothing left to resume of run {run_row['resume_of']}; starting fresh")
+    workspace_dir = create_workspace_dir(generator_dir, f"run_{run_row['id']}")
+    return workspace_dir, os.path.exists(workspace_manifest(workspace_dir))
+
+
+def remove_workspace_dir(workspace_dir):
+    if config.KEEP_WORKSPACES:
         return
-    
-    task = scheduled_tasks[task_id]
-    task.status = "running"
-    logger.info(f"Starting task {task_id}: {task.generator_type} - {task.prompt}")
-    
     try:
-        # Determine the generator directory
-        generator_dir = f"../generators/{task.generator_type}"
-        
-        if not os.path.exists(generator_dir):
-            raise Exception(f"Generator directory not found: {generator_dir}")
-        
-        # Change to the generator directory
-        original_cwd = os.getcwd()
-        os.chdir(generator_dir)
-        
+        shutil.rmtree(workspace_dir)
+    except Exception as e:
+        logger.warning(f"Failed to remove workspace {workspace_dir}: {e}")
+
+
+def sweep_workspaces(generator_dir):
+    """Remove run workspaces that no job_runs row points at any more; returns how many.
+
+    A failed run keeps its workspace so it can be resumed. Once archiving has
+    deleted the run nothing can resume it, and its frames are only disk usage.
+    """
+    root = os.path.join(generator_dir, 'workspaces')
+    if config.KEEP_WORKSPACES or not os.path.isdir(root):
+        return 0
+    referenced = {os.path.abspath(path) for path in list_run_workspaces(db_conn)}
+    cutoff = time.time() - config.WORKSPACE_SWEEP_GRACE_SEC
+    removed = 0
+    for name in os.listdir(root):
+        workspace_dir = os.path.abspath(os.path.join(root, name))
+        if not name.startswith('run_') or workspace_dir in referenced:
+            continue
         try:
-            # Handle random activity selection
-            if task.prompt == "RANDOM_ACTIVITY":
-                logger.info(f"Using random activity for {task.generator_type}")
-                # For random activity, we'll let the selector.py handle everything
-                pass
-            else:
-                # For specific activities, we need to create a custom prompt file
-                # This would require modifying the workflow to accept specific prompts
-                logger.info(f"Specific activity selected: {task.prompt}")
-                # For now, we'll use the random workflow and log the selected prompt
-                pass
-            
-            # Run the generator call script
-            logger.info(f"Running call.py in {generator_dir}")
-            
-            # For custom generator, pass specific parameters and env overrides
-            if task.generator_type == "custom" and hasattr(task, 'character') and hasattr(task, 'environment'):
-                env = os.environ.copy()
-                # Apply overrides if present on the task
-                if getattr(task, 'video_length', None):
-                    env['GEN_VIDEO_LENGTH'] = str(task.video_length)
-                if getattr(task, 'fps', None):
-                    env['GEN_FPS'] = str(task.fps)
-                if getattr(task, 'width', None):
-                    env['GEN_WIDTH'] = str(task.width)
-                if getattr(task, 'height', None):
-                    env['GEN_HEIGHT'] = str(task.height)
-                env['AUTO1111_API'] = f"{config.AUTO1111_BASE_URL}/sdapi/v1/img2img"
-
-                if task.character and task.environment and task.prompt and task.prompt != "RANDOM_ACTIVITY":
-                    logger.info(f"Running custom generator with: character={task.character}, environment={task.environment}, prompt={task.prompt}")
-                    result = subprocess.run(
-                        ['python', 'call.py', task.character, task.environment, task.prompt],
-                        capture_output=True,
-                        text=True,
-                        timeout=3600,  # 1 hour timeout
-                        env=env
-                    )
-                else:
-                    logger.info("Running custom generator with random selection")
-                    result = subprocess.run(
-                        ['python', 'call.py'],
-                        capture_output=True,
-                        text=True,
-                        timeout=3600,  # 1 hour timeout
-                        env=env
-                    )
-            else:
-                # Regular generator types (music, scenario)
-                result = subprocess.run(
-                    ['python', 'call.py'],
-                    capture_output=True,
-                    text=True,
-                    timeout=3600  # 1 hour timeout
-                )
-            
-            if result.returncode == 0:
-                task.status = "completed"
-                # Look for the generated video file
-                output_dir = "assets/upscale_generations"
-                if os.path.exists(output_dir):
-                    video_files = [f for f in os.listdir(output_dir) if f.endswith(('.mp4', '.avi', '.mov'))]
-                    if video_files:
-                        # Sort by modification time to get the most recent
-                        video_files.sort(key=lambda x: os.path.getmtime(os.path.join(output_dir, x)), reverse=True)
-                        task.result_path = os.path.join(output_dir, video_files[0])
-                        logger.info(f"Task {task_id} completed successfully: {task.result_path}")
-                    else:
-                        task.status = "failed"
-                        task.error_message = "No video file generated"
-                        logger.error(f"Task {task_id} failed: No video file found in {output_dir}")
-                else:
-                    task.status = "failed"
-                    task.error_message = "Output directory not found"
-                    logger.error(f"Task {task_id} failed: Output directory {output_dir} not found")
+            # A workspace is created just before its run records it
+            if os.path.getmtime(workspace_dir) > cutoff:
+                continue
+        except OSError:
+            continue
+        remove_workspace_dir(workspace_dir)
+        removed += 1
+    if removed:
+        logger.info(f"Removed {removed} workspace(s) of archived runs")
+    return removed
+
+
+def find_output_video(run_dir):
+    """Newest final video in run_dir/output, falling back to the newest upscaled clip"""
+    for output_dir in (os.path.join(run_dir, 'output'), os.path.join(run_dir, 'assets', 'upscale_generations')):
+        if not os.path.exists(output_dir):
+            continue
+        video_files = [f for f in os.listdir(output_dir) if f.lower().endswith(VIDEO_EXTENSIONS)]
+        if video_files:
+            video_files.sort(key=lambda x: os.path.getmtime(os.path.join(output_dir, x)), reverse=True)
+            return os.path.join(output_dir, video_files[0])
+    return None
+
+
+def publish_output(output_path):
+    """Copy a generated video into static/generated and return its new path (or the original on failure)"""
+    os.makedirs(STATIC_GENERATED_DIR, exist_ok=True)
+    basename = f"generation_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}{os.path.splitext(output_path)[1]}"
+    final_output = os.path.join(STATIC_GENERATED_DIR, basename)
+    try:
+        shutil.copy2(output_path, final_output)
+    except Exception as ce:
+        logger.warning(f"Copy output failed, using original path: {ce}")
+        return output_path
+    return final_output
+
+
+def enqueue_task(task_id, priority=0):
+    """Put a task's job on the worker queue; returns the job_runs id or None if the job isn't persisted"""
+    job = get_job_by_task_name(db_conn, task_id)
+    if not job:
+        logger.error(f"Task {task_id} has no job row; cannot queue it")
+        return None
+    return job_queue.enqueue(job['id'], priority=priority)
+
+def schedule_job_locally(job_id):
+    """Hand a job to the in-process scheduler (used when the host service can't schedule it)"""
+    job = get_job_by_id(db_conn, job_id)
+    schedule = schedule_from_job(job) if job else None
+    if schedule is None:
+        logger.error(f"Job {job_id} has no usable schedule")
+        return None
+    next_run = local_scheduler.add(schedule)
+    update_job_status(db_conn, job_id=job_id, status='scheduled')
+    logger.info(f"Job {job_id} scheduled locally; next run {next_run}")
+    return next_run
+
+# Runs currently reported as stalled, so the transition is logged and stored once
+stalled_runs = set()
+
+
+def save_preview(run_id, image_b64):
+    """Write the latest WebUI preview of a run under static/generated/previews; returns its URL"""
+    os.makedirs(PREVIEWS_DIR, exist_ok=True)
+    if ',' in image_b64[:64]:
+        image_b64 = image_b64.split(',', 1)[1]  # data: URL prefix
+    path = os.path.join(PREVIEWS_DIR, f"run_{run_id}.png")
+    tmp_path = f"{path}.part"
+    with open(tmp_path, 'wb') as f:
+        f.write(base64.b64decode(image_b64))
+    os.replace(tmp_path, path)
+    return f"/static/generated/previews/run_{run_id}.png"
+
+
+def record_progress(run_id, data):
+    """Persist the parts of a generator progress event that belong on the run record.
+
+    Goes through the write-behind batcher: samples arrive every second or so
+    and only the latest matters.
+    """
+    batcher = get_write_behind()
+    event = data.get('event')
+    now = datetime.utcnow().isoformat()
+    if event == 'sd':
+        preview = data.pop('preview', None)
+        if preview:
+            try:
+                data['preview_url'] = save_preview(run_id, preview)
+                batcher.update_job_run(run_id, progress_preview_path=data['preview_url'])
+            except Exception as e:
+                logger.warning(f"Failed to save preview for run {run_id}: {e}")
+        batcher.update_job_run(
+            run_id,
+            progress_stage=data.get('stage'),
+            progress_fraction=data.get('progress'),
+            progress_step=data.get('step'),
+            progress_steps=data.get('steps'),
+            progress_eta_sec=data.get('eta_sec'),
+            progress_updated_at=now,
+        )
+        # Keyed separately so a stall isn't re-timestamped on every sample
+        if data.get('stalled'):
+            if run_id not in stalled_runs:
+                stalled_runs.add(run_id)
+                stalled_at = (datetime.utcnow() - timedelta(seconds=data.get('idle_sec') or 0)).isoformat()
+                batcher.update_job_run(run_id, stalled_since=stalled_at)
+                logger.warning(f"Run {run_id} stalled: no WebUI progress for {data.get('idle_sec')}s "
+                               f"in {data.get('stage')}")
+        elif run_id in stalled_runs:
+            stalled_runs.discard(run_id)
+            batcher.update_job_run(run_id, stalled_since=None)
+            logger.info(f"Run {run_id} progressing again")
+    elif event in ('stage', 'item'):
+        batcher.update_job_run(run_id, progress_stage=data.get('stage'), progress_updated_at=now)
+    elif event == 'latency':
+        histogram = {k: v for k, v in data.items() if k not in ('event', 'ts', 'stage')}
+        batcher.update_job_run(run_id, upscale_latency=json.dumps(histogram, separators=(',', ':')))
+    elif event == 'checkpoint':
+        summary = {k: v for k, v in data.items() if k not in ('event', 'ts', 'job_id', 'run_id', 'task_id')}
+        batcher.update_job_run(run_id, checkpoint=json.dumps(summary, separators=(',', ':')))
+
+
+def run_generator_process(args, cwd, env, job_row, run_id):
+    """Run call.py, publishing its PROGRESS lines as they arrive; returns (exit code, last lines of other output)"""
+    proc = subprocess.Popen(args, cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            text=True, bufsize=1)
+    timed_out = threading.Event()
+
+    def _kill():
+        timed_out.set()
+        proc.kill()
+
+    timer = threading.Timer(GENERATOR_TIMEOUT_SEC, _kill)
+    timer.start()
+    tail = deque(maxlen=50)
+    try:
+        for line in proc.stdout:
+            line = line.rstrip('\n')
+            if line.startswith(GENERATOR_PROGRESS_PREFIX):
+                try:
+                    data = json.loads(line[len(GENERATOR_PROGRESS_PREFIX):])
+                except ValueError:
+                    tail.append(line)
+                    continue
+                data.update(job_id=job_row['id'], run_id=run_id, task_id=job_row['task_name'])
+                try:
+                    record_progress(run_id, data)
+                except Exception:
+                    logger.exception(f"Failed to record progress for run {run_id}")
+                event_bus.publish('progress', data)
             else:
-                task.status = "failed"
-                task.error_message = f"Generator script failed: {result.stderr}"
-                logger.error(f"Task {task_id} failed: {result.stderr}")
-                
-        finally:
-            # Always restore the original working directory
-            os.chdir(original_cwd)
-            
-    except subprocess.TimeoutExpired:
-        task.status = "failed"
-        task.error_message = "Task timed out after 1 hour"
-        logger.error(f"Task {task_id} timed out")
-    except Exception as e:
-        task.status = "failed"
-        task.error_message = str(e)
-        logger.error(f"Task {task_id} failed with error: {e}")
-    
-    # Update task in global dict
-    scheduled_tasks[task_id] = task
-
-def schedule_task_execution(task_id, scheduled_time, is_recurring=False, recurring_days=None, recurring_time=None):
-    """Schedule a task to execute at the specified time"""
-    def run_task():
-        if is_recurring and recurring_days and recurring_time:
-            # For recurring tasks, run continuously
-            while True:
-                now = datetime.now()
-                current_day = now.strftime('%A').lower()
-                current_time = now.strftime('%H:%M')
-                
-                # Check if it's time to run
-                if current_day in recurring_days and current_time == recurring_time:
-                    execute_scheduled_task(task_id)
-                    # Wait until next day to avoid multiple executions
-                    time.sleep(60)  # Wait 1 minute
-                else:
-                    # Wait 30 seconds before checking again
-                    time.sleep(30)
-        else:
-            # For one-time tasks, wait until scheduled time
-            now = datetime.now()
-            if scheduled_time > now:
-                wait_seconds = (scheduled_time - now).total_seconds()
-                time.sleep(wait_seconds)
-            
-            execute_scheduled_task(task_id)
-    
-    thread = threading.Thread(target=run_task)
-    thread.daemon = True
-    thread.start()
+                tail.append(line)
+        returncode = proc.wait()
+    finally:
+        timer.cancel()
+        stalled_runs.discard(run_id)
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+    if timed_out.is_set():
+        tail.append(f"Generator timed out after {GENERATOR_TIMEOUT_SEC}s")
+    return returncode, '\n'.join(tail)
 
-def run_custom_generation(job_row, run_id):
-    """Execute the custom generation using existing generator path."""
+
+def run_custom_generation(job_row, run_row):
+    """Execute the custom generation in its own workspace so runs can overlap."""
+    run_id = run_row['id']
     try:
-        generator_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'generators', 'custom'))
+        generator_dir = os.path.join(GENERATORS_DIR, 'custom')
         if not os.path.exists(generator_dir):
             raise Exception(f"Generator directory not found: {generator_dir}")
 
-        original_cwd = os.getcwd()
-        os.chdir(generator_dir)
+        env = os.environ.copy()
+        env['AUTO1111_API'] = f"{config.AUTO1111_BASE_URL}/sdapi/v1/img2img"
+        if config.SD_BACKENDS:
+            env['SD_BACKENDS'] = ','.join(config.SD_BACKENDS)
+        if job_row['video_length']:
+            env['GEN_VIDEO_LENGTH'] = str(job_row['video_length'])
+        if job_row['fps']:
+            env['GEN_FPS'] = str(job_row['fps'])
+        if job_row['width']:
+            env['GEN_WIDTH'] = str(job_row['width'])
+        if job_row['height']:
+            env['GEN_HEIGHT'] = str(job_row['height'])
+        if job_row['encode_profile']:
+            env['GEN_ENCODE_PROFILE'] = job_row['encode_profile']
 
-        try:
-            env = os.environ.copy()
-            env['AUTO1111_API'] = f"{config.AUTO1111_BASE_URL}/sdapi/v1/img2img"
-            if job_row['video_length']:
-                env['GEN_VIDEO_LENGTH'] = str(job_row['video_length'])
-            if job_row['fps']:
-                env['GEN_FPS'] = str(job_row['fps'])
-            if job_row['width']:
-                env['GEN_WIDTH'] = str(job_row['width'])
-            if job_row['height']:
-                env['GEN_HEIGHT'] = str(job_row['height'])
-
-            args = ['python', 'call.py']
-            if job_row['character'] and job_row['environment'] and job_row['prompt'] and job_row['prompt'] != 'RANDOM_ACTIVITY':
-                args = ['python', 'call.py', job_row['character'], job_row['environment'], job_row['prompt']]
-
-            result = subprocess.run(args, capture_output=True, text=True, timeout=7200, env=env)
-            if result.returncode != 0:
-                raise Exception(f"Generator failed: {result.stderr}")
-
-            # Find latest video in upscale_generations
-            output_dir = os.path.join(generator_dir, 'assets', 'upscale_generations')
-            output_path = None
-            if os.path.exists(output_dir):
-                video_files = [f for f in os.listdir(output_dir) if f.lower().endswith(('.mp4', '.avi', '.mov'))]
-                if video_files:
-                    video_files.sort(key=lambda x: os.path.getmtime(os.path.join(output_dir, x)), reverse=True)
-                    output_path = os.path.join(output_dir, video_files[0])
-
-            # Copy/symlink output to webapp static (for simplicity, copy)
-            final_output = None
-            if output_path and os.path.exists(output_path):
-                os.makedirs('webapp/static/generated', exist_ok=True)
-                basename = f"generation_{datetime.now().strftime('%Y%m%d_%H%M%S')}{os.path.splitext(output_path)[1]}"
-                final_output = os.path.join('webapp/static/generated', basename)
-                try:
-                    from shutil import copy2
-                    copy2(output_path, final_output)
-                except Exception as ce:
-                    logger.warning(f"Copy output failed, using original path: {ce}")
-                    final_output = output_path
-
-            complete_job_run(db_conn, run_id=run_id, status='completed', output_path=final_output)
-            return final_output
-        finally:
-            os.chdir(original_cwd)
+        workspace_dir, resume = run_workspace_dir(generator_dir, run_row)
+        set_job_run_workspace(db_conn, run_id=run_id, workspace_path=workspace_dir)
+        args = ['python', 'call.py', '--workspace', workspace_dir]
+        if resume:
+            logger.info(f"Run {run_id} resuming from checkpoints in {workspace_dir}")
+            args.append('--resume')
+        if job_row['character'] and job_row['environment'] and job_row['prompt'] and job_row['prompt'] != 'RANDOM_ACTIVITY':
+            args += [job_row['character'], job_row['environment'], job_row['prompt']]
+
+        env['GEN_PROGRESS'] = '1'
+        env['SD_STALL_SEC'] = str(config.SD_STALL_SEC)
+        env['SD_PROGRESS_PREVIEW_SEC'] = str(config.SD_PROGRESS_PREVIEW_SEC)
+        env['PYTHONUNBUFFERED'] = '1'
+        returncode, output_tail = run_generator_process(args, generator_dir, env, job_row, run_id)
+        if returncode != 0:
+            raise Exception(f"Generator failed: {output_tail}")
+
+        # Copy output to webapp static (for simplicity, copy)
+        final_output = None
+        output_path = find_output_video(workspace_dir)
+        if output_path:
+            final_output = publish_output(output_path)
+            if final_output != output_path:
+                remove_workspace_dir(workspace_dir)
+
+        complete_job_run(db_conn, run_id=run_id, status='completed', output_path=final_output)
+        return final_output
     except Exception as e:
         logger.exception("run_custom_generation failed")
         complete_job_run(db_conn, run_id=run_id, status='failed', error_message=str(e))
         raise
 
 
-def handle_host_run(job_id: int):
-    job = get_job_by_id(db_conn, job_id)
-    if not job:
-        logger.error(f"host run: job {job_id} not found")
-        return
-    update_job_status(db_conn, job_id=job_id, status='running')
-    run_id = create_job_run(db_conn, job_id=job_id, status='running')
+def process_job_run(job, run):
+    """Queue handler: execute one claimed run"""
+    if job['type'] != 'custom':
+        complete_job_run(db_conn, run_id=run['id'], status='failed', error_message=f"Unsupported type {job['type']}")
+        raise Exception(f"unsupported type {job['type']}")
+    run_custom_generation(job, run)
+
+
+# Bounded worker pool: generations are GPU-bound, so runs wait in job_runs instead of
+# each callback starting its own thread
+job_queue = JobQueue(
+    process_job_run,
+    workers=config.WORKER_POOL_SIZE,
+    lease_seconds=config.QUEUE_LEASE_SEC,
+    heartbeat_seconds=config.QUEUE_HEARTBEAT_SEC,
+    poll_seconds=config.QUEUE_POLL_SEC,
+    max_attempts=config.QUEUE_MAX_ATTEMPTS,
+    on_change=publish_job_event,
+)
+
+# One timer thread for every locally scheduled job; fires by queueing a run
+local_scheduler = Scheduler(
+    lambda job_id: job_queue.enqueue(job_id),
+    misfire_grace_sec=config.SCHEDULER_MISFIRE_GRACE_SEC,
+)
 
-    def _runner():
+
+def archive_monitor():
+    # Keeps job_runs small so queue claims and history pages stay index-sized
+    while True:
         try:
-            if job['type'] == 'custom':
-                run_custom_generation(job, run_id)
-            else:
-                complete_job_run(db_conn, run_id=run_id, status='failed', error_message=f"Unsupported type {job['type']}")
-                update_job_status(db_conn, job_id=job_id, status='failed', last_error='unsupported type')
-                return
-            update_job_status(db_conn, job_id=job_id, status='completed')
-        except Exception as e:
-            update_job_status(db_conn, job_id=job_id, status='failed', last_error=str(e))
+            archive_job_runs(db_conn, older_than_days=config.RUN_RETENTION_DAYS)
+            sweep_workspaces(os.path.join(GENERATORS_DIR, 'custom'))
+        except Exception:
+            logger.exception("Archiving job runs failed")
+        time.sleep(config.ARCHIVE_INTERVAL_SEC)
+
 
-    t = threading.Thread(target=_runner, daemon=True)
-    t.start()
+_services_lock = threading.Lock()
+_services_started = False
+
+
+def start_background_services():
+    """Start health checks, the worker pool, the scheduler and archiving; once per serving process"""
+    global _services_started
+    with _services_lock:
+        if _services_started:
+            return
+        _services_started = True
+    health.start()
+    job_queue.start()
+    local_scheduler.start()
+    threading.Thread(target=archive_monitor, daemon=True).start()
+
+
+def handle_host_run(job_id: int, priority: int = 0):
+    job = get_job_by_id(db_conn, job_id)
+    if not job:
+        logger.error(f"host run: job {job_id} not found")
+        return None
+    return job_queue.enqueue(job_id, priority=priority)
 
 
 @app.route('/api/host/run-job', methods=['POST'])
@@ -356,25 +447,205 @@ def api_host_run_job():
         if not job_id and not task_name:
             return jsonify({'error': 'jobId or taskName required'}), 400
         if not job_id and task_name:
-            # We didn't add get_job_by_task_name import above, keep minimal: not used in MVP
-            return jsonify({'error': 'lookup by taskName not implemented in MVP'}), 400
-        handle_host_run(int(job_id))
-        return jsonify({'status': 'ok'})
+            job = get_job_by_task_name(db_conn, task_name)
+            if not job:
+                return jsonify({'error': f'unknown taskName {task_name}'}), 404
+            job_id = job['id']
+        run_id = handle_host_run(int(job_id), priority=int(payload.get('priority') or 0))
+        if run_id is None:
+            return jsonify({'error': f'unknown jobId {job_id}'}), 404
+        return jsonify({'status': 'queued', 'runId': run_id})
     except Exception as e:
         logger.exception("/api/host/run-job failed")
         return jsonify({'error': str(e)}), 500
 
 
+def _page_args(default_limit: int):
+    limit = request.args.get('limit', default=default_limit, type=int)
+    return max(1, min(limit, config.API_PAGE_SIZE_MAX)), request.args.get('cursor') or None
+
+
+@app.route('/api/jobs')
+def api_jobs():
+    """Jobs newest first, paginated with an opaque cursor (?limit=&cursor=&status=)"""
+    limit, cursor = _page_args(50)
+    try:
+        rows, next_cursor = list_jobs_page(db_conn, limit=limit, cursor=cursor, status=request.args.get('status'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'jobs': [dict(r) for r in rows], 'next_cursor': next_cursor})
+
+
+@app.route('/api/jobs/<int:job_id>/runs')
+def api_job_runs(job_id):
+    """Runs of a job newest first, paginated like /api/jobs"""
+    if not get_job_by_id(db_conn, job_id):
+        return jsonify({'error': f'unknown jobId {job_id}'}), 404
+    limit, cursor = _page_args(20)
+    try:
+        rows, next_cursor = list_runs_page(db_conn, job_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'runs': [dict(r) for r in rows], 'next_cursor': next_cursor})
+
+
+@app.route('/api/jobs/<int:job_id>/history')
+def api_job_history(job_id):
+    """Daily rollups of runs archived out of job_runs"""
+    if not get_job_by_id(db_conn, job_id):
+        return jsonify({'error': f'unknown jobId {job_id}'}), 404
+    limit = max(1, min(request.args.get('limit', default=90, type=int), config.API_PAGE_SIZE_MAX))
+    return jsonify({'summaries': [dict(r) for r in list_run_summaries(db_conn, job_id, limit=limit)]})
+
+
 @app.route('/')
 def index():
     """Main page with title SentiMation"""
-    return render_template('index.html', tasks=scheduled_tasks)
+    return render_template('index.html')
+
+# Convert lowercase day names to PascalCase to match .NET DayOfWeek parsing on host
+DAY_NAMES = {
+    'monday': 'Monday', 'tuesday': 'Tuesday', 'wednesday': 'Wednesday', 'thursday': 'Thursday',
+    'friday': 'Friday', 'saturday': 'Saturday', 'sunday': 'Sunday',
+}
+
+
+def host_job_spec(job_id, task_id, generator_type, prompt, character, environment, schedule_time, recurring_days):
+    """JobSpec whose single step calls back into this webapp to run the job"""
+    job_steps = create_generator_job_steps(
+        generator_type=generator_type,
+        prompt=prompt,
+        character=character,
+        environment=environment,
+        webapp_public_url=config.WEBAPP_PUBLIC_URL,
+        host_callback_token=config.HOST_CALLBACK_TOKEN,
+        job_id=job_id,
+        task_name=task_id
+    )
+    days_pascal = [DAY_NAMES.get(d, d) for d in recurring_days] if recurring_days else None
+    return JobSpec(task_name=task_id, steps=job_steps, time=schedule_time, days=days_pascal)
+
+
+def parse_job_definition(d):
+    """Validate one job of a bulk import (same rules as the schedule form); returns create_job fields"""
+    if not isinstance(d, dict):
+        raise ValueError('each job must be an object')
+    generator_type, prompt = d.get('type'), d.get('prompt')
+    if not generator_type or not prompt:
+        raise ValueError('type and prompt are required')
+    cron_spec = (d.get('cron_spec') or '').strip() or None
+    misfire_policy = d.get('misfire_policy') or config.DEFAULT_MISFIRE_POLICY
+    if misfire_policy not in MISFIRE_POLICIES:
+        raise ValueError(f'Unknown misfire policy {misfire_policy}')
+    recurring_days = [day.lower() for day in d.get('recurring_days') or []]
+    recurring_time = d.get('recurring_time')
+    schedule_dt = None
+    if cron_spec:
+        CronSpec(cron_spec)  # raises ValueError
+        schedule_kind, schedule_time = 'recurring', None
+    elif recurring_days or recurring_time:
+        if not recurring_days or not recurring_time:
+            raise ValueError('Recurring days and time are required for recurring tasks')
+        unknown = [day for day in recurring_days if day not in DAY_NAMES]
+        if unknown:
+            raise ValueError(f'Unknown days {unknown}')
+        datetime.strptime(recurring_time, '%H:%M')
+        schedule_kind, schedule_time = 'recurring', recurring_time
+    else:
+        if not d.get('scheduled_time'):
+            raise ValueError('scheduled_time, recurring_days/recurring_time or cron_spec is required')
+        scheduled_time = datetime.fromisoformat(str(d['scheduled_time']).replace('T', ' '))
+        schedule_kind, schedule_time = 'one_time', scheduled_time.strftime('%H:%M')
+        schedule_dt = scheduled_time.isoformat()
+    encode_profile = d.get('encode_profile') or config.DEFAULT_ENCODE_PROFILE
+    if encode_profile not in config.ENCODE_PROFILES:
+        raise ValueError(f'Unknown encode profile {encode_profile}')
+    fields = {
+        'type': generator_type,
+        'prompt': prompt,
+        'character': d.get('character') if generator_type == 'custom' else None,
+        'environment': d.get('environment') if generator_type == 'custom' else None,
+        'video_length': int(d.get('video_length') or 150),
+        'fps': int(d.get('fps') or 20),
+        'width': int(d.get('width') or 360),
+        'height': int(d.get('height') or 640),
+        'encode_profile': encode_profile,
+        'cron_spec': cron_spec,
+        'misfire_policy': misfire_policy,
+        'schedule_kind': schedule_kind,
+        'schedule_dt': schedule_dt,
+        'recurring_days': ','.join(recurring_days) if schedule_kind == 'recurring' and recurring_days else None,
+        'recurring_time': recurring_time if schedule_kind == 'recurring' else None,
+    }
+    return fields, schedule_time, recurring_days
+
+
+@app.route('/api/jobs/import', methods=['POST'])
+def api_import_jobs():
+    """Create many jobs from JSON and register them with the host service in one bulk request.
+
+    Body: {"jobs": [{"type", "prompt", "character", "environment", and one of
+    "scheduled_time" | "recurring_days" + "recurring_time" | "cron_spec", ...}]}.
+    Invalid entries are reported by index and skipped; jobs the host can't take
+    are scheduled locally, as with the form.
+    """
+    payload = request.get_json(silent=True)
+    definitions = payload.get('jobs') if isinstance(payload, dict) else payload
+    if not isinstance(definitions, list) or not definitions:
+        return jsonify({'error': 'Expected {"jobs": [...]} with at least one job'}), 400
+    if len(definitions) > config.IMPORT_MAX_JOBS:
+        return jsonify({'error': f'At most {config.IMPORT_MAX_JOBS} jobs per import'}), 400
+
+    created, errors, host_jobs = [], [], []
+    for index, definition in enumerate(definitions):
+        try:
+            fields, schedule_time, recurring_days = parse_job_definition(definition)
+        except (ValueError, TypeError) as e:
+            errors.append({'index': index, 'error': str(e)})
+            continue
+        task_id = f"job_{uuid.uuid4().hex[:8]}"
+        job_id = create_job(db_conn, task_name=task_id, status='pending', **fields)
+        created.append({'index': index, 'task_id': task_id, 'job_id': job_id})
+        if not fields['cron_spec']:
+            host_jobs.append((job_id, host_job_spec(job_id, task_id, fields['type'], fields['prompt'], fields['character'],
+                                                    fields['environment'], schedule_time, recurring_days)))
+
+    # One round trip for everything the host can schedule
+    host_results = {}
+    if host_jobs and health.is_healthy('host_service'):
+        try:
+            results = host_scheduler.schedule_jobs([spec for _, spec in host_jobs])
+            host_results = {job_id: result for (job_id, _), result in zip(host_jobs, results)}
+        except (ConnectionError, TimeoutError) as e:
+            health.report_failure('host_service', e)
+        except Exception as e:
+            logger.error(f"Bulk host scheduling failed: {e}; scheduling imported jobs locally")
+
+    for entry in created:
+        job_id = entry['job_id']
+        result = host_results.get(job_id)
+        if result and result.get('status') == 'ok':
+            update_job_status(db_conn, job_id=job_id, status='scheduled', host_script_path=result.get('script'))
+            entry['scheduled_by'] = 'host'
+        else:
+            if result:
+                entry['host_error'] = result.get('error')
+            try:
+                schedule_job_locally(job_id)
+                entry['scheduled_by'] = 'local'
+            except Exception as e:
+                update_job_status(db_conn, job_id=job_id, status='failed', last_error=str(e))
+                entry['error'] = str(e)
+        publish_job_event(job_id)
+
+    logger.info(f"Imported {len(created)} job(s) ({len(host_results)} sent to the host in one request), "
+                f"{len(errors)} rejected")
+    return jsonify({'created': created, 'errors': errors}), (201 if created else 400)
+
 
 @app.route('/schedule', methods=['GET', 'POST'])
 def schedule_generation():
     """Schedule a new generation task"""
-    global task_counter, scheduled_tasks
-    
     if request.method == 'POST':
         try:
             generator_type = request.form.get('generator_type')
@@ -383,11 +654,23 @@ def schedule_generation():
             is_recurring = request.form.get('is_recurring') == 'on'
             recurring_days = request.form.getlist('recurring_days')
             recurring_time_str = request.form.get('recurring_time')
+            cron_spec = (request.form.get('cron_spec') or '').strip() or None
+            misfire_policy = request.form.get('misfire_policy') or config.DEFAULT_MISFIRE_POLICY
             
             if not all([generator_type, prompt]):
                 return jsonify({'error': 'Generator type and prompt are required'}), 400
+            if misfire_policy not in MISFIRE_POLICIES:
+                return jsonify({'error': f'Unknown misfire policy {misfire_policy}'}), 400
             
-            if is_recurring:
+            if cron_spec:
+                try:
+                    CronSpec(cron_spec)
+                except ValueError as e:
+                    return jsonify({'error': f'Invalid cron spec: {e}'}), 400
+                is_recurring = True
+                scheduled_time = datetime.now()
+                schedule_time = None
+            elif is_recurring:
                 if not recurring_days or not recurring_time_str:
                     return jsonify({'error': 'Recurring days and time are required for recurring tasks'}), 400
                 scheduled_time = datetime.now()  # For recurring tasks, use current time as creation time
@@ -416,25 +699,10 @@ def schedule_generation():
                 height_val = int(request.form.get('height') or 640)
             except Exception:
                 video_length_val, fps_val, width_val, height_val = 150, 20, 360, 640
+            encode_profile_val = request.form.get('encode_profile') or config.DEFAULT_ENCODE_PROFILE
+            if encode_profile_val not in config.ENCODE_PROFILES:
+                encode_profile_val = config.DEFAULT_ENCODE_PROFILE
 
-            task = GenerationTask(
-                task_id=task_id,
-                generator_type=generator_type,
-                prompt=prompt,
-                scheduled_time=scheduled_time,
-                is_recurring=is_recurring,
-                recurring_days=recurring_days,
-                recurring_time=recurring_time_str,
-                character=character,
-                environment=environment,
-                video_length=video_length_val,
-                fps=fps_val,
-                width=width_val,
-                height=height_val
-            )
-            
-            scheduled_tasks[task_id] = task
-            
             # Persist job in DB
             schedule_kind = 'recurring' if is_recurring else 'one_time'
             schedule_dt_iso = None if is_recurring else scheduled_time.isoformat()
@@ -450,6 +718,9 @@ def schedule_generation():
                 fps=fps_val,
                 width=width_val,
                 height=height_val,
+                encode_profile=encode_profile_val,
+                cron_spec=cron_spec,
+                misfire_policy=misfire_policy,
                 schedule_kind=schedule_kind,
                 schedule_dt=schedule_dt_iso,
                 recurring_days=recurring_days_csv,
@@ -457,49 +728,38 @@ def schedule_generation():
                 status='pending'
             )
             
-            # Create job steps for the host service
+            # Create job specification for the host service
             try:
-                job_steps = create_generator_job_steps(
-                    generator_type=generator_type,
-                    prompt=prompt,
-                    character=character,
-                    environment=environment,
-                    webapp_public_url=config.WEBAPP_PUBLIC_URL,
-                    host_callback_token=config.HOST_CALLBACK_TOKEN,
-                    job_id=job_db_id,
-                    task_name=task_id
-                )
-                
-                # Create job specification
-                days_pascal = None
-                if is_recurring and recurring_days:
-                    # Convert lowercase day names to PascalCase to match .NET DayOfWeek parsing on host
-                    day_map = {
-                        'monday':'Monday','tuesday':'Tuesday','wednesday':'Wednesday','thursday':'Thursday','friday':'Friday','saturday':'Saturday','sunday':'Sunday'
-                    }
-                    days_pascal = [day_map.get(d, d) for d in recurring_days]
-                job_spec = JobSpec(
-                    task_name=task_id,
-                    steps=job_steps,
-                    time=schedule_time,
-                    days=days_pascal
-                )
+                job_spec = host_job_spec(job_db_id, task_id, generator_type, prompt, character, environment,
+                                         schedule_time, recurring_days if is_recurring else None)
                 
-                # Schedule job with host service
-                if host_scheduler.is_available():
-                    host_result = host_scheduler.schedule_job(job_spec)
-                    task.host_script_path = host_result.get('script')
-                    update_job_status(db_conn, job_id=job_db_id, status='scheduled', host_script_path=task.host_script_path)
+                # Schedule job with host service; cron specs have no host equivalent
+                host_result = None
+                if not cron_spec and health.is_healthy('host_service'):
+                    try:
+                        host_result = host_scheduler.schedule_job(job_spec)
+                    except (ConnectionError, TimeoutError) as e:
+                        # The cached state was stale; schedule locally instead
+                        health.report_failure('host_service', e)
+                if host_result is not None:
+                    update_job_status(db_conn, job_id=job_db_id, status='scheduled', host_script_path=host_result.get('script'))
                     logger.info(f"Job scheduled with host service: {host_result}")
                 else:
-                    logger.warning("Host service not available; job saved but not scheduled")
-                    update_job_status(db_conn, job_id=job_db_id, status='pending')
+                    if not cron_spec:
+                        logger.warning("Host service not available; scheduling job locally")
+                    schedule_job_locally(job_db_id)
                 
             except Exception as e:
-                logger.error(f"Failed to schedule job with host service: {e}")
-                update_job_status(db_conn, job_id=job_db_id, status='failed', last_error=str(e))
+                logger.error(f"Failed to schedule job with host service: {e}; scheduling locally")
+                try:
+                    schedule_job_locally(job_db_id)
+                except Exception as le:
+                    update_job_status(db_conn, job_id=job_db_id, status='failed', last_error=str(le))
             
-            if is_recurring:
+            publish_job_event(job_db_id)
+            if cron_spec:
+                logger.info(f"Scheduled cron task {task_id}: {cron_spec}")
+            elif is_recurring:
                 logger.info(f"Scheduled recurring task {task_id} for {', '.join(recurring_days)} at {recurring_time_str}")
             else:
                 logger.info(f"Scheduled task {task_id} for {scheduled_time}")
@@ -516,89 +776,112 @@ def schedule_generation():
     
     return render_template('schedule.html')
 
+# Job statuses that can still be cancelled / started by hand
+CANCELLABLE_STATUSES = ('pending', 'scheduled', 'queued')
+RUNNABLE_STATUSES = ('pending', 'scheduled')
+
+
+def _utc_iso(ts):
+    """Timestamps written by db._now_iso are naive UTC; mark them so browsers convert to local time"""
+    return f"{ts}Z" if ts else None
+
+
+def serialize_task(row):
+    """Compact JSON view of a jobs row joined with its last run; None fields are omitted"""
+    data = {
+        'id': row['task_name'],
+        'job_id': row['id'],
+        'generator_type': row['type'],
+        'prompt': row['prompt'],
+        'character': row['character'],
+        'environment': row['environment'],
+        'status': row['status'],
+        'scheduled_time': row['schedule_dt'] or row['next_run_at'] or _utc_iso(row['created_at']),
+        'next_run_at': row['next_run_at'],
+        'created_at': _utc_iso(row['created_at']),
+        'is_recurring': row['schedule_kind'] == 'recurring',
+        'recurring_days': row['recurring_days'].split(',') if row['recurring_days'] else None,
+        'recurring_time': row['recurring_time'],
+        'cron_spec': row['cron_spec'],
+        'result_path': row['run_output_path'],
+        'error_message': row['run_error_message'] or row['last_error'],
+    }
+    return {k: v for k, v in data.items() if v is not None}
+
+
+def serialize_run(row):
+    data = {
+        'id': row['id'],
+        'status': row['status'],
+        'started_at': _utc_iso(row['started_at']),
+        'finished_at': _utc_iso(row['finished_at']),
+        'output_path': row['output_path'],
+        'error_message': row['error_message'],
+        'attempts': row['attempts'],
+        'resume_of': row['resume_of'],
+        'checkpoint': json.loads(row['checkpoint']) if row['checkpoint'] else None,
+        'resumable': row['status'] == 'failed' and bool(row['workspace_path'])
+                     and os.path.exists(workspace_manifest(row['workspace_path'])),
+    }
+    return {k: v for k, v in data.items() if v is not None}
+
+
+def conditional_json(payload):
+    """Compact JSON with a content ETag; answers 304 when the client's If-None-Match still matches"""
+    body = json.dumps(payload, separators=(',', ':'))
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(hashlib.sha1(body.encode('utf-8')).hexdigest())
+    # Let the browser cache but always revalidate, so polling costs a 304 until something changes
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
 @app.route('/tasks')
 def get_tasks():
-    """Get all scheduled tasks"""
-    tasks_data = []
-    for task_id, task in scheduled_tasks.items():
-        task_data = {
-            'id': task_id,
-            'generator_type': task.generator_type,
-            'prompt': task.prompt,
-            'scheduled_time': task.scheduled_time.isoformat(),
-            'status': task.status,
-            'result_path': task.result_path,
-            'error_message': task.error_message,
-            'created_at': task.created_at.isoformat(),
-            'is_recurring': task.is_recurring,
-            'recurring_days': task.recurring_days,
-            'recurring_time': task.recurring_time
-        }
-        
-        # Add custom generator fields if they exist
-        if hasattr(task, 'character') and task.character:
-            task_data['character'] = task.character
-        if hasattr(task, 'environment') and task.environment:
-            task_data['environment'] = task.environment
-            
-        tasks_data.append(task_data)
-    
-    return jsonify(tasks_data)
+    """Get the most recent tasks"""
+    rows = list_jobs_with_last_run(db_conn, limit=config.TASKS_LIST_LIMIT)
+    return conditional_json([serialize_task(row) for row in rows])
 
 @app.route('/task/<task_id>')
 def get_task(task_id):
     """Get specific task details"""
-    if task_id not in scheduled_tasks:
+    row = get_job_with_last_run(db_conn, task_id)
+    if not row:
         return jsonify({'error': 'Task not found'}), 404
-    
-    task = scheduled_tasks[task_id]
-    task_data = {
-        'id': task_id,
-        'generator_type': task.generator_type,
-        'prompt': task.prompt,
-        'scheduled_time': task.scheduled_time.isoformat(),
-        'status': task.status,
-        'result_path': task.result_path,
-        'error_message': task.error_message,
-        'created_at': task.created_at.isoformat(),
-        'is_recurring': task.is_recurring,
-        'recurring_days': task.recurring_days,
-        'recurring_time': task.recurring_time
-    }
-    
-    # Add custom generator fields if they exist
-    if hasattr(task, 'character') and task.character:
-        task_data['character'] = task.character
-    if hasattr(task, 'environment') and task.environment:
-        task_data['environment'] = task.environment
-    
-    # Add host service fields if they exist
-    if hasattr(task, 'host_script_path') and task.host_script_path:
-        task_data['host_script_path'] = task.host_script_path
-    if hasattr(task, 'host_log_path') and task.host_log_path:
-        task_data['host_log_path'] = task.host_log_path
-    if hasattr(task, 'host_exit_code') and task.host_exit_code is not None:
-        task_data['host_exit_code'] = task.host_exit_code
-        
-    return jsonify(task_data)
+
+    task_data = serialize_task(row)
+    for field in ('video_length', 'fps', 'width', 'height', 'encode_profile', 'misfire_policy',
+                  'host_script_path', 'host_log_path'):
+        if row[field] is not None:
+            task_data[field] = row[field]
+    if row['run_host_exit_code'] is not None:
+        task_data['host_exit_code'] = row['run_host_exit_code']
+    task_data['runs'] = [serialize_run(r) for r in list_runs_for_job(db_conn, row['id'], limit=10)]
+    return conditional_json(task_data)
 
 @app.route('/cancel/<task_id>')
 def cancel_task(task_id):
     """Cancel a scheduled task"""
-    global scheduled_tasks
-    
-    if task_id not in scheduled_tasks:
+    job = get_job_by_task_name(db_conn, task_id)
+    if not job:
         return jsonify({'error': 'Task not found'}), 404
-    
-    task = scheduled_tasks[task_id]
-    if task.status in ["pending", "scheduled"]:
-        task.status = "cancelled"
+
+    # A recurring job is cancellable whatever its last run did, for as long as it has a next run
+    if job['status'] in CANCELLABLE_STATUSES or (job['next_run_at'] and job['status'] != 'cancelled'):
+        local_scheduler.remove(job['id'])
+        # remove() only clears next_run_at for schedules it holds; clear it regardless so a restart can't reload it
+        set_job_next_run(db_conn, job['id'], None)
+        job_queue.cancel(job['id'])
+        update_job_status(db_conn, job_id=job['id'], status='cancelled')
+        publish_job_event(job['id'], status='cancelled')
         # Also request deletion from host scheduler
         try:
-            if host_scheduler.is_available():
+            if health.is_healthy('host_service'):
                 host_scheduler.delete_task(task_id)
                 logger.info(f"Task {task_id} deleted from host scheduler")
         except Exception as e:
+            if isinstance(e, (ConnectionError, TimeoutError)):
+                health.report_failure('host_service', e)
             logger.warning(f"Failed to delete task {task_id} from host scheduler: {e}")
         logger.info(f"Task {task_id} cancelled")
         return jsonify({'message': 'Task cancelled successfully'})
@@ -608,20 +891,18 @@ def cancel_task(task_id):
 @app.route('/run_now/<task_id>')
 def run_task_now(task_id):
     """Run a scheduled task immediately"""
-    global scheduled_tasks
-    
-    if task_id not in scheduled_tasks:
+    job = get_job_by_task_name(db_conn, task_id)
+    if not job:
         return jsonify({'error': 'Task not found'}), 404
-    
-    task = scheduled_tasks[task_id]
-    if task.status == "pending":
+
+    if job['status'] in RUNNABLE_STATUSES:
         try:
             # Create job steps for the host service
             job_steps = create_generator_job_steps(
-                generator_type=task.generator_type,
-                prompt=task.prompt,
-                character=task.character,
-                environment=task.environment
+                generator_type=job['type'],
+                prompt=job['prompt'],
+                character=job['character'],
+                environment=job['environment']
             )
             
             # Create job specification (no time needed for immediate execution)
@@ -631,50 +912,56 @@ def run_task_now(task_id):
             )
             
             # Run job immediately with host service
-            if host_scheduler.is_available():
+            if health.is_healthy('host_service'):
                 host_result = host_scheduler.run_job_now(job_spec)
-                task.host_log_path = host_result.get('log')
-                task.host_exit_code = host_result.get('exitCode')
-                task.status = "running"
-                task.started_at = datetime.now()
+                update_job_status(db_conn, job_id=job['id'], status='running', host_log_path=host_result.get('log'))
+                publish_job_event(job['id'], status='running')
                 
                 logger.info(f"Task {task_id} started immediately with host service: {host_result}")
-                return jsonify({'message': 'Task started successfully with host service', 'log_path': task.host_log_path})
+                return jsonify({'message': 'Task started successfully with host service', 'log_path': host_result.get('log')})
             else:
                 logger.warning("Host service not available, falling back to local execution")
-                # Fall back to local execution
-                task.status = "running"
-                task.started_at = datetime.now()
+                # Fall back to the local worker queue, ahead of routine runs
+                run_id = enqueue_task(task_id, priority=config.RUN_NOW_PRIORITY)
+                if run_id is None:
+                    return jsonify({'error': 'Task is not persisted; cannot run locally'}), 500
                 
-                # Start execution in a separate thread
-                execution_thread = threading.Thread(
-                    target=execute_scheduled_task,
-                    args=(task_id,),
-                    daemon=True
-                )
-                execution_thread.start()
-                
-                logger.info(f"Task {task_id} started immediately with local execution")
-                return jsonify({'message': 'Task started successfully with local execution'})
+                logger.info(f"Task {task_id} queued for local execution as run {run_id}")
+                return jsonify({'message': 'Task queued for local execution', 'run_id': run_id})
                 
         except Exception as e:
+            if isinstance(e, (ConnectionError, TimeoutError)):
+                health.report_failure('host_service', e)
             logger.error(f"Failed to run task {task_id} with host service: {e}")
-            # Fall back to local execution
-            task.status = "running"
-            task.started_at = datetime.now()
-            
-            # Start execution in a separate thread
-            execution_thread = threading.Thread(
-                target=execute_scheduled_task,
-            args=(task_id,),
-                daemon=True
-            )
-            execution_thread.start()
+            # Fall back to the local worker queue
+            run_id = enqueue_task(task_id, priority=config.RUN_NOW_PRIORITY)
+            if run_id is None:
+                return jsonify({'error': 'Task is not persisted; cannot run locally'}), 500
             
-            logger.info(f"Task {task_id} started immediately with local execution (fallback)")
-            return jsonify({'message': 'Task started successfully with local execution (fallback)'})
+            logger.info(f"Task {task_id} queued for local execution as run {run_id} (fallback)")
+            return jsonify({'message': 'Task queued for local execution (fallback)', 'run_id': run_id})
     else:
-        return jsonify({'error': 'Can only run pending tasks'}), 400
+        return jsonify({'error': 'Can only run pending or scheduled tasks'}), 400
+
+@app.route('/api/runs/<int:run_id>/resume', methods=['POST'])
+def resume_run(run_id):
+    """Queue a new run that continues a failed run from its last checkpoint"""
+    run = get_job_run(db_conn, run_id)
+    if not run:
+        return jsonify({'error': f'unknown runId {run_id}'}), 404
+    if run['status'] != 'failed':
+        return jsonify({'error': 'Only failed runs can be resumed'}), 400
+    if not run['workspace_path'] or not os.path.exists(workspace_manifest(run['workspace_path'])):
+        return jsonify({'error': 'Run left no checkpoint to resume from'}), 409
+    # Two runs resuming in one workspace would overwrite each other's files. Ask job_runs, not the
+    # job's status: another run of the job finishing overwrites that while a resume is still queued
+    if has_active_resume(db_conn, run_id, run['workspace_path']):
+        return jsonify({'error': 'Run is already being resumed'}), 409
+    job = get_job_by_id(db_conn, run['job_id'])
+
+    new_run_id = job_queue.enqueue(job['id'], priority=config.RUN_NOW_PRIORITY, resume_of=run_id)
+    logger.info(f"Run {run_id} of task {job['task_name']} queued for resume as run {new_run_id}")
+    return jsonify({'message': 'Run queued for resume', 'run_id': new_run_id})
 
 @app.route('/generators')
 def get_generators():
@@ -702,98 +989,56 @@ def get_generators():
     generators.sort()
     return jsonify(generators)
 
+def generator_catalog(generator_type):
+    """Asset catalog of a generator folder, or None for names that aren't one"""
+    if not generator_type or os.path.basename(generator_type) != generator_type or generator_type.startswith('.'):
+        return None
+    generator_dir = os.path.join(GENERATORS_DIR, generator_type)
+    if not os.path.isdir(generator_dir):
+        return None
+    return asset_catalog.get_catalog(os.path.join(generator_dir, 'assets'))
+
 @app.route('/characters/<generator_type>')
 def get_characters(generator_type):
     """Get available characters for a specific generator"""
-    characters = []
-    characters_file = Path(f"../generators/{generator_type}/assets/devices/characters.txt")
-    
-    if characters_file.exists():
-        try:
-            with open(characters_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if line:
-                        parts = line.split(',')
-                        if len(parts) >= 4:
-                            characters.append({
-                                'name': parts[0].strip(),
-                                'lora': parts[1].strip(),
-                                'activator': parts[2].strip(),
-                                'quote_directory': parts[3].strip()
-                            })
-        except Exception as e:
-            logger.error(f"Error reading characters file: {e}")
-    
-    return jsonify(characters)
+    catalog = generator_catalog(generator_type)
+    return conditional_json(catalog.characters() if catalog else [])
 
 @app.route('/environments/<generator_type>')
 def get_environments(generator_type):
     """Get available environments for a specific generator"""
-    environments = []
-    environments_file = Path(f"../generators/{generator_type}/assets/devices/environments.txt")
-    
-    if environments_file.exists():
-        try:
-            with open(environments_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if line:
-                        parts = line.split(',')
-                        if len(parts) >= 1:
-                            environments.append({
-                                'name': parts[0].strip(),
-                                'lora': parts[1].strip() if len(parts) > 1 else ''
-                            })
-        except Exception as e:
-            logger.error(f"Error reading environments file: {e}")
-    
-    return jsonify(environments)
+    catalog = generator_catalog(generator_type)
+    return conditional_json(catalog.environments() if catalog else [])
 
 @app.route('/prompts/<generator_type>')
 def get_prompts(generator_type):
     """Get available prompts for a specific generator"""
-    prompts = []
-    prompts_dir = Path(f"../generators/{generator_type}/assets/prompts")
-    
     # Add random activity option
-    prompts.append({
+    prompts = [{
         'name': 'Random Activity',
         'filename': 'random',
         'content': 'RANDOM_ACTIVITY',
         'is_random': True
-    })
-    
-    if prompts_dir.exists():
-        for prompt_file in prompts_dir.glob("*.txt"):
-            # Read the prompt content
-            try:
-                with open(prompt_file, 'r', encoding='utf-8') as f:
-                    prompt_content = f.read().strip()
-                
-                # Extract activity name from filename (remove .txt extension)
-                activity_name = prompt_file.stem.replace('_', ' ').title()
-                
-                prompts.append({
-                    'name': activity_name,
-                    'filename': prompt_file.name,
-                    'content': prompt_content,
-                    'is_random': False
-                })
-            except Exception as e:
-                logger.error(f"Error reading prompt file {prompt_file}: {e}")
-    
-    return jsonify(prompts)
+    }]
+    catalog = generator_catalog(generator_type)
+    if catalog:
+        prompts += [{
+            'name': prompt['title'],
+            'filename': prompt['filename'],
+            'content': prompt['content'],
+            'is_random': False
+        } for prompt in catalog.prompts()]
+    return conditional_json(prompts)
 
 @app.route('/host-service/status')
 def host_service_status():
     """Check the status of the host service"""
     try:
-        is_available = host_scheduler.is_available()
         return jsonify({
             'status': 'ok',
-            'host_service_available': is_available,
-            'host_service_url': config.HOST_SERVICE_URL
+            'host_service_available': health.is_healthy('host_service'),
+            'host_service_url': config.HOST_SERVICE_URL,
+            'health': health.status()['host_service']
         })
     except Exception as e:
         logger.error(f"Error checking host service status: {e}")
@@ -803,16 +1048,38 @@ def host_service_status():
             'host_service_url': config.HOST_SERVICE_URL
         }), 500
 
+@app.route('/events')
+def events():
+    """Server-sent events: 'job' state transitions and generator 'progress'"""
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    response = Response(event_stream(event_bus, last_event_id), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # don't let nginx buffer the stream
+    return response
+
 @app.route('/healthz')
 def healthz():
     return jsonify({
-        'host_service': health_state['host_service'],
-        'auto1111': health_state['auto1111']
+        'host_service': health.is_healthy('host_service'),
+        'auto1111': health.any_healthy('sd:'),
+        'sd_backends': {name[len('sd:'):]: health.is_healthy(name) for name in health.names('sd:')},
+        'health': health.status(),
+        'queue': job_queue.stats(),
+        'stalled_runs': [dict(r) for r in list_stalled_job_runs(db_conn, silent_sec=config.RUN_SILENT_SEC)],
+        'event_subscribers': event_bus.subscriber_count()
     })
 
 if __name__ == '__main__':
     # Create necessary directories
-    os.makedirs('webapp/static/generated', exist_ok=True)
+    os.makedirs(STATIC_GENERATED_DIR, exist_ok=True)
     
     logger.info("Starting SentiMation web application")
-    app.run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
+    # debug=True runs this file twice: a reloader parent that only watches for code changes
+    # and the child that serves (WERKZEUG_RUN_MAIN=true). Services started in both would fire
+    # every schedule twice and have two worker pools competing for leases.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_services()
+    app.run(host='0.0.0.0', port=5000, debug=True)
+else:
+    # Imported by a WSGI server
+    start_background_services() 
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark the webapp's SQLite write path under concurrent workers.
+
+Compares the original setup (one shared connection, rollback journal, a
+commit per call) with WAL + per-thread connections, and with WAL plus the
+write-behind batcher for progress updates. Runs against a scratch database.
+
+Usage:
+    python benchmark_db.py [--threads 8] [--runs 200] [--updates 20]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import db
+
+
+def _legacy_connection(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _seed_job(conn):
+    return db.create_job(
+        conn, task_name='bench', type='custom', prompt='bench', character=None, environment=None,
+        schedule_kind='one_time', schedule_dt=None, recurring_days=None, recurring_time=None,
+    )
+
+
+def run_scenario(name, threads, runs, updates):
+    path = os.path.join(tempfile.mkdtemp(prefix='sentimation-bench-'), 'bench.db')
+    if name == 'legacy':
+        shared = _legacy_connection(path)
+        conn_for_thread = lambda: shared
+    else:
+        shared = db.ThreadLocalConnection(path)
+        conn_for_thread = lambda: shared
+    db.init_db(shared)
+    job_id = _seed_job(shared)
+    batcher = db.WriteBehindBatcher(path) if name == 'wal+batched' else None
+
+    errors = []
+    run_ids = [[] for _ in range(threads)]
+
+    def insert_worker(i):
+        conn = conn_for_thread()
+        for _ in range(runs):
+            try:
+                run_ids[i].append(db.create_job_run(conn, job_id=job_id))
+            except sqlite3.Error as e:
+                errors.append(str(e))
+
+    def update_worker(i):
+        conn = conn_for_thread()
+        for run_id in run_ids[i]:
+            for n in range(updates):
+                try:
+                    if batcher:
+                        batcher.update_job_run(run_id, heartbeat_at=db._now_iso(), error_message=f"progress {n}")
+                    else:
+                        cur = conn.cursor()
+                        cur.execute("UPDATE job_runs SET heartbeat_at = ?, error_message = ? WHERE id = ?",
+                                    (db._now_iso(), f"progress {n}", run_id))
+                        conn.commit()
+                except sqlite3.Error as e:
+                    errors.append(str(e))
+            try:
+                db.complete_job_run(conn, run_id=run_id, status='completed')
+            except sqlite3.Error as e:
+                errors.append(str(e))
+
+    def timed(target):
+        pool = [threading.Thread(target=target, args=(i,)) for i in range(threads)]
+        start = time.perf_counter()
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        if batcher:
+            batcher.flush()
+        return time.perf_counter() - start
+
+    insert_secs = timed(insert_worker)
+    update_secs = timed(update_worker)
+    if batcher:
+        batcher.close()
+    total_inserts = threads * runs
+    total_updates = total_inserts * (updates + 1)
+    return {
+        'inserts_per_sec': total_inserts / insert_secs,
+        'updates_per_sec': total_updates / update_secs,
+        'errors': len(errors),
+        'first_error': errors[0] if errors else '',
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--runs', type=int, default=200, help='job_runs inserted per thread')
+    parser.add_argument('--updates', type=int, default=20, help='progress updates per run')
+    args = parser.parse_args()
+
+    print(f"{args.threads} threads, {args.runs} runs/thread, {args.updates} progress updates/run")
+    print(f"{'scenario':<14}{'inserts/s':>12}{'updates/s':>12}{'errors':>8}")
+    for name in ('legacy', 'wal', 'wal+batched'):
+        r = run_scenario(name, args.threads, args.runs, args.updates)
+        print(f"{name:<14}{r['inserts_per_sec']:>12.0f}{r['updates_per_sec']:>12.0f}{r['errors']:>8}"
+              + (f"  ({r['first_error']})" if r['errors'] else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -27,9 +27,16 @@ SD_API_URL = os.getenv('SD_API_URL', SD_API_URL_WSL2)
 # Base for health checks and general SD API
 AUTO1111_BASE_URL = os.getenv('AUTO1111_BASE_URL', 'http://host.docker.internal:7860')
 
+# Several SD boxes: comma-separated WebUI base URLs the generator load-balances across
+# (see generators/sd_client.py). Empty = use AUTO1111_BASE_URL only.
+SD_BACKENDS = [url.strip().rstrip('/') for url in os.getenv('SD_BACKENDS', '').split(',') if url.strip()]
+
 # Host Service Configuration
 # Windows host service that handles job scheduling and execution
 HOST_SERVICE_URL = os.getenv('HOST_SERVICE_URL', 'http://host.docker.internal:7070')
+# Schedule/delete calls arriving within this many seconds share one bulk request (0 = off)
+HOST_COALESCE_WINDOW_SEC = float(os.getenv('HOST_COALESCE_WINDOW_SEC', '0.05'))
+IMPORT_MAX_JOBS = int(os.getenv('IMPORT_MAX_JOBS', '1000'))  # jobs per /api/jobs/import request
 
 # Webapp public URL (how Windows host calls back into this app)
 # Default assumes port 5000 is published on localhost
@@ -38,8 +45,45 @@ WEBAPP_PUBLIC_URL = os.getenv('WEBAPP_PUBLIC_URL', 'http://localhost:5000')
 # Shared secret for host callback authentication
 HOST_CALLBACK_TOKEN = os.getenv('HOST_CALLBACK_TOKEN', 'dev-callback-token-change-me')
 
-# Health check interval seconds
+# Final-output encoding profiles (defined in generators/custom/encoding.py)
+ENCODE_PROFILES = ['fast-preview', 'publish', 'archive']
+DEFAULT_ENCODE_PROFILE = os.getenv('DEFAULT_ENCODE_PROFILE', 'publish')
+
+# Local job queue: generations are GPU-bound, so keep the pool small
+WORKER_POOL_SIZE = int(os.getenv('WORKER_POOL_SIZE', '1'))
+QUEUE_LEASE_SEC = int(os.getenv('QUEUE_LEASE_SEC', '120'))          # a run whose heartbeat stops is requeued after this
+QUEUE_HEARTBEAT_SEC = int(os.getenv('QUEUE_HEARTBEAT_SEC', '30'))
+QUEUE_POLL_SEC = int(os.getenv('QUEUE_POLL_SEC', '5'))
+QUEUE_MAX_ATTEMPTS = int(os.getenv('QUEUE_MAX_ATTEMPTS', '3'))
+RUN_NOW_PRIORITY = 10  # "Run now" jumps ahead of host-triggered runs (priority 0)
+
+# Local scheduler (used when the host service is unavailable, and for cron specs)
+SCHEDULER_MISFIRE_GRACE_SEC = int(os.getenv('SCHEDULER_MISFIRE_GRACE_SEC', '300'))  # runs later than this follow the misfire policy
+DEFAULT_MISFIRE_POLICY = os.getenv('DEFAULT_MISFIRE_POLICY', 'run_once')           # run_once | skip | run_all
+
+# Live generation progress: the generator samples AUTO1111 /sdapi/v1/progress during each request
+SD_STALL_SEC = int(os.getenv('SD_STALL_SEC', '30'))                        # no step change for this long = stalled
+SD_PROGRESS_PREVIEW_SEC = int(os.getenv('SD_PROGRESS_PREVIEW_SEC', '10'))  # live preview image every N seconds (0 = off)
+RUN_SILENT_SEC = int(os.getenv('RUN_SILENT_SEC', '120'))                   # /healthz flags running runs silent for this long
+
+# job_runs history: finished runs older than this are folded into daily summaries
+RUN_RETENTION_DAYS = float(os.getenv('RUN_RETENTION_DAYS', '90'))
+ARCHIVE_INTERVAL_SEC = int(os.getenv('ARCHIVE_INTERVAL_SEC', str(6 * 3600)))
+API_PAGE_SIZE_MAX = 200
+TASKS_LIST_LIMIT = int(os.getenv('TASKS_LIST_LIMIT', '200'))  # newest jobs shown on the dashboard
+
+# Keep per-run generator workspaces (generators/custom/workspaces/<run>) after a successful run
+KEEP_WORKSPACES = os.getenv('KEEP_WORKSPACES', '0').lower() in ('1', 'true', 'yes')
+# Workspaces no job_runs row points at (their run was archived) are swept after this long untouched
+WORKSPACE_SWEEP_GRACE_SEC = int(os.getenv('WORKSPACE_SWEEP_GRACE_SEC', '3600'))
+
+# Health checks (webapp/health.py): probe every target this often while it is failing or
+# has just changed state; a steadily healthy target backs off, doubling up to the max
 HEALTHCHECK_INTERVAL_SEC = int(os.getenv('HEALTHCHECK_INTERVAL_SEC', '15'))
+HEALTHCHECK_MAX_INTERVAL_SEC = int(os.getenv('HEALTHCHECK_MAX_INTERVAL_SEC', '120'))
+HEALTHCHECK_TIMEOUT_SEC = float(os.getenv('HEALTHCHECK_TIMEOUT_SEC', '3'))
+# Cheap WebUI endpoint to probe (/sdapi/v1/options serialises the whole settings object)
+SD_HEALTH_PATH = os.getenv('SD_HEALTH_PATH', '/internal/ping')
 
 # Logging configuration
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
@@ -1,14 +1,34 @@
 #!/usr/bin/env python3
 """
 SQLite persistence for SentiMation webapp
+
+Connections run in WAL mode with a busy timeout so readers never block the
+writer and concurrent writers wait instead of failing with "database is
+locked". Request handlers use ThreadLocalConnection (one connection per
+thread); high-frequency progress writes go through WriteBehindBatcher.
+
+Schema changes are versioned migrations (MIGRATIONS, tracked in PRAGMA
+user_version) applied by init_db. History is read with keyset pagination, and
+old runs are periodically folded into job_run_daily_summary.
 """
+import atexit
+import base64
+import json
+import logging
 import os
 import sqlite3
-from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
 
 _DB_PATH_DEFAULT = os.path.join(os.path.dirname(__file__), 'data', 'app.db')
 
+# WAL needs shared memory; set DB_JOURNAL_MODE=DELETE on filesystems without it (e.g. some network mounts)
+DB_JOURNAL_MODE = os.getenv('DB_JOURNAL_MODE', 'WAL')
+DB_BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', '10000'))
+
+logger = logging.getLogger(__name__)
+
 
 def _ensure_parent_dir(path: str) -> None:
     os.makedirs(os.path.dirname(path), exist_ok=True)
@@ -17,11 +37,124 @@ def _ensure_parent_dir(path: str) -> None:
 def get_connection(db_path: Optional[str] = None) -> sqlite3.Connection:
     path = db_path or _DB_PATH_DEFAULT
     _ensure_parent_dir(path)
-    conn = sqlite3.connect(path, check_same_thread=False)
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=DB_BUSY_TIMEOUT_MS / 1000)
     conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA journal_mode = {DB_JOURNAL_MODE}")
+    if DB_JOURNAL_MODE.upper() == 'WAL':
+        # In WAL mode NORMAL only syncs at checkpoints; a crash can lose the last
+        # commits but never corrupts the database
+        conn.execute("PRAGMA synchronous = NORMAL")
     return conn
 
 
+class ThreadLocalConnection:
+    """Drop-in stand-in for a shared sqlite3.Connection that gives each thread its own connection"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = get_connection(self.db_path)
+            self._local.conn = conn
+        return conn
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.connection, name)
+
+
+class WriteBehindBatcher:
+    """Coalesces frequent UPDATEs and commits them in one transaction per flush interval.
+
+    Writes are keyed; a newer write for the same key replaces a pending one,
+    so a run reporting progress ten times a second costs one row update per
+    flush. Use only for fields where readers can tolerate flush_interval of
+    staleness (progress, heartbeat timestamps), never for state transitions.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, *, flush_interval: float = 0.5, max_pending: int = 1000):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[Hashable, Tuple[str, Sequence[Any]]] = {}
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._stop = False
+        self._conn: Optional[sqlite3.Connection] = None
+        self.writes_submitted = 0
+        self.rows_written = 0
+        self.flushes = 0
+        self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, key: Hashable, sql: str, params: Sequence[Any]) -> None:
+        with self._cond:
+            self._pending[key] = (sql, params)
+            self.writes_submitted += 1
+            if len(self._pending) >= self.max_pending:
+                self._cond.notify()
+
+    def update_job_run(self, run_id: int, **fields: Any) -> None:
+        """Queue an UPDATE of job_runs columns; later calls for the same run and columns win"""
+        columns = sorted(fields)
+        sql = f"UPDATE job_runs SET {', '.join(f'{c} = ?' for c in columns)} WHERE id = ?"
+        self.submit(('job_runs', run_id, tuple(columns)), sql, [fields[c] for c in columns] + [run_id])
+
+    def flush(self) -> int:
+        """Write everything pending now; returns the number of statements executed"""
+        with self._flush_lock:
+            with self._cond:
+                batch = list(self._pending.values())
+                self._pending.clear()
+            if not batch:
+                return 0
+            if self._conn is None:
+                self._conn = get_connection(self.db_path)
+            try:
+                with self._conn:  # one transaction, one commit
+                    for sql, params in batch:
+                        self._conn.execute(sql, params)
+            except Exception:
+                logger.exception(f"Write-behind flush of {len(batch)} statement(s) failed")
+                return 0
+            self.rows_written += len(batch)
+            self.flushes += 1
+            return len(batch)
+
+    def close(self) -> None:
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        self.flush()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if self._stop:
+                    return
+                self._cond.wait(self.flush_interval)
+            self.flush()
+
+
+_batcher: Optional[WriteBehindBatcher] = None
+_batcher_lock = threading.Lock()
+
+
+def get_write_behind(db_path: Optional[str] = None) -> WriteBehindBatcher:
+    """Process-wide write-behind batcher"""
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = WriteBehindBatcher(db_path)
+    return _batcher
+
+
 def init_db(conn: sqlite3.Connection) -> None:
     cur = conn.cursor()
     # jobs table
@@ -38,6 +171,11 @@ def init_db(conn: sqlite3.Connection) -> None:
           fps INTEGER,
           width INTEGER,
           height INTEGER,
+          encode_profile TEXT,                       -- fast-preview|publish|archive
+          cron_spec TEXT,                            -- 5-field cron; overrides recurring_days/time
+          misfire_policy TEXT,                       -- run_once|skip|run_all (see scheduler.py)
+          next_run_at TEXT,                          -- local scheduler's next fire time; NULL if not scheduled locally
+          last_run_at TEXT,
           schedule_kind TEXT NOT NULL,               -- one_time | recurring
           schedule_dt TEXT,                          -- ISO datetime for one_time
           recurring_days TEXT,                       -- CSV of days for recurring
@@ -51,41 +189,161 @@ def init_db(conn: sqlite3.Connection) -> None:
         )
         """
     )
-    # Migration: ensure new columns exist if DB was created before they were added
-    cur.execute("PRAGMA table_info(jobs)")
-    existing_cols = {row[1] for row in cur.fetchall()}  # name is index 1
-    migrations = []
-    if 'video_length' not in existing_cols:
-        migrations.append("ALTER TABLE jobs ADD COLUMN video_length INTEGER")
-    if 'fps' not in existing_cols:
-        migrations.append("ALTER TABLE jobs ADD COLUMN fps INTEGER")
-    if 'width' not in existing_cols:
-        migrations.append("ALTER TABLE jobs ADD COLUMN width INTEGER")
-    if 'height' not in existing_cols:
-        migrations.append("ALTER TABLE jobs ADD COLUMN height INTEGER")
-    for sql in migrations:
-        try:
-            cur.execute(sql)
-        except Exception:
-            pass
     # job_runs table
     cur.execute(
         """
         CREATE TABLE IF NOT EXISTS job_runs (
           id INTEGER PRIMARY KEY AUTOINCREMENT,
           job_id INTEGER NOT NULL,
-          started_at TEXT NOT NULL,
+          started_at TEXT NOT NULL,                  -- enqueue time until a worker claims the run
           finished_at TEXT,
-          status TEXT NOT NULL,                      -- running|completed|failed
+          status TEXT NOT NULL,                      -- queued|running|completed|failed|cancelled
           output_path TEXT,
           log_path TEXT,
           host_exit_code INTEGER,
           error_message TEXT,
+          priority INTEGER NOT NULL DEFAULT 0,       -- higher runs first
+          attempts INTEGER NOT NULL DEFAULT 0,
+          lease_owner TEXT,                          -- worker id holding the run
+          lease_expires_at TEXT,                     -- ISO datetime; expired leases are requeued
+          heartbeat_at TEXT,
           FOREIGN KEY(job_id) REFERENCES jobs(id)
         )
         """
     )
     conn.commit()
+    migrate(conn)
+
+
+# Columns added to jobs/job_runs after their first release. Fresh databases get
+# them from CREATE TABLE; migration 1 adds whichever an older database lacks.
+_JOBS_ADDED_COLUMNS = [
+    ('video_length', 'INTEGER'),
+    ('fps', 'INTEGER'),
+    ('width', 'INTEGER'),
+    ('height', 'INTEGER'),
+    ('encode_profile', 'TEXT'),
+    ('cron_spec', 'TEXT'),
+    ('misfire_policy', 'TEXT'),
+    ('next_run_at', 'TEXT'),
+    ('last_run_at', 'TEXT'),
+]
+_JOB_RUNS_ADDED_COLUMNS = [
+    ('priority', 'INTEGER NOT NULL DEFAULT 0'),
+    ('attempts', 'INTEGER NOT NULL DEFAULT 0'),
+    ('lease_owner', 'TEXT'),
+    ('lease_expires_at', 'TEXT'),
+    ('heartbeat_at', 'TEXT'),
+]
+
+
+def _add_missing_columns(cur: sqlite3.Cursor, table: str, columns: List[Tuple[str, str]]) -> None:
+    cur.execute(f"PRAGMA table_info({table})")
+    existing_cols = {row[1] for row in cur.fetchall()}  # name is index 1
+    for name, decl in columns:
+        if name not in existing_cols:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+
+def _migration_1_columns(cur: sqlite3.Cursor) -> None:
+    """Catch up databases created before versioned migrations"""
+    _add_missing_columns(cur, 'jobs', _JOBS_ADDED_COLUMNS)
+    _add_missing_columns(cur, 'job_runs', _JOB_RUNS_ADDED_COLUMNS)
+
+
+def _migration_2_indexes(cur: sqlite3.Cursor) -> None:
+    """Indexes matching the dashboard, history, queue and scheduler queries"""
+    # list_jobs / list_jobs_page, optionally filtered by status
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs(created_at DESC, id DESC)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs(status, created_at DESC, id DESC)")
+    # Scheduler startup
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_jobs_next_run ON jobs(next_run_at) WHERE next_run_at IS NOT NULL")
+    # list_runs_for_job / list_runs_page
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_job_runs_job_started ON job_runs(job_id, started_at DESC, id DESC)")
+    # Queue claims and the lease reaper
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_job_runs_queue ON job_runs(status, priority DESC, id)")
+    # Archival scans
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_job_runs_finished ON job_runs(finished_at) WHERE finished_at IS NOT NULL")
+
+
+def _migration_3_run_rollups(cur: sqlite3.Cursor) -> None:
+    """Daily per-job summaries that archived runs are folded into"""
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS job_run_daily_summary (
+          job_id INTEGER NOT NULL,
+          day TEXT NOT NULL,                         -- YYYY-MM-DD (UTC) of started_at
+          status TEXT NOT NULL,
+          runs INTEGER NOT NULL,
+          total_seconds REAL NOT NULL,
+          max_seconds REAL NOT NULL,
+          first_started_at TEXT NOT NULL,
+          last_finished_at TEXT,
+          PRIMARY KEY (job_id, day, status)
+        ) WITHOUT ROWID
+        """
+    )
+
+
+def _migration_4_run_progress(cur: sqlite3.Cursor) -> None:
+    """Live progress of a running generation, sampled from the WebUI"""
+    _add_missing_columns(cur, 'job_runs', [
+        ('progress_stage', 'TEXT'),
+        ('progress_fraction', 'REAL'),                 # 0-1 within the current SD request
+        ('progress_step', 'INTEGER'),
+        ('progress_steps', 'INTEGER'),
+        ('progress_eta_sec', 'REAL'),
+        ('progress_preview_path', 'TEXT'),
+        ('progress_updated_at', 'TEXT'),
+        ('stalled_since', 'TEXT'),                     # set while the WebUI step counter isn't moving
+        ('upscale_latency', 'TEXT'),                   # JSON histogram of per-frame upscale requests
+    ])
+
+
+def _migration_5_run_resume(cur: sqlite3.Cursor) -> None:
+    """Where each run's files live, so a failed run can be resumed from its checkpoints"""
+    _add_missing_columns(cur, 'job_runs', [
+        ('workspace_path', 'TEXT'),                    # generator workspace holding the run manifest
+        ('resume_of', 'INTEGER'),                      # failed run whose workspace this run continues
+        ('checkpoint', 'TEXT'),                        # JSON summary of the run manifest
+    ])
+
+
+# Index + 1 is the schema version (PRAGMA user_version) each migration brings the DB to.
+# Append only; never edit a migration that has shipped.
+MIGRATIONS = [
+    _migration_1_columns,
+    _migration_2_indexes,
+    _migration_3_run_rollups,
+    _migration_4_run_progress,
+    _migration_5_run_resume,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Apply pending migrations, each in its own transaction; returns the resulting version"""
+    cur = conn.cursor()
+    for version, migration in enumerate(MIGRATIONS, start=1):
+        if schema_version(conn) >= version:
+            continue
+        conn.commit()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have migrated while we waited for the write lock
+            if schema_version(conn) < version:
+                migration(cur)
+                cur.execute(f"PRAGMA user_version = {version}")
+                logger.info(f"Migrated database to schema version {version} ({migration.__name__})")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return schema_version(conn)
 
 
 def _now_iso() -> str:
@@ -109,6 +367,9 @@ def create_job(
     fps: Optional[int] = None,
     width: Optional[int] = None,
     height: Optional[int] = None,
+    encode_profile: Optional[str] = None,
+    cron_spec: Optional[str] = None,
+    misfire_policy: Optional[str] = None,
 ) -> int:
     cur = conn.cursor()
     ts = _now_iso()
@@ -116,15 +377,15 @@ def create_job(
         """
         INSERT INTO jobs (
           task_name, type, prompt, character, environment,
-          video_length, fps, width, height,
-          schedule_kind, schedule_dt, recurring_days, recurring_time,
+          video_length, fps, width, height, encode_profile,
+          schedule_kind, schedule_dt, recurring_days, recurring_time, cron_spec, misfire_policy,
           status, created_at, updated_at
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """,
         (
             task_name, type, prompt, character, environment,
-            video_length, fps, width, height,
-            schedule_kind, schedule_dt, recurring_days, recurring_time,
+            video_length, fps, width, height, encode_profile,
+            schedule_kind, schedule_dt, recurring_days, recurring_time, cron_spec, misfire_policy,
             status, ts, ts,
         ),
     )
@@ -192,7 +453,107 @@ def get_job_by_task_name(conn: sqlite3.Connection, task_name: str) -> Optional[s
 
 def list_jobs(conn: sqlite3.Connection, limit: int = 100) -> List[sqlite3.Row]:
     cur = conn.cursor()
-    cur.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))
+    cur.execute("SELECT * FROM jobs ORDER BY created_at DESC, id DESC LIMIT ?", (limit,))
+    return cur.fetchall()
+
+
+# --- Keyset pagination ---
+# Cursors are the (sort key, id) of the last row on a page, opaque to clients.
+# Each page is an index range scan, so deep pages cost the same as the first.
+
+def encode_cursor(*values: Any) -> str:
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """Raises ValueError for a malformed cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {cursor!r}") from e
+    if not isinstance(values, list) or len(values) != 2:
+        raise ValueError(f"invalid cursor: {cursor!r}")
+    return values
+
+
+def list_jobs_page(
+    conn: sqlite3.Connection,
+    *,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+) -> Tuple[List[sqlite3.Row], Optional[str]]:
+    """Newest jobs first; returns (rows, next_cursor) with next_cursor None on the last page"""
+    where, params = [], []
+    if status:
+        where.append("status = ?")
+        params.append(status)
+    if cursor:
+        where.append("(created_at, id) < (?, ?)")
+        params.extend(decode_cursor(cursor))
+    sql = "SELECT * FROM jobs"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+    # One extra row tells us whether another page exists
+    rows = conn.execute(sql, (*params, limit + 1)).fetchall()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+
+
+_JOBS_WITH_LAST_RUN = """
+    SELECT j.*, r.id AS run_id, r.status AS run_status, r.output_path AS run_output_path,
+           r.error_message AS run_error_message, r.host_exit_code AS run_host_exit_code,
+           r.started_at AS run_started_at, r.finished_at AS run_finished_at
+    FROM jobs j
+    LEFT JOIN job_runs r ON r.id = (
+      SELECT id FROM job_runs WHERE job_id = j.id ORDER BY started_at DESC, id DESC LIMIT 1
+    )
+"""
+
+
+def list_jobs_with_last_run(conn: sqlite3.Connection, limit: int = 100) -> List[sqlite3.Row]:
+    """Newest jobs joined with their most recent run (run_* columns are NULL if never run)"""
+    cur = conn.cursor()
+    cur.execute(_JOBS_WITH_LAST_RUN + " ORDER BY j.created_at DESC, j.id DESC LIMIT ?", (limit,))
+    return cur.fetchall()
+
+
+def get_job_with_last_run(conn: sqlite3.Connection, task_name: str) -> Optional[sqlite3.Row]:
+    cur = conn.cursor()
+    cur.execute(_JOBS_WITH_LAST_RUN + " WHERE j.task_name = ?", (task_name,))
+    return cur.fetchone()
+
+
+def set_job_next_run(
+    conn: sqlite3.Connection,
+    job_id: int,
+    next_run_at: Optional[str],
+    *,
+    last_run_at: Optional[str] = None,
+) -> None:
+    cur = conn.cursor()
+    if last_run_at is not None:
+        cur.execute(
+            "UPDATE jobs SET next_run_at = ?, last_run_at = ?, updated_at = ? WHERE id = ?",
+            (next_run_at, last_run_at, _now_iso(), job_id),
+        )
+    else:
+        cur.execute(
+            "UPDATE jobs SET next_run_at = ?, updated_at = ? WHERE id = ?",
+            (next_run_at, _now_iso(), job_id),
+        )
+    conn.commit()
+
+
+def list_scheduled_jobs(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+    """Jobs owned by the local scheduler"""
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM jobs WHERE next_run_at IS NOT NULL AND status != 'cancelled'")
     return cur.fetchall()
 
 
@@ -236,7 +597,8 @@ def complete_job_run(
     cur.execute(
         """
         UPDATE job_runs
-        SET finished_at = ?, status = ?, output_path = ?, host_exit_code = ?, error_message = ?
+        SET finished_at = ?, status = ?, output_path = ?, host_exit_code = ?, error_message = ?,
+            lease_owner = NULL, lease_expires_at = NULL
         WHERE id = ?
         """,
         (_now_iso(), status, output_path, host_exit_code, error_message, run_id),
@@ -244,10 +606,264 @@ def complete_job_run(
     conn.commit()
 
 
+def get_job_run(conn: sqlite3.Connection, run_id: int) -> Optional[sqlite3.Row]:
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM job_runs WHERE id = ?", (run_id,))
+    return cur.fetchone()
+
+
+def has_active_resume(conn: sqlite3.Connection, run_id: int, workspace_path: Optional[str] = None) -> bool:
+    """True if a queued or running run resumes run_id, or works in workspace_path.
+
+    A run resuming another run in the same workspace counts too, so a chain
+    of resumes can't end up with two runs writing the same files.
+    """
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT 1 FROM job_runs
+        WHERE status IN ('queued', 'running')
+          AND (resume_of = ?
+               OR (? IS NOT NULL AND workspace_path = ?)
+               OR resume_of IN (SELECT id FROM job_runs WHERE ? IS NOT NULL AND workspace_path = ?))
+        LIMIT 1
+        """,
+        (run_id, workspace_path, workspace_path, workspace_path, workspace_path),
+    )
+    return cur.fetchone() is not None
+
+
+def set_job_run_workspace(conn: sqlite3.Connection, *, run_id: int, workspace_path: str) -> None:
+    cur = conn.cursor()
+    cur.execute("UPDATE job_runs SET workspace_path = ? WHERE id = ?", (workspace_path, run_id))
+    conn.commit()
+
+
+def list_run_workspaces(conn: sqlite3.Connection) -> List[str]:
+    """Workspace paths some job_runs row still points at"""
+    cur = conn.cursor()
+    cur.execute("SELECT DISTINCT workspace_path FROM job_runs WHERE workspace_path IS NOT NULL")
+    return [row['workspace_path'] for row in cur.fetchall()]
+
+
 def list_runs_for_job(conn: sqlite3.Connection, job_id: int, limit: int = 20) -> List[sqlite3.Row]:
     cur = conn.cursor()
     cur.execute(
-        "SELECT * FROM job_runs WHERE job_id = ? ORDER BY started_at DESC LIMIT ?",
+        "SELECT * FROM job_runs WHERE job_id = ? ORDER BY started_at DESC, id DESC LIMIT ?",
         (job_id, limit),
     )
     return cur.fetchall()
+
+
+def list_runs_page(
+    conn: sqlite3.Connection,
+    job_id: int,
+    *,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+) -> Tuple[List[sqlite3.Row], Optional[str]]:
+    """Newest runs of job_id first; returns (rows, next_cursor)"""
+    sql = "SELECT * FROM job_runs WHERE job_id = ?"
+    params: List[Any] = [job_id]
+    if cursor:
+        sql += " AND (started_at, id) < (?, ?)"
+        params.extend(decode_cursor(cursor))
+    sql += " ORDER BY started_at DESC, id DESC LIMIT ?"
+    rows = conn.execute(sql, (*params, limit + 1)).fetchall()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1]['started_at'], rows[-1]['id'])
+
+
+# --- Archival ---
+
+_ARCHIVABLE_RUNS = """
+    SELECT id FROM job_runs
+    WHERE finished_at IS NOT NULL AND finished_at < ?
+      AND status IN ('completed', 'failed', 'cancelled')
+    ORDER BY finished_at, id
+    LIMIT ?
+"""
+
+
+def archive_job_runs(conn: sqlite3.Connection, *, older_than_days: float, batch_size: int = 1000) -> int:
+    """Fold finished runs older than the cutoff into job_run_daily_summary and delete them.
+
+    Works in batches, each its own transaction, so the queue and request
+    handlers only ever wait for one batch. Returns the number of runs archived.
+    """
+    cutoff = (datetime.utcnow() - timedelta(days=older_than_days)).isoformat()
+    archived = 0
+    cur = conn.cursor()
+    while True:
+        conn.commit()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            cur.execute(
+                f"""
+                INSERT INTO job_run_daily_summary
+                  (job_id, day, status, runs, total_seconds, max_seconds, first_started_at, last_finished_at)
+                SELECT job_id, substr(started_at, 1, 10), status, COUNT(*),
+                       SUM(secs), MAX(secs), MIN(started_at), MAX(finished_at)
+                FROM (
+                  SELECT job_id, started_at, finished_at, status,
+                         MAX(0.0, ROUND((julianday(finished_at) - julianday(started_at)) * 86400.0, 3)) AS secs
+                  FROM job_runs WHERE id IN ({_ARCHIVABLE_RUNS})
+                )
+                GROUP BY job_id, substr(started_at, 1, 10), status
+                ON CONFLICT(job_id, day, status) DO UPDATE SET
+                  runs = runs + excluded.runs,
+                  total_seconds = total_seconds + excluded.total_seconds,
+                  max_seconds = MAX(max_seconds, excluded.max_seconds),
+                  first_started_at = MIN(first_started_at, excluded.first_started_at),
+                  last_finished_at = MAX(last_finished_at, excluded.last_finished_at)
+                """,
+                (cutoff, batch_size),
+            )
+            cur.execute(f"DELETE FROM job_runs WHERE id IN ({_ARCHIVABLE_RUNS})", (cutoff, batch_size))
+            deleted = cur.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        archived += deleted
+        if deleted < batch_size:
+            break
+    if archived:
+        logger.info(f"Archived {archived} job run(s) finished before {cutoff}")
+    return archived
+
+
+def list_run_summaries(conn: sqlite3.Connection, job_id: int, limit: int = 90) -> List[sqlite3.Row]:
+    """Daily rollups of archived runs for job_id, newest day first"""
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT * FROM job_run_daily_summary WHERE job_id = ? ORDER BY day DESC, status LIMIT ?",
+        (job_id, limit),
+    )
+    return cur.fetchall()
+
+
+# --- Queue operations (see job_queue.py) ---
+
+def enqueue_job_run(conn: sqlite3.Connection, *, job_id: int, priority: int = 0,
+                    resume_of: Optional[int] = None) -> int:
+    cur = conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO job_runs (job_id, started_at, status, priority, resume_of)
+        VALUES (?, ?, 'queued', ?, ?)
+        """,
+        (job_id, _now_iso(), priority, resume_of),
+    )
+    conn.commit()
+    return int(cur.lastrowid)
+
+
+def claim_next_job_run(conn: sqlite3.Connection, *, worker_id: str, lease_seconds: float) -> Optional[sqlite3.Row]:
+    """Atomically move the highest-priority queued run to running under a lease held by worker_id"""
+    now = datetime.utcnow()
+    cur = conn.cursor()
+    conn.commit()
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        cur.execute(
+            "SELECT id FROM job_runs WHERE status = 'queued' ORDER BY priority DESC, id LIMIT 1"
+        )
+        row = cur.fetchone()
+        if row is None:
+            conn.commit()
+            return None
+        cur.execute(
+            """
+            UPDATE job_runs
+            SET status = 'running', started_at = ?, attempts = attempts + 1,
+                lease_owner = ?, lease_expires_at = ?, heartbeat_at = ?
+            WHERE id = ?
+            """,
+            (now.isoformat(), worker_id, (now + timedelta(seconds=lease_seconds)).isoformat(),
+             now.isoformat(), row['id']),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    cur.execute("SELECT * FROM job_runs WHERE id = ?", (row['id'],))
+    return cur.fetchone()
+
+
+def heartbeat_job_run(conn: sqlite3.Connection, *, run_id: int, worker_id: str, lease_seconds: float) -> bool:
+    """Extend a lease; returns False if the run is no longer held by worker_id"""
+    now = datetime.utcnow()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        UPDATE job_runs SET heartbeat_at = ?, lease_expires_at = ?
+        WHERE id = ? AND lease_owner = ? AND status = 'running'
+        """,
+        (now.isoformat(), (now + timedelta(seconds=lease_seconds)).isoformat(), run_id, worker_id),
+    )
+    conn.commit()
+    return cur.rowcount > 0
+
+
+def requeue_expired_job_runs(conn: sqlite3.Connection, *, max_attempts: int) -> Tuple[int, int]:
+    """Requeue running runs whose lease lapsed (their worker died); fail those out of attempts.
+
+    Returns (requeued, failed).
+    """
+    now = _now_iso()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        UPDATE job_runs SET status = 'failed', finished_at = ?, lease_owner = NULL,
+               error_message = 'lease expired after ' || attempts || ' attempt(s)'
+        WHERE status = 'running' AND lease_expires_at IS NOT NULL AND lease_expires_at < ?
+          AND attempts >= ?
+        """,
+        (now, now, max_attempts),
+    )
+    failed = cur.rowcount
+    cur.execute(
+        """
+        UPDATE job_runs SET status = 'queued', lease_owner = NULL, lease_expires_at = NULL
+        WHERE status = 'running' AND lease_expires_at IS NOT NULL AND lease_expires_at < ?
+        """,
+        (now,),
+    )
+    requeued = cur.rowcount
+    conn.commit()
+    return requeued, failed
+
+
+def cancel_queued_job_runs(conn: sqlite3.Connection, job_id: int) -> int:
+    cur = conn.cursor()
+    cur.execute(
+        "UPDATE job_runs SET status = 'cancelled', finished_at = ? WHERE job_id = ? AND status = 'queued'",
+        (_now_iso(), job_id),
+    )
+    conn.commit()
+    return cur.rowcount
+
+
+def list_stalled_job_runs(conn: sqlite3.Connection, *, silent_sec: float) -> List[sqlite3.Row]:
+    """Running runs whose WebUI progress is stalled or hasn't been reported for silent_sec"""
+    cutoff = (datetime.utcnow() - timedelta(seconds=silent_sec)).isoformat()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT id, job_id, progress_stage, progress_step, progress_steps, progress_updated_at, stalled_since
+        FROM job_runs
+        WHERE status = 'running'
+          AND (stalled_since IS NOT NULL OR progress_updated_at < ?)
+        """,
+        (cutoff,),
+    )
+    return cur.fetchall()
+
+
+def count_job_runs_by_status(conn: sqlite3.Connection) -> Dict[str, int]:
+    cur = conn.cursor()
+    cur.execute("SELECT status, COUNT(*) AS n FROM job_runs GROUP BY status")
+    return {row['status']: row['n'] for row in cur.fetchall()}
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+In-process event bus behind the /events server-sent events stream.
+
+Job state transitions and generator progress are published here and fanned
+out to one bounded queue per connected browser. A short history lets a
+client that reconnects with Last-Event-ID catch up, and the latest progress
+of every active run is kept so a freshly opened dashboard starts populated.
+A client too slow to drain its queue loses events rather than stalling the
+publisher; it re-syncs from /tasks on its next reconnect.
+"""
+import itertools
+import json
+import logging
+import queue
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (id, event type, data)
+Event = Tuple[int, str, Dict[str, Any]]
+
+
+class EventBus:
+    def __init__(self, history: int = 500, subscriber_queue_size: int = 1000):
+        self.subscriber_queue_size = subscriber_queue_size
+        self._ids = itertools.count(1)
+        self._history: deque = deque(maxlen=history)
+        self._progress: Dict[int, Event] = {}  # run_id -> latest progress event
+        self._subscribers: List[queue.Queue] = []
+        self._lock = threading.Lock()
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> int:
+        with self._lock:
+            event = (next(self._ids), event_type, data)
+            self._history.append(event)
+            run_id = data.get('run_id')
+            if run_id is not None:
+                if event_type == 'progress':
+                    self._progress[run_id] = event
+                elif event_type == 'job' and data.get('status') in ('completed', 'failed', 'cancelled'):
+                    self._progress.pop(run_id, None)
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                pass
+        return event[0]
+
+    @contextmanager
+    def subscribe(self, last_event_id: Optional[int] = None) -> Iterator[queue.Queue]:
+        """Queue of events published from now on, preceded by whatever the client missed"""
+        q: queue.Queue = queue.Queue(maxsize=self.subscriber_queue_size)
+        with self._lock:
+            if last_event_id is not None and self._history and self._history[0][0] <= last_event_id + 1:
+                backlog = [e for e in self._history if e[0] > last_event_id]
+            else:
+                backlog = sorted(self._progress.values())
+            for event in backlog[-self.subscriber_queue_size:]:
+                q.put_nowait(event)
+            self._subscribers.append(q)
+        try:
+            yield q
+        finally:
+            with self._lock:
+                self._subscribers.remove(q)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+
+def format_sse(event: Event) -> str:
+    event_id, event_type, data = event
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def stream(bus: EventBus, last_event_id: Optional[int] = None, keepalive_sec: float = 15) -> Iterator[str]:
+    """SSE body for one client; comment lines keep proxies from closing an idle stream"""
+    with bus.subscribe(last_event_id) as q:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                event = q.get(timeout=keepalive_sec)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            yield format_sse(event)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Windows host service (scripts/win/host_service.ps1).
+
+Accepts the same request bodies HostSchedulerClient sends (JobSpec.to_dict),
+validates them, and keeps "registered" tasks in memory instead of creating
+Windows scheduled tasks. Useful for exercising scheduling, the bulk endpoints
+and request coalescing without a Windows box.
+
+Endpoints: GET /health, POST /schedule, /run-now, /delete, /schedule-batch,
+/delete-batch, plus GET /tasks and GET /stats for inspection.
+
+Usage:
+    python fake_host_service.py [--port 7070] [--latency 0.2] [--no-bulk]
+    HOST_SERVICE_URL=http://localhost:7070 python app.py
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+TIME_RE = re.compile(r'^([01]\d|2[0-3]):[0-5]\d$')
+DAYS = {'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'}
+
+
+class FakeHostService:
+    def __init__(self, latency: float = 0.0, bulk: bool = True):
+        self.latency = latency  # per request, like a round trip to the Windows host
+        self.bulk = bulk
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+        self.requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def validate(self, spec: Dict[str, Any], scheduled: bool) -> None:
+        if not isinstance(spec, dict) or not spec.get('TaskName'):
+            raise ValueError('TaskName is required')
+        steps = spec.get('Steps')
+        if not isinstance(steps, list) or not steps:
+            raise ValueError('Steps must be a non-empty list')
+        for step in steps:
+            if not step.get('name'):
+                raise ValueError('every step needs a name')
+            if step.get('type') == 'http' and not (step.get('http') or {}).get('url'):
+                raise ValueError(f"http step {step['name']} has no url")
+        if scheduled:
+            if not TIME_RE.match(str(spec.get('Time') or '')):
+                raise ValueError(f"Time must be HH:mm, got {spec.get('Time')!r}")
+            unknown = [d for d in spec.get('Days') or [] if d not in DAYS]
+            if unknown:
+                raise ValueError(f"unknown days {unknown}")
+
+    def schedule(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            self.validate(spec, scheduled=True)
+        except ValueError as e:
+            return {'TaskName': spec.get('TaskName') if isinstance(spec, dict) else None, 'status': 'error', 'error': str(e)}
+        script = f"C:\\sentimation\\jobs\\{spec['TaskName']}.ps1"
+        with self._lock:
+            self.tasks[spec['TaskName']] = {**spec, 'script': script}
+        return {'TaskName': spec['TaskName'], 'status': 'ok', 'script': script}
+
+    def delete(self, task_name: str) -> Dict[str, Any]:
+        with self._lock:
+            self.tasks.pop(task_name, None)
+        return {'TaskName': task_name, 'status': 'ok'}
+
+    def run_now(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        self.validate(spec, scheduled=False)
+        return {'status': 'ok', 'log': f"C:\\sentimation\\logs\\{spec['TaskName']}.log", 'exitCode': 0}
+
+    def count(self, path: str) -> None:
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+
+def make_handler(service: FakeHostService):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, payload: Any) -> None:
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._send(200, {'status': 'ok'})
+            elif self.path == '/tasks':
+                with service._lock:
+                    self._send(200, {'tasks': list(service.tasks.values())})
+            elif self.path == '/stats':
+                with service._lock:
+                    self._send(200, {'requests': dict(service.requests), 'tasks': len(service.tasks)})
+            else:
+                self._send(404, {'status': 'error', 'error': 'not found'})
+
+        def do_POST(self):
+            service.count(self.path)
+            if service.latency:
+                time.sleep(service.latency)
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            except ValueError:
+                self._send(400, {'status': 'error', 'error': 'invalid JSON'})
+                return
+            try:
+                if self.path == '/schedule':
+                    result = service.schedule(payload)
+                    self._send(200 if result['status'] == 'ok' else 500, result)
+                elif self.path == '/run-now':
+                    self._send(200, service.run_now(payload))
+                elif self.path == '/delete':
+                    self._send(200, service.delete(str(payload.get('TaskName'))))
+                elif self.path == '/schedule-batch' and service.bulk:
+                    results: List[Dict[str, Any]] = [service.schedule(spec) for spec in payload.get('Jobs') or []]
+                    self._send(200, {'status': 'ok', 'results': results})
+                elif self.path == '/delete-batch' and service.bulk:
+                    results = [service.delete(str(name)) for name in payload.get('TaskNames') or []]
+                    self._send(200, {'status': 'ok', 'results': results})
+                else:
+                    self._send(404, {'status': 'error', 'error': 'not found'})
+            except ValueError as e:
+                self._send(500, {'status': 'error', 'error': str(e)})
+
+    return Handler
+
+
+def serve(port: int, service: FakeHostService, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Start a fake host service in a daemon thread and return its server"""
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake SentiMation host service for local testing')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7070)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every POST')
+    parser.add_argument('--no-bulk', action='store_true', help='answer the batch endpoints with 404, like an old host service')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(FakeHostService(args.latency, not args.no_bulk)))
+    print(f"Fake host service on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
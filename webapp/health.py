@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Background health probes for the host service and the SD WebUI(s).
+
+One asyncio loop on a daemon thread probes every target concurrently over
+plain asyncio streams, so a slow or unreachable host never holds up the
+others. A target that stays healthy is probed less and less often (the
+interval doubles up to max_interval); any failure or state change drops it
+back to the base interval so recovery is noticed quickly. Request handlers
+only ever read the cached state; nothing on the request path waits on I/O.
+"""
+import asyncio
+import logging
+import ssl
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+class Target:
+    """One probed endpoint and its cached state"""
+
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.url = url
+        self.healthy: Optional[bool] = None  # None until the first probe finishes
+        self.checked_at: Optional[float] = None
+        self.changed_at: Optional[float] = None
+        self.latency_ms: Optional[float] = None
+        self.error: Optional[str] = None
+        self.failures = 0  # consecutive
+        self.interval = 0.0
+        self.wakeup: Optional[asyncio.Event] = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'url': self.url,
+            'healthy': bool(self.healthy),
+            'checked_at': self.checked_at,
+            'latency_ms': self.latency_ms,
+            'error': self.error,
+            'failures': self.failures,
+            'next_probe_sec': round(self.interval, 1),
+        }
+
+
+async def http_status(url: str, timeout: float) -> int:
+    """Status code of a GET to url, reading only the status line"""
+    parts = urlsplit(url)
+    secure = parts.scheme == 'https'
+    port = parts.port or (443 if secure else 80)
+    path = parts.path or '/'
+    if parts.query:
+        path = f"{path}?{parts.query}"
+
+    async def _get() -> int:
+        reader, writer = await asyncio.open_connection(parts.hostname, port,
+                                                       ssl=ssl.create_default_context() if secure else None)
+        try:
+            writer.write((f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+                          f"User-Agent: sentimation-health\r\nConnection: close\r\n\r\n").encode('latin-1'))
+            await writer.drain()
+            status_line = await reader.readline()
+        finally:
+            writer.close()
+        fields = status_line.decode('latin-1').split()
+        if len(fields) < 2 or not fields[0].startswith('HTTP/'):
+            raise ConnectionError(f"malformed status line {status_line[:80]!r}")
+        return int(fields[1])
+
+    return await asyncio.wait_for(_get(), timeout)
+
+
+class HealthMonitor:
+    def __init__(self, interval: float = 15, max_interval: float = 120, timeout: float = 3,
+                 on_change: Optional[Callable[[str, bool], None]] = None):
+        self.interval = interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self.on_change = on_change
+        self._targets: Dict[str, Target] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def add(self, name: str, url: str) -> None:
+        """Register a target; must be called before start()"""
+        self._targets[name] = Target(name, url)
+
+    def start(self) -> None:
+        ready = threading.Event()
+        threading.Thread(target=self._run, args=(ready,), name='health-monitor', daemon=True).start()
+        ready.wait(5)
+
+    # --- Reads (cached, never block on I/O) ---
+
+    def is_healthy(self, name: str) -> bool:
+        with self._lock:
+            target = self._targets.get(name)
+            return bool(target and target.healthy)
+
+    def any_healthy(self, prefix: str) -> bool:
+        with self._lock:
+            return any(t.healthy for name, t in self._targets.items() if name.startswith(prefix))
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: target.snapshot() for name, target in self._targets.items()}
+
+    def names(self, prefix: str = '') -> List[str]:
+        return [name for name in self._targets if name.startswith(prefix)]
+
+    # --- Writes from request handlers ---
+
+    def report_failure(self, name: str, error: Exception) -> None:
+        """A real call to the target failed: mark it down now and re-probe right away"""
+        target = self._targets.get(name)
+        if target is None:
+            return
+        self._record(target, False, str(error), None)
+        self.refresh(name)
+
+    def refresh(self, name: str) -> None:
+        """Probe a target as soon as possible instead of waiting out its interval"""
+        target = self._targets.get(name)
+        if target is not None and self._loop is not None and target.wakeup is not None:
+            self._loop.call_soon_threadsafe(target.wakeup.set)
+
+    # --- Probing ---
+
+    def _run(self, ready: threading.Event) -> None:
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        ready.set()
+        try:
+            self._loop.run_until_complete(asyncio.gather(*(self._watch(t) for t in self._targets.values())))
+        except Exception as e:
+            logger.error(f"Health monitor stopped: {e}")
+
+    async def _watch(self, target: Target) -> None:
+        target.wakeup = asyncio.Event()
+        target.interval = self.interval
+        while True:
+            start = time.monotonic()
+            try:
+                status = await http_status(target.url, self.timeout)
+                ok, error = status == 200, (None if status == 200 else f"HTTP {status}")
+            except Exception as e:
+                ok, error = False, str(e) or type(e).__name__
+            latency_ms = round((time.monotonic() - start) * 1000, 1)
+            changed = self._record(target, ok, error, latency_ms)
+            # Back off while steadily healthy; come back to the base interval on any trouble
+            if ok and not changed:
+                target.interval = min(self.max_interval, target.interval * 2)
+            else:
+                target.interval = self.interval
+            target.wakeup.clear()
+            try:
+                await asyncio.wait_for(target.wakeup.wait(), target.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _record(self, target: Target, ok: bool, error: Optional[str], latency_ms: Optional[float]) -> bool:
+        now = time.time()
+        with self._lock:
+            changed = target.healthy is not ok
+            target.healthy = ok
+            target.checked_at = now
+            target.error = error
+            if latency_ms is not None:
+                target.latency_ms = latency_ms
+            target.failures = 0 if ok else target.failures + 1
+            if changed:
+                target.changed_at = now
+        if changed:
+            log = logger.info if ok else logger.warning
+            log(f"Health: {target.name} is {'up' if ok else 'down'}" + (f" ({error})" if error else ''))
+            if self.on_change:
+                try:
+                    self.on_change(target.name, ok)
+                except Exception as e:
+                    logger.warning(f"Health change listener failed: {e}")
+        return changed
@@ -5,11 +5,24 @@ Host Scheduler Client for communicating with the Windows host service
 import requests
 import json
 import logging
-from typing import Dict, List, Optional, Any
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Any
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Most jobs or task names sent in one /schedule-batch or /delete-batch request
+MAX_BATCH_SIZE = 200
+
+
+class HostServiceHTTPError(RuntimeError):
+    """Non-2xx response from the host service"""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
 class JobStep:
     """Represents a single step in a job"""
     def __init__(self, name: str, docker_args: Optional[str] = None, timeout_sec: int = 3600, retries: int = 0, step_type: str = 'docker', http: Optional[Dict[str, Any]] = None):
@@ -56,21 +69,78 @@ class JobSpec:
             result['Days'] = self.days
         return result
 
+class RequestCoalescer:
+    """Merges calls made within `window` seconds of each other into one bulk request.
+
+    Callers block on submit() until their batch has been sent; send_batch takes
+    the list of items and returns one result per item, in order.
+    """
+
+    def __init__(self, send_batch: Callable[[List[Any]], List[Dict[str, Any]]], window: float,
+                 max_batch: int = MAX_BATCH_SIZE):
+        self.send_batch = send_batch
+        self.window = window
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._pending: List[tuple] = []
+        self._timer: Optional[threading.Timer] = None
+
+    def submit(self, item: Any) -> Dict[str, Any]:
+        future: Future = Future()
+        with self._lock:
+            self._pending.append((item, future))
+            if len(self._pending) >= self.max_batch:
+                self._flush_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return future.result()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            # Send outside the lock so new calls start the next batch meanwhile
+            threading.Thread(target=self._send, args=(batch,), name="host-coalescer", daemon=True).start()
+
+    def _send(self, batch: List[tuple]) -> None:
+        try:
+            results = self.send_batch([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+
 class HostSchedulerClient:
     """Client for communicating with the Windows host service"""
     
-    def __init__(self, base_url: str = "http://host.docker.internal:7070"):
+    def __init__(self, base_url: str = "http://host.docker.internal:7070", coalesce_window: float = 0):
         self.base_url = base_url
         self.session = requests.Session()
         self.session.timeout = 30  # 30 second timeout
+        # Host services predating the bulk endpoints answer them with 404; remember and go one by one
+        self.bulk_supported = True
+        # With a window, concurrent schedule_job/delete_task calls share one bulk request
+        self._schedule_coalescer = RequestCoalescer(self.schedule_jobs, coalesce_window) if coalesce_window > 0 else None
+        self._delete_coalescer = RequestCoalescer(self.delete_tasks, coalesce_window) if coalesce_window > 0 else None
     
-    def _make_request(self, endpoint: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    def _make_request(self, endpoint: str, data: Dict[str, Any], timeout: float = 30) -> Dict[str, Any]:
         """Make a request to the host service"""
         url = f"{self.base_url}{endpoint}"
         
         try:
             logger.info(f"Making request to {url}")
-            response = self.session.post(url, json=data, timeout=30)
+            response = self.session.post(url, json=data, timeout=timeout)
             response.raise_for_status()
             
             result = response.json()
@@ -83,14 +153,14 @@ class HostSchedulerClient:
             raise ConnectionError(error_msg)
             
         except requests.exceptions.Timeout:
-            error_msg = f"Request to host service timed out after 30 seconds"
+            error_msg = f"Request to host service timed out after {timeout} seconds"
             logger.error(error_msg)
             raise TimeoutError(error_msg)
             
         except requests.exceptions.HTTPError as e:
             error_msg = f"Host service returned HTTP error {e.response.status_code}: {e.response.text}"
             logger.error(error_msg)
-            raise RuntimeError(error_msg)
+            raise HostServiceHTTPError(error_msg, e.response.status_code)
             
         except json.JSONDecodeError as e:
             error_msg = f"Failed to parse response from host service: {e}"
@@ -105,6 +175,14 @@ class HostSchedulerClient:
     def schedule_job(self, job: JobSpec) -> Dict[str, Any]:
         if not job.time:
             raise ValueError("Job must have a time specified for scheduling")
+        if self._schedule_coalescer is not None:
+            result = self._schedule_coalescer.submit(job)
+            if result.get('status') != 'ok':
+                raise RuntimeError(f"Host service failed to schedule job: {result}")
+            return result
+        return self._schedule_one(job)
+
+    def _schedule_one(self, job: JobSpec) -> Dict[str, Any]:
         data = job.to_dict()
         logger.info(f"Scheduling job: {job.task_name} at {job.time}")
         result = self._make_request("/schedule", data)
@@ -128,6 +206,14 @@ class HostSchedulerClient:
             return False
 
     def delete_task(self, task_name: str) -> Dict[str, Any]:
+        if self._delete_coalescer is not None:
+            result = self._delete_coalescer.submit(task_name)
+            if result.get('status') != 'ok':
+                raise RuntimeError(f"Host service failed to delete task: {result}")
+            return result
+        return self._delete_one(task_name)
+
+    def _delete_one(self, task_name: str) -> Dict[str, Any]:
         data = { 'TaskName': task_name }
         logger.info(f"Deleting task in host scheduler: {task_name}")
         result = self._make_request("/delete", data)
@@ -135,6 +221,62 @@ class HostSchedulerClient:
             raise RuntimeError(f"Host service failed to delete task: {result}")
         return result
 
+    # --- Bulk ---
+
+    def _bulk(self, endpoint: str, key: str, items: List[Any], encode: Callable[[Any], Any],
+              send_one: Callable[[Any], Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """One request per MAX_BATCH_SIZE items; one result dict (status ok/error) per item, in order"""
+        results: List[Dict[str, Any]] = []
+        for start in range(0, len(items), MAX_BATCH_SIZE):
+            chunk = items[start:start + MAX_BATCH_SIZE]
+            if self.bulk_supported:
+                try:
+                    # Each item may register a scheduled task; allow more time for big chunks
+                    response = self._make_request(endpoint, {key: [encode(item) for item in chunk]},
+                                                  timeout=30 + len(chunk))
+                    chunk_results = response.get('results') or []
+                    if len(chunk_results) != len(chunk):
+                        raise RuntimeError(f"Host service returned {len(chunk_results)} result(s) for {len(chunk)} item(s)")
+                    results.extend(chunk_results)
+                    continue
+                except HostServiceHTTPError as e:
+                    if e.status_code not in (404, 405):
+                        raise
+                    logger.warning(f"Host service has no {endpoint}; falling back to one request per item")
+                    self.bulk_supported = False
+            for item in chunk:
+                try:
+                    results.append(send_one(item))
+                except (ConnectionError, TimeoutError):
+                    raise
+                except Exception as e:
+                    results.append({'status': 'error', 'error': str(e)})
+        return results
+
+    def schedule_jobs(self, jobs: List[JobSpec]) -> List[Dict[str, Any]]:
+        """Schedule many jobs in one /schedule-batch round trip.
+
+        Returns one result per job, in order: {'TaskName', 'status': 'ok', 'script'}
+        or {'TaskName', 'status': 'error', 'error'}. A job the host rejects does not
+        fail the others; an unreachable host raises ConnectionError as usual.
+        """
+        for job in jobs:
+            if not job.time:
+                raise ValueError(f"Job {job.task_name} must have a time specified for scheduling")
+        logger.info(f"Scheduling {len(jobs)} job(s) in bulk")
+        results = self._bulk("/schedule-batch", 'Jobs', jobs, JobSpec.to_dict, self._schedule_one)
+        for job, result in zip(jobs, results):
+            result.setdefault('TaskName', job.task_name)
+        return results
+
+    def delete_tasks(self, task_names: List[str]) -> List[Dict[str, Any]]:
+        """Delete many tasks in one /delete-batch round trip; one result per name, in order"""
+        logger.info(f"Deleting {len(task_names)} task(s) in bulk")
+        results = self._bulk("/delete-batch", 'TaskNames', task_names, lambda name: name, self._delete_one)
+        for name, result in zip(task_names, results):
+            result.setdefault('TaskName', name)
+        return results
+
 # Helpers to build HTTP callback steps
 
 def build_http_callback_step(name: str, url: str, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None, timeout_sec: int = 3600, retries: int = 0) -> JobStep:
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Durable job queue and worker pool for SentiMation webapp.
+
+Runs are rows in job_runs with status 'queued'. A fixed pool of worker threads
+claims them highest priority first under a lease, renews the lease with a
+heartbeat while the generation runs, and records the outcome. If the webapp
+dies mid-run the lease lapses and the reaper puts the run back on the queue,
+so queued and interrupted work survives a restart.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from typing import Callable, Dict, Optional
+
+from db import (
+    get_connection,
+    get_job_by_id,
+    update_job_status,
+    complete_job_run,
+    enqueue_job_run,
+    claim_next_job_run,
+    heartbeat_job_run,
+    requeue_expired_job_runs,
+    cancel_queued_job_runs,
+    count_job_runs_by_status,
+)
+
+logger = logging.getLogger(__name__)
+
+# Called as handler(job_row, run_row); must finish the run with complete_job_run
+# and raise on failure.
+JobHandler = Callable[[sqlite3.Row, sqlite3.Row], None]
+# Called as on_change(job_id, run_id, status) whenever a run changes state
+ChangeListener = Callable[[int, int, str], None]
+
+
+class JobQueue:
+    def __init__(
+        self,
+        handler: JobHandler,
+        *,
+        workers: int = 1,
+        lease_seconds: float = 120,
+        heartbeat_seconds: float = 30,
+        poll_seconds: float = 5,
+        max_attempts: int = 3,
+        db_path: Optional[str] = None,
+        on_change: Optional[ChangeListener] = None,
+    ):
+        self.handler = handler
+        self.on_change = on_change
+        self.workers = max(1, workers)
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        # Unique per process so a restarted webapp never mistakes old leases for its own
+        self.owner_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._conn = get_connection(db_path)
+        self._db_lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._stop = threading.Event()
+        self._active: Dict[int, str] = {}  # run_id -> worker_id
+        self._active_lock = threading.Lock()
+        self._threads = []
+
+    def start(self) -> None:
+        # Recover runs orphaned by a previous process whose leases have already lapsed
+        self.reap()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, args=(f"{self.owner_id}-w{i}",),
+                                 name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+        t.start()
+        self._threads.append(t)
+        logger.info(f"Job queue started with {self.workers} worker(s), owner {self.owner_id}")
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def enqueue(self, job_id: int, priority: int = 0, resume_of: Optional[int] = None) -> int:
+        """Queue a run of job_id and wake a worker; returns the job_runs id.
+
+        resume_of names a failed run whose workspace the new run should pick up from.
+        """
+        with self._db_lock:
+            run_id = enqueue_job_run(self._conn, job_id=job_id, priority=priority, resume_of=resume_of)
+            update_job_status(self._conn, job_id=job_id, status='queued')
+        logger.info(f"Queued run {run_id} for job {job_id} (priority {priority})"
+                    + (f", resuming run {resume_of}" if resume_of else ""))
+        self._notify(job_id, run_id, 'queued')
+        with self._wakeup:
+            self._wakeup.notify()
+        return run_id
+
+    def cancel(self, job_id: int) -> int:
+        """Cancel runs of job_id that have not started yet"""
+        with self._db_lock:
+            return cancel_queued_job_runs(self._conn, job_id)
+
+    def reap(self) -> None:
+        with self._db_lock:
+            requeued, failed = requeue_expired_job_runs(self._conn, max_attempts=self.max_attempts)
+        if requeued or failed:
+            logger.warning(f"Recovered expired leases: {requeued} run(s) requeued, {failed} failed")
+            with self._wakeup:
+                self._wakeup.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        with self._db_lock:
+            counts = count_job_runs_by_status(self._conn)
+        with self._active_lock:
+            counts['active_here'] = len(self._active)
+        counts['workers'] = self.workers
+        return counts
+
+    def _notify(self, job_id: int, run_id: int, status: str) -> None:
+        if self.on_change is None:
+            return
+        try:
+            self.on_change(job_id, run_id, status)
+        except Exception:
+            logger.exception(f"on_change listener failed for run {run_id}")
+
+    def _claim(self, worker_id: str) -> Optional[sqlite3.Row]:
+        with self._db_lock:
+            return claim_next_job_run(self._conn, worker_id=worker_id, lease_seconds=self.lease_seconds)
+
+    def _worker(self, worker_id: str) -> None:
+        while not self._stop.is_set():
+            try:
+                run = self._claim(worker_id)
+            except Exception:
+                logger.exception("Failed to claim a queued run")
+                run = None
+            if run is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_seconds)
+                continue
+            self._execute(worker_id, run)
+
+    def _execute(self, worker_id: str, run: sqlite3.Row) -> None:
+        run_id = run['id']
+        with self._active_lock:
+            self._active[run_id] = worker_id
+        try:
+            with self._db_lock:
+                job = get_job_by_id(self._conn, run['job_id'])
+                if job is not None:
+                    update_job_status(self._conn, job_id=job['id'], status='running')
+            if job is None:
+                raise ValueError(f"job {run['job_id']} not found")
+            logger.info(f"{worker_id} running run {run_id} for job {job['id']} (attempt {run['attempts']})")
+            self._notify(job['id'], run_id, 'running')
+            self.handler(job, run)
+            with self._db_lock:
+                self._settle(job['id'], 'completed')
+            self._notify(job['id'], run_id, 'completed')
+        except Exception as e:
+            logger.error(f"Run {run_id} failed: {e}")
+            with self._db_lock:
+                self._settle(run['job_id'], 'failed', last_error=str(e))
+                # Close the run if the handler didn't get that far, so the reaper won't retry it
+                row = self._conn.execute("SELECT status FROM job_runs WHERE id = ?", (run_id,)).fetchone()
+                if row is not None and row['status'] == 'running':
+                    complete_job_run(self._conn, run_id=run_id, status='failed', error_message=str(e))
+            self._notify(run['job_id'], run_id, 'failed')
+        finally:
+            with self._active_lock:
+                self._active.pop(run_id, None)
+
+    def _settle(self, job_id: int, status: str, last_error: Optional[str] = None) -> None:
+        """Set a job's status after a run; call with _db_lock held.
+
+        A job the scheduler will fire again goes back to 'scheduled' (the run's
+        own outcome stays on job_runs), so it can still be cancelled; a job
+        cancelled while it ran stays cancelled.
+        """
+        job = get_job_by_id(self._conn, job_id)
+        if job is None or job['status'] == 'cancelled':
+            return
+        if job['next_run_at']:
+            status = 'scheduled'
+        update_job_status(self._conn, job_id=job_id, status=status, last_error=last_error)
+
+    def _heartbeat_loop(self) -> None:
+        while not self._stop.wait(self.heartbeat_seconds):
+            with self._active_lock:
+                active = list(self._active.items())
+            for run_id, worker_id in active:
+                try:
+                    with self._db_lock:
+                        held = heartbeat_job_run(self._conn, run_id=run_id, worker_id=worker_id,
+                                                 lease_seconds=self.lease_seconds)
+                    with self._active_lock:
+                        still_active = run_id in self._active
+                    # A run that just completed clears its own lease; only warn while it is still executing
+                    if not held and still_active:
+                        logger.warning(f"Lost lease on run {run_id}")
+                except Exception:
+                    logger.exception(f"Heartbeat failed for run {run_id}")
+            try:
+                self.reap()
+            except Exception:
+                logger.exception("Lease reaper failed")
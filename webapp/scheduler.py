@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Local timer-heap scheduler for SentiMation webapp.
+
+One thread holds every locally scheduled job in a heap ordered by next fire
+time and sleeps until the earliest, instead of a polling thread per job.
+Schedules are one-time datetimes or cron-like specs (recurring days/time are
+converted to cron). Next fire times are persisted in jobs.next_run_at so a
+restart picks up where it left off, and runs missed while the webapp was down
+are handled by the job's misfire policy.
+
+Times are naive local datetimes, matching schedule_dt and recurring_time.
+"""
+import heapq
+import itertools
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from db import get_connection, list_scheduled_jobs, set_job_next_run
+
+logger = logging.getLogger(__name__)
+
+# What to do with fire times that passed while the scheduler wasn't running
+MISFIRE_RUN_ONCE = 'run_once'  # fire once now for any number of missed times
+MISFIRE_SKIP = 'skip'          # drop runs later than the grace period
+MISFIRE_RUN_ALL = 'run_all'    # fire every missed time, up to MAX_CATCHUP
+MISFIRE_POLICIES = (MISFIRE_RUN_ONCE, MISFIRE_SKIP, MISFIRE_RUN_ALL)
+MAX_CATCHUP = 10
+
+DAY_NAMES = ['sunday', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday']
+_DOW_ALIASES = {name[:3]: i for i, name in enumerate(DAY_NAMES)}
+_MONTH_ALIASES = {name: i + 1 for i, name in enumerate(
+    ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'])}
+_MACROS = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+}
+
+
+def _parse_field(text: str, lo: int, hi: int, aliases: Optional[Dict[str, int]] = None) -> Set[int]:
+    values: Set[int] = set()
+    for part in text.lower().split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"invalid step in cron field '{text}'")
+        if part in ('*', ''):
+            start, end = lo, hi
+        elif '-' in part:
+            a, b = part.split('-', 1)
+            start, end = _value(a, aliases), _value(b, aliases)
+        else:
+            start = _value(part, aliases)
+            end = hi if step > 1 else start
+        if start < lo or end > hi or start > end:
+            raise ValueError(f"cron field '{text}' out of range {lo}-{hi}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def _value(text: str, aliases: Optional[Dict[str, int]]) -> int:
+    if aliases and text in aliases:
+        return aliases[text]
+    return int(text)
+
+
+class CronSpec:
+    """Five-field cron expression: minute hour day-of-month month day-of-week"""
+
+    def __init__(self, expr: str):
+        self.expr = expr.strip()
+        fields = _MACROS.get(self.expr.lower(), self.expr).split()
+        if len(fields) != 5:
+            raise ValueError(f"cron spec needs 5 fields, got '{expr}'")
+        self.minutes = sorted(_parse_field(fields[0], 0, 59))
+        self.hours = set(_parse_field(fields[1], 0, 23))
+        self.days = set(_parse_field(fields[2], 1, 31))
+        self.months = set(_parse_field(fields[3], 1, 12, _MONTH_ALIASES))
+        dows = _parse_field(fields[4], 0, 7, _DOW_ALIASES)
+        self.dows = {d % 7 for d in dows}  # 7 is Sunday too
+        # Standard cron: when both day fields are restricted, either may match
+        self._dom_any = fields[2] == '*'
+        self._dow_any = fields[4] == '*'
+
+    def _day_matches(self, t: datetime) -> bool:
+        dom = t.day in self.days
+        dow = (t.weekday() + 1) % 7 in self.dows
+        if self._dom_any:
+            return dow
+        if self._dow_any:
+            return dom
+        return dom or dow
+
+    def next_after(self, after: datetime) -> Optional[datetime]:
+        """First matching minute strictly after `after`"""
+        t = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t.year + 5
+        while t.year <= limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+                continue
+            if not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+                continue
+            minute = next((m for m in self.minutes if m >= t.minute), None)
+            if minute is None:
+                t = t.replace(minute=0) + timedelta(hours=1)
+                continue
+            return t.replace(minute=minute)
+        return None
+
+    @classmethod
+    def from_days_time(cls, days: List[str], hhmm: str) -> 'CronSpec':
+        """Cron for the schedule form's recurring days + HH:MM time"""
+        hour, minute = (int(x) for x in hhmm.split(':')[:2])
+        dows = sorted(DAY_NAMES.index(d.strip().lower()) for d in days if d.strip())
+        if not dows:
+            raise ValueError("recurring schedule needs at least one day")
+        return cls(f"{minute} {hour} * * {','.join(str(d) for d in dows)}")
+
+
+@dataclass
+class Schedule:
+    job_id: int
+    run_at: Optional[datetime] = None      # one-time
+    cron: Optional[CronSpec] = None        # recurring
+    misfire_policy: str = MISFIRE_RUN_ONCE
+
+    def next_after(self, after: datetime) -> Optional[datetime]:
+        if self.cron is not None:
+            return self.cron.next_after(after)
+        return None  # one-time schedules fire once
+
+    def first_run(self, now: datetime) -> Optional[datetime]:
+        if self.cron is not None:
+            return self.cron.next_after(now)
+        return self.run_at
+
+
+def schedule_from_job(job) -> Optional[Schedule]:
+    """Build a Schedule from a jobs row (cron_spec, recurring days/time or schedule_dt)"""
+    policy = job['misfire_policy'] or MISFIRE_RUN_ONCE
+    if job['cron_spec']:
+        return Schedule(job['id'], cron=CronSpec(job['cron_spec']), misfire_policy=policy)
+    if job['schedule_kind'] == 'recurring' and job['recurring_days'] and job['recurring_time']:
+        cron = CronSpec.from_days_time(job['recurring_days'].split(','), job['recurring_time'])
+        return Schedule(job['id'], cron=cron, misfire_policy=policy)
+    if job['schedule_dt']:
+        return Schedule(job['id'], run_at=datetime.fromisoformat(job['schedule_dt']), misfire_policy=policy)
+    return None
+
+
+class Scheduler:
+    """Single-threaded timer heap that calls fire(job_id) when a schedule comes due"""
+
+    def __init__(self, fire: Callable[[int], None], *, misfire_grace_sec: float = 300,
+                 db_path: Optional[str] = None):
+        self.fire = fire
+        self.misfire_grace = timedelta(seconds=misfire_grace_sec)
+        self._conn = get_connection(db_path)
+        self._db_lock = threading.Lock()
+        self._heap: List[Tuple[float, int, int]] = []  # (fire epoch, seq, job_id)
+        self._entries: Dict[int, Tuple[int, Schedule, datetime]] = {}  # job_id -> (seq, schedule, due)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stop = False
+        self._firing: Optional[int] = None
+        self._removed_while_firing = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Load persisted schedules and start the timer thread"""
+        loaded = 0
+        with self._db_lock:
+            jobs = list_scheduled_jobs(self._conn)
+        for job in jobs:
+            try:
+                schedule = schedule_from_job(job)
+            except Exception as e:
+                logger.error(f"Job {job['id']} has an invalid schedule: {e}")
+                continue
+            if schedule:
+                self._push(schedule, datetime.fromisoformat(job['next_run_at']))
+                loaded += 1
+        self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+        self._thread.start()
+        logger.info(f"Scheduler started with {loaded} schedule(s)")
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+
+    def add(self, schedule: Schedule) -> Optional[datetime]:
+        """Schedule (or reschedule) a job; returns its next fire time"""
+        due = schedule.first_run(datetime.now())
+        with self._cond:
+            # Persist under the lock so a concurrent fire can't overwrite it with stale state
+            self._persist(schedule.job_id, due)
+            if due is None:
+                self._entries.pop(schedule.job_id, None)
+            else:
+                self._push(schedule, due)
+            if self._firing == schedule.job_id:
+                self._removed_while_firing = False
+            self._cond.notify()
+        return due
+
+    def remove(self, job_id: int) -> None:
+        with self._cond:
+            # Heap entries are dropped lazily when they surface
+            removed = self._entries.pop(job_id, None) is not None
+            if self._firing == job_id:
+                self._removed_while_firing = removed = True
+            if removed:
+                self._persist(job_id, None)
+            self._cond.notify()
+
+    def next_run(self, job_id: int) -> Optional[datetime]:
+        with self._cond:
+            entry = self._entries.get(job_id)
+        return entry[2] if entry else None
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._entries)
+
+    def _persist(self, job_id: int, due: Optional[datetime], last_run_at: Optional[datetime] = None) -> None:
+        with self._db_lock:
+            set_job_next_run(self._conn, job_id, due.isoformat() if due else None,
+                             last_run_at=last_run_at.isoformat() if last_run_at else None)
+
+    def _push(self, schedule: Schedule, due: datetime) -> None:
+        seq = next(self._seq)
+        self._entries[schedule.job_id] = (seq, schedule, due)
+        heapq.heappush(self._heap, (due.timestamp(), seq, schedule.job_id))
+
+    def _pop_due(self) -> Optional[Tuple[Schedule, datetime]]:
+        """Wait until the earliest live entry is due and pop it (None when stopping)"""
+        with self._cond:
+            while not self._stop:
+                while self._heap:
+                    _, seq, job_id = self._heap[0]
+                    entry = self._entries.get(job_id)
+                    if entry is None or entry[0] != seq:
+                        heapq.heappop(self._heap)  # removed or rescheduled
+                        continue
+                    break
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                delay = self._heap[0][0] - datetime.now().timestamp()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                _, _, job_id = heapq.heappop(self._heap)
+                _, schedule, due = self._entries.pop(job_id)
+                self._firing = job_id
+                self._removed_while_firing = False
+                return schedule, due
+        return None
+
+    def _fire_times(self, schedule: Schedule, due: datetime, now: datetime) -> Tuple[int, Optional[datetime]]:
+        """Apply the misfire policy: how many times to fire now, and the next due time"""
+        upcoming = schedule.next_after(due)
+        late = now - due
+        if late <= self.misfire_grace:
+            fires = 1
+        elif schedule.misfire_policy == MISFIRE_SKIP:
+            fires = 0
+        elif schedule.misfire_policy == MISFIRE_RUN_ALL:
+            fires = 1
+            while upcoming is not None and upcoming <= now and fires < MAX_CATCHUP:
+                fires += 1
+                upcoming = schedule.next_after(upcoming)
+        else:
+            fires = 1
+        # Never schedule into the past
+        while upcoming is not None and upcoming <= now:
+            upcoming = schedule.next_after(upcoming)
+        if fires != 1 or late > self.misfire_grace:
+            logger.warning(f"Job {schedule.job_id} misfired by {late}; policy {schedule.misfire_policy}, firing {fires}x")
+        return fires, upcoming
+
+    def _run(self) -> None:
+        while True:
+            popped = self._pop_due()
+            if popped is None:
+                return
+            schedule, due = popped
+            now = datetime.now()
+            fires, upcoming = self._fire_times(schedule, due, now)
+            with self._cond:
+                self._firing = None
+                # A job removed or rescheduled since it was popped isn't fired; the newer state wins
+                if self._removed_while_firing or schedule.job_id in self._entries:
+                    continue
+                if upcoming is not None:
+                    self._push(schedule, upcoming)
+                try:
+                    self._persist(schedule.job_id, upcoming, last_run_at=now if fires else None)
+                except Exception:
+                    logger.exception(f"Failed to persist next run for job {schedule.job_id}")
+            for _ in range(fires):
+                try:
+                    self.fire(schedule.job_id)
+                except Exception:
+                    logger.exception(f"Scheduled fire for job {schedule.job_id} failed")
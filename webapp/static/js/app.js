@@ -2,6 +2,12 @@
 
 // Global variables
 let refreshInterval;
+// url -> {etag, data} from the last 200 response, for conditional GETs
+const conditionalCache = new Map();
+// task id -> latest progress text from /events
+const taskProgress = new Map();
+let eventSource;
+let reloadTimer;
 
 // Utility functions
 function showNotification(message, type = 'info') {
@@ -47,9 +53,19 @@ function formatRelativeTime(dateTimeStr) {
     }
 }
 
+function progressText(taskId) {
+    const progress = taskProgress.get(taskId);
+    if (!progress) {
+        return '';
+    }
+    return [progress.item, progress.sd].filter(Boolean).join(' · ');
+}
+
 function getStatusBadge(status) {
     const badges = {
         'pending': '<span class="badge bg-warning"><i class="fas fa-clock me-1"></i>Pending</span>',
+        'scheduled': '<span class="badge bg-primary"><i class="fas fa-calendar me-1"></i>Scheduled</span>',
+        'queued': '<span class="badge bg-secondary"><i class="fas fa-hourglass-half me-1"></i>Queued</span>',
         'running': '<span class="badge bg-info"><i class="fas fa-spinner fa-spin me-1"></i>Running</span>',
         'completed': '<span class="badge bg-success"><i class="fas fa-check me-1"></i>Completed</span>',
         'failed': '<span class="badge bg-danger"><i class="fas fa-exclamation-triangle me-1"></i>Failed</span>',
@@ -80,10 +96,34 @@ async function apiCall(url, options = {}) {
     }
 }
 
+// GET a JSON resource with If-None-Match; a 304 reuses the cached body.
+// Resolves to {data, changed} so pollers can skip re-rendering unchanged data.
+async function fetchJSONConditional(url) {
+    const cached = conditionalCache.get(url);
+    const headers = cached ? {'If-None-Match': cached.etag} : {};
+    // no-store keeps the browser cache out of the way so we see the 304 ourselves
+    const response = await fetch(url, {headers, cache: 'no-store'});
+    if (response.status === 304 && cached) {
+        return {data: cached.data, changed: false};
+    }
+    if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    const data = await response.json();
+    const etag = response.headers.get('ETag');
+    if (etag) {
+        conditionalCache.set(url, {etag, data});
+    }
+    return {data, changed: true};
+}
+
 // Task management functions
 async function loadTasks() {
     try {
-        const tasks = await apiCall('/tasks');
+        const {data: tasks, changed} = await fetchJSONConditional('/tasks');
+        if (!changed) {
+            return tasks;
+        }
         updateDashboardStats(tasks);
         updateTasksTable(tasks);
         return tasks;
@@ -95,7 +135,7 @@ async function loadTasks() {
 
 function updateDashboardStats(tasks) {
     const total = tasks.length;
-    const pending = tasks.filter(t => t.status === 'pending').length;
+    const pending = tasks.filter(t => ['pending', 'scheduled', 'queued'].includes(t.status)).length;
     const completed = tasks.filter(t => t.status === 'completed').length;
     const failed = tasks.filter(t => t.status === 'failed').length;
     const running = tasks.filter(t => t.status === 'running').length;
@@ -141,7 +181,7 @@ function updateTasksTable(tasks) {
     }
     
     tbody.innerHTML = tasks.map(task => `
-        <tr class="fade-in">
+        <tr class="fade-in" data-task-id="${task.id}">
             <td><code>${task.id}</code></td>
             <td>
                 <span class="badge bg-info">
@@ -159,7 +199,10 @@ function updateTasksTable(tasks) {
                     ${formatRelativeTime(task.scheduled_time)}
                 </div>
             </td>
-            <td>${getStatusBadge(task.status)}</td>
+            <td>
+                <span class="task-status">${getStatusBadge(task.status)}</span>
+                <div class="task-progress small text-muted">${progressText(task.id)}</div>
+            </td>
             <td>
                 <div title="${formatDateTime(task.created_at)}">
                     ${formatRelativeTime(task.created_at)}
@@ -170,7 +213,7 @@ function updateTasksTable(tasks) {
                     <button class="btn btn-outline-primary" onclick="viewTask('${task.id}')" title="View Details">
                         <i class="fas fa-eye"></i>
                     </button>
-                    ${task.status === 'pending' ? `
+                    ${['pending', 'scheduled', 'queued'].includes(task.status) ? `
                         <button class="btn btn-outline-danger" onclick="cancelTask('${task.id}')" title="Cancel Task">
                             <i class="fas fa-times"></i>
                         </button>
@@ -188,7 +231,7 @@ function updateTasksTable(tasks) {
 
 async function viewTask(taskId) {
     try {
-        const task = await apiCall(`/task/${taskId}`);
+        const {data: task} = await fetchJSONConditional(`/task/${taskId}`);
         showTaskModal(task);
     } catch (error) {
         showNotification('Failed to load task details', 'danger');
@@ -316,6 +359,85 @@ function stopAutoRefresh() {
     }
 }
 
+// Live updates: /events pushes job transitions and generator progress, so an open
+// dashboard only polls while the stream is down
+function connectEvents() {
+    if (!window.EventSource) {
+        startAutoRefresh();
+        return;
+    }
+    eventSource = new EventSource('/events');
+    eventSource.addEventListener('open', () => {
+        stopAutoRefresh();
+        // Catch up on anything missed while disconnected (a 304 if nothing was)
+        scheduleReload();
+    });
+    eventSource.addEventListener('error', () => {
+        // EventSource reconnects by itself; poll in the meantime
+        if (!refreshInterval) {
+            startAutoRefresh();
+        }
+    });
+    eventSource.addEventListener('job', event => handleJobEvent(JSON.parse(event.data)));
+    eventSource.addEventListener('progress', event => handleProgressEvent(JSON.parse(event.data)));
+}
+
+function disconnectEvents() {
+    if (eventSource) {
+        eventSource.close();
+        eventSource = null;
+    }
+}
+
+// Coalesce bursts of events into one task list fetch
+function scheduleReload() {
+    clearTimeout(reloadTimer);
+    reloadTimer = setTimeout(() => loadTasks(), 250);
+}
+
+function findTaskRow(taskId) {
+    return taskId ? document.querySelector(`tr[data-task-id="${CSS.escape(taskId)}"]`) : null;
+}
+
+function handleJobEvent(job) {
+    const row = findTaskRow(job.task_id);
+    if (['completed', 'failed', 'cancelled'].includes(job.status)) {
+        taskProgress.delete(job.task_id);
+    }
+    if (!row) {
+        // A job this page hasn't rendered yet
+        scheduleReload();
+        return;
+    }
+    row.querySelector('.task-status').innerHTML = getStatusBadge(job.status);
+    // Counters, actions and results depend on the new status
+    scheduleReload();
+}
+
+function handleProgressEvent(progress) {
+    const current = taskProgress.get(progress.task_id) || {};
+    if (progress.event === 'item') {
+        current.item = progress.total ? `${progress.stage} ${progress.done}/${progress.total}` : `${progress.stage} ${progress.done}`;
+    } else if (progress.event === 'stage') {
+        current.item = progress.state === 'started' ? `${progress.stage}…` : `${progress.stage} done`;
+        current.sd = '';
+    } else if (progress.event === 'sd') {
+        // Live WebUI sampling of the request in flight
+        const step = progress.steps ? `step ${progress.step}/${progress.steps}` : '';
+        const eta = progress.eta_sec ? `ETA ${Math.round(progress.eta_sec)}s` : '';
+        current.sd = progress.stalled
+            ? `<span class="text-danger">stalled ${Math.round(progress.idle_sec)}s</span>`
+            : [step, eta].filter(Boolean).join(', ');
+    } else {
+        return;
+    }
+    taskProgress.set(progress.task_id, current);
+    const row = findTaskRow(progress.task_id);
+    if (row) {
+        row.querySelector('.task-progress').innerHTML = progressText(progress.task_id);
+    }
+}
+
 // Page initialization
 document.addEventListener('DOMContentLoaded', function() {
     // Initialize tooltips
@@ -330,9 +452,9 @@ document.addEventListener('DOMContentLoaded', function() {
         return new bootstrap.Popover(popoverTriggerEl);
     });
     
-    // Start auto-refresh on dashboard
+    // Live updates on the dashboard
     if (window.location.pathname === '/') {
-        startAutoRefresh();
+        connectEvents();
     }
     
     // Form validation
@@ -347,6 +469,7 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Cleanup on page unload
     window.addEventListener('beforeunload', function() {
+        disconnectEvents();
         stopAutoRefresh();
     });
 });
@@ -357,10 +480,13 @@ window.SentiMation = {
     formatDateTime,
     formatRelativeTime,
     getStatusBadge,
+    fetchJSONConditional,
     loadTasks,
     viewTask,
     cancelTask,
     downloadVideo,
     startAutoRefresh,
-    stopAutoRefresh
+    stopAutoRefresh,
+    connectEvents,
+    disconnectEvents
 }; 
\ No newline at end of file